@@ -1,16 +1,38 @@
 import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import numpy as np
-import pydeck as pdk
-import requests
 from datetime import datetime, timedelta
 import json
-import urllib3
 import base64
+import hashlib
+import logging
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 
-# 禁用 SSL 警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from taisafe import ingest
+from taisafe.aggregates import station_trend
+from taisafe.cache import LRUCache
+from taisafe.cameras import CameraHealthChecker, CameraSnapshotProxy, SceneChangeDetector, SCENE_FLAG_LABELS, select_live_cameras
+from taisafe.history import open_history
+from taisafe.nowcast import NOWCAST_THRESHOLDS
+from taisafe.pipeline import HAZARD_LABELS, HazardPipeline
+from taisafe.regions import DEFAULT_REGION, REGIONS, region_center, region_name
+from taisafe.river import RiverNetwork, river_network_file
+from taisafe.rules import ALERT_EVENT_LABELS, classify
+from taisafe.scenarios import DisasterScenario, PM25_EXCEEDANCE_THRESHOLDS
+from taisafe.snapshots import SnapshotStore
+from taisafe.sources import UNCHANGED, SourceStore
+from taisafe.timeline import SCENARIO_STEP_MINUTES, ScenarioTimeline
+
+logger = logging.getLogger(__name__)
+
+# 衍生資料表以 Copy-on-Write 共用快照欄位（pandas 3.0 起為預設）
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # ===========================================
 # 頁面設定
@@ -22,17 +44,59 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ===========================================
+# 媒體資源（靜態路由 + 內容雜湊網址）
+# ===========================================
+
+# Streamlit 靜態路由目錄（需在 .streamlit/config.toml 啟用 server.enableStaticServing）
+STATIC_DIR = Path(__file__).parent / 'static'
+STATIC_ASSET_DIR = STATIC_DIR / 'assets'
+
+def _file_signature(path):
+    """檔案簽章 (絕對路徑, mtime, 大小)，作為快取鍵使檔案更新時自動失效"""
+    stat = Path(path).stat()
+    return str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size
+
+@lru_cache(maxsize=32)
+def _publish_static_asset(path, mtime_ns, size):
+    """
+    將媒體檔複製到靜態目錄，檔名帶內容雜湊 (例如 output.3f2a9c1b7d4e.gif)
+    內容不變時網址不變，瀏覽器只需下載一次
+    """
+    data = Path(path).read_bytes()
+    digest = hashlib.sha1(data).hexdigest()[:12]
+    target = STATIC_ASSET_DIR / f"{Path(path).stem}.{digest}{Path(path).suffix}"
+    if not target.exists():
+        STATIC_ASSET_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(target.name + '.tmp')
+        tmp_path.write_bytes(data)
+        tmp_path.replace(target)
+    return f"app/static/assets/{target.name}"
+
+@lru_cache(maxsize=8)
+def _encode_base64(path, mtime_ns, size):
+    """base64 編碼結果依檔案簽章快取，只在檔案變更時重新編碼"""
+    return base64.b64encode(Path(path).read_bytes()).decode()
+
+def get_media_url(media_path, mimetype):
+    """
+    取得媒體檔網址
+    啟用靜態路由時返回內容雜湊網址，否則退回快取的 base64 data URI
+    檔案不存在時拋出 OSError
+    """
+    signature = _file_signature(media_path)
+    if st.get_option('server.enableStaticServing'):
+        return _publish_static_asset(*signature)
+    return f"data:{mimetype};base64,{_encode_base64(*signature)}"
+
 # ===========================================
 # 影片/GIF 處理函數
 # ===========================================
 
 def load_video_as_base64(video_path):
-    """載入影片並轉換為 base64"""
+    """載入影片並轉換為 base64（依檔案 mtime 快取）"""
     try:
-        with open(video_path, "rb") as video_file:
-            video_bytes = video_file.read()
-            video_base64 = base64.b64encode(video_bytes).decode()
-        return video_base64
+        return _encode_base64(*_file_signature(video_path))
     except:
         return None
 
@@ -43,13 +107,11 @@ def display_gif(gif_path, width_percent=100):
     width_percent: 寬度百分比 (例如: 100 表示 100%)
     """
     try:
-        with open(gif_path, "rb") as gif_file:
-            gif_bytes = gif_file.read()
-            gif_base64 = base64.b64encode(gif_bytes).decode()
-        
+        gif_url = get_media_url(gif_path, "image/gif")
+
         html_code = f"""
         <div style="display: flex; justify-content: center; align-items: center;">
-            <img src="data:image/gif;base64,{gif_base64}" 
+            <img src="{gif_url}" 
                  style="width: {width_percent}%; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
         </div>
         """
@@ -69,9 +131,12 @@ def display_cropped_video(video_path, crop_side='left'):
         return True
     
     # 如果沒有 GIF，嘗試原本的 MP4
-    video_base64 = load_video_as_base64(video_path)
-    
-    if video_base64:
+    try:
+        video_url = get_media_url(video_path, "video/mp4")
+    except OSError:
+        video_url = None
+
+    if video_url:
         if crop_side == 'left':
             margin_style = "margin-left: 0;"
         else:
@@ -80,7 +145,7 @@ def display_cropped_video(video_path, crop_side='left'):
         html_code = f"""
         <div style="position: relative; width: 50%; overflow: hidden; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
             <video autoplay loop muted playsinline style="width: 200%; {margin_style}">
-                <source src="data:video/mp4;base64,{video_base64}" type="video/mp4">
+                <source src="{video_url}" type="video/mp4">
                 您的瀏覽器不支援影片播放
             </video>
         </div>
@@ -91,481 +156,305 @@ def display_cropped_video(video_path, crop_side='left'):
         return False
 
 # ===========================================
-# 成功大學座標 (WGS84)
-# ===========================================
-NCKU_CENTER = {
-    'lat': 22.9971,
-    'lon': 120.2218
-}
-
-# ===========================================
-# 備用資料
+# 資料來源快取與版本推播（跨 session 共用）
 # ===========================================
 
-def get_fallback_air_data():
-    """備用空氣品質資料"""
-    np.random.seed(42)
-    
-    stations = [
-        {'name': '台南', 'lat': 22.9833, 'lon': 120.2025},
-        {'name': '安南', 'lat': 23.0486, 'lon': 120.2175},
-        {'name': '善化', 'lat': 23.1158, 'lon': 120.2969},
-        {'name': '新營', 'lat': 23.3055, 'lon': 120.3167},
-        {'name': '麻豆', 'lat': 23.1811, 'lon': 120.2478},
-        {'name': '仁德', 'lat': 22.9681, 'lon': 120.2528},
-        {'name': '永康', 'lat': 23.0306, 'lon': 120.2547},
-        {'name': '歸仁', 'lat': 22.9706, 'lon': 120.2928},
-        {'name': '東區', 'lat': 22.9897, 'lon': 120.2247},
-        {'name': '北區', 'lat': 23.0117, 'lon': 120.2042},
-    ]
-    
-    data_list = []
-    for station in stations:
-        pm25_val = np.random.randint(15, 55)
-        pm10_val = np.random.randint(30, 80)
-        distance = np.sqrt((station['lat'] - NCKU_CENTER['lat'])**2 + 
-                         (station['lon'] - NCKU_CENTER['lon'])**2) * 111
-        
-        data_list.append({
-            'sitename': station['name'],
-            'lat': station['lat'],
-            'lon': station['lon'],
-            'pm25': float(pm25_val),
-            'pm10': float(pm10_val),
-            'aqi': str(int(pm25_val * 1.2)),
-            'status': '良好' if pm25_val < 35 else '普通' if pm25_val < 53 else '對敏感族群不健康',
-            'o3': f"{np.random.randint(20, 60):.1f}",
-            'co': f"{np.random.uniform(0.3, 0.7):.2f}",
-            'so2': f"{np.random.randint(2, 10)}",
-            'no2': f"{np.random.randint(10, 30)}",
-            'publishtime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'distance_to_ncku': distance
-        })
-    
-    np.random.seed(None)
-    df = pd.DataFrame(data_list)
-    df = df.sort_values('distance_to_ncku').reset_index(drop=True)
-    return df
+# 資料來源顯示名稱
+DATA_SOURCE_LABELS = {
+    'air_quality': '空氣品質',
+    'water_quality': '河川水質',
+    'weather_warnings': '天氣警特報',
+    'cameras': '監視攝影機',
+    'wind': '風向風速'
+}
 
-def get_fallback_water_data():
-    """備用水質資料"""
-    return pd.DataFrame({
-        'sitename': ['鹽水溪橋', '二仁溪橋', '曾文溪橋', '急水溪橋', '官田橋'],
-        'river': ['鹽水溪', '二仁溪', '曾文溪', '急水溪', '鹽水溪'],
-        'ph': [7.2, 7.4, 7.1, 7.3, 7.5],
-        'do': [6.5, 5.8, 6.2, 6.0, 6.4],
-        'bod': [2.1, 3.2, 2.5, 2.8, 2.3],
-        'nh3n': [0.15, 0.22, 0.18, 0.20, 0.16],
-        'rpi': [2.0, 2.5, 2.2, 2.3, 2.1],
-        'monitoring_date': [datetime.now().strftime('%Y-%m-%d')] * 5
-    })
+class SnapshotBus:
+    """
+    資料版本推播
+    資料來源產生新版本時發布通知，訂閱該來源的 session 立即重新執行：
+    在 fragment 內訂閱只重跑該 fragment，在主程式訂閱則重跑整頁；
+    沒有新版本時不做任何事，閒置的 session 不耗 CPU
+    """
 
-# ===========================================
-# 真實資料爬蟲函數（靜默切換）
-# ===========================================
+    def __init__(self):
+        self._versions = {}        # 主題 -> 最新版本
+        self._subscribers = {}     # (session_id, fragment_id) -> 訂閱的主題
+        self._lock = threading.Lock()
 
-@st.cache_data(ttl=300)
-def fetch_real_air_quality():
-    """從環境部開放平台抓取台南地區空氣品質資料"""
+    def subscribe(self, *topics):
+        """
+        目前執行中的 session（或 fragment）訂閱指定主題
+        主程式的訂閱必須在任何 fragment 之前呼叫：整頁執行時先清掉該 session 所有 fragment 的訂閱，
+        這次有顯示的 fragment 會重新訂閱，切換視角或情境後不再顯示的 fragment 不會再收到通知
+        """
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return
+        fragment_id = _current_fragment_id(ctx)
+        with self._lock:
+            if fragment_id is None:
+                for key in [key for key in self._subscribers if key[0] == ctx.session_id]:
+                    del self._subscribers[key]
+            self._subscribers[(ctx.session_id, fragment_id)] = frozenset(topics)
+
+    def publish(self, topic, version):
+        """發布新版本，通知所有訂閱者"""
+        with self._lock:
+            self._versions[topic] = version
+            targets = [key for key, topics in self._subscribers.items() if topic in topics]
+
+        for session_id, fragment_id in targets:
+            if not _request_session_rerun(session_id, fragment_id):
+                # session 已關閉
+                with self._lock:
+                    self._subscribers.pop((session_id, fragment_id), None)
+
+    def version(self, topic):
+        with self._lock:
+            return self._versions.get(topic, 0)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+def _current_fragment_id(ctx):
+    """目前執行中的 fragment id（主程式中為 None），相容新舊版 Streamlit"""
     try:
-        # 嘗試不使用 API key 的公開端點
-        url = "https://data.moenv.gov.tw/api/v2/aqx_p_432?limit=1000&format=json&api_key=8ce6082f-f93f-45d2-b78f-af52ba661784"
-        response = requests.get(url, timeout=15, verify=False)
-
-        if response.status_code == 200:
-            data = response.json()
-            records = data.get('records', [])
-
-            if not records:
-                # 如果沒有 records，可能數據在根層級
-                if isinstance(data, list):
-                    records = data
-
-            tainan_data = []
-            for record in records:
-                county = record.get('county', '')
-                sitename = record.get('sitename', '')
-
-                # 檢查是否為台南市的測站
-                if '台南' in county or '臺南' in county:
-                    try:
-                        # 處理經緯度
-                        lat_str = record.get('latitude', '0')
-                        lon_str = record.get('longitude', '0')
-
-                        # 如果是字符串，嘗試轉換
-                        try:
-                            lat = float(lat_str) if lat_str else 0
-                            lon = float(lon_str) if lon_str else 0
-                        except:
-                            lat = 0
-                            lon = 0
-
-                        # 如果沒有座標，使用測站名稱估計座標
-                        if lat == 0 or lon == 0:
-                            # 台南市各測站的大致座標
-                            station_coords = {
-                                '安南': (23.0486, 120.2175),
-                                '善化': (23.1158, 120.2969),
-                                '新營': (23.3055, 120.3167),
-                                '台南': (22.9833, 120.2025),
-                                '臺南': (22.9833, 120.2025),
-                                '林森': (22.9917, 120.2042),
-                            }
-
-                            for station_key, coords in station_coords.items():
-                                if station_key in sitename:
-                                    lat, lon = coords
-                                    break
-
-                        if lat == 0 or lon == 0:
-                            continue
-
-                        distance = np.sqrt((lat - NCKU_CENTER['lat'])**2 +
-                                         (lon - NCKU_CENTER['lon'])**2) * 111
-
-                        # 處理 PM2.5 數值（嘗試多種欄位名稱）
-                        pm25_val = record.get('pm2.5') or record.get('PM2.5') or record.get('pm25') or ''
-                        if pm25_val in ['', None, 'ND', '-', 'N/A', 'NA']:
-                            pm25_val = 0
-                        else:
-                            try:
-                                pm25_val = float(str(pm25_val).strip())
-                            except:
-                                pm25_val = 0
-
-                        # 處理 PM10 數值（嘗試多種欄位名稱）
-                        pm10_val = record.get('pm10') or record.get('PM10') or ''
-                        if pm10_val in ['', None, 'ND', '-', 'N/A', 'NA']:
-                            pm10_val = 0
-                        else:
-                            try:
-                                pm10_val = float(str(pm10_val).strip())
-                            except:
-                                pm10_val = 0
-
-                        # 處理 AQI 數值（嘗試多種欄位名稱）
-                        aqi_val = record.get('aqi') or record.get('AQI') or ''
-                        if aqi_val in ['', None, 'ND', '-', 'N/A', 'NA']:
-                            aqi_val = 'N/A'
-                        else:
-                            try:
-                                # 轉換為整數字符串
-                                aqi_val = str(int(float(str(aqi_val).strip())))
-                            except:
-                                aqi_val = 'N/A'
-
-                        # 處理狀態
-                        status_val = record.get('status') or record.get('Status') or '良好'
-
-                        tainan_data.append({
-                            'sitename': sitename,
-                            'lat': lat,
-                            'lon': lon,
-                            'pm25': pm25_val,
-                            'pm10': pm10_val,
-                            'aqi': aqi_val,
-                            'status': status_val,
-                            'o3': record.get('o3') or record.get('O3') or '-',
-                            'co': record.get('co') or record.get('CO') or '-',
-                            'so2': record.get('so2') or record.get('SO2') or '-',
-                            'no2': record.get('no2') or record.get('NO2') or '-',
-                            'publishtime': record.get('publishtime') or record.get('PublishTime') or '',
-                            'distance_to_ncku': distance
-                        })
-                    except Exception as e:
-                        # 靜默跳過單個記錄的錯誤
-                        continue
-
-            if tainan_data:
-                df = pd.DataFrame(tainan_data)
-                df = df.sort_values('distance_to_ncku').reset_index(drop=True)
-                return df, True
-
-        # API 失敗時返回備用資料
-        return get_fallback_air_data(), False
+        from streamlit.runtime.scriptrunner_utils.script_run_context import ThreadState
+        return ThreadState.get().fragment_id
+    except Exception:
+        return getattr(ctx, 'current_fragment_id', None)
 
-    except Exception as e:
-        # 如果發生任何錯誤，返回備用資料
-        return get_fallback_air_data(), False
-
-@st.cache_data(ttl=600)
-def fetch_real_water_quality():
-    """從環境部抓取台南地區河川水質資料"""
+def _request_session_rerun(session_id, fragment_id=None):
+    """
+    要求指定 session 重新執行（fragment_id 指定時只重跑該 fragment）
+    session 不存在時返回 False
+    """
+    if not runtime.exists():
+        return False
+    # Runtime._session_mgr 與 AppSession._client_state 為 Streamlit 內部介面（版本見 requirements.txt）
     try:
-        url = "https://data.moenv.gov.tw/api/v2/wrq_p_432?limit=500&api_key=e8dd42e6-9b8b-43f8-991e-b3dee723a52d"
-        response = requests.get(url, timeout=10, verify=False)
-        
-        if response.status_code == 200:
-            data = response.json()
-            records = data.get('records', [])
-            
-            tainan_water = []
-            for record in records:
-                site = record.get('sitename', '')
-                county = record.get('county', '')
-                
-                if '台南' in county or '臺南' in county or '台南' in site:
-                    try:
-                        tainan_water.append({
-                            'sitename': site,
-                            'river': record.get('basin_name', '-'),
-                            'ph': record.get('ph', '-'),
-                            'do': record.get('do', '-'),
-                            'bod': record.get('bod', '-'),
-                            'nh3n': record.get('nh3n', '-'),
-                            'rpi': record.get('rpi', '-'),
-                            'monitoring_date': record.get('monitordate', '-')
-                        })
-                    except:
-                        continue
-            
-            if tainan_water:
-                return pd.DataFrame(tainan_water).head(10), True
-        
-        return get_fallback_water_data(), False
-        
-    except:
-        return get_fallback_water_data(), False
-
-@st.cache_data(ttl=1800)
-def fetch_real_weather_warnings():
-    """從氣象署抓取天氣警特報"""
-    warnings = [
-        {
-            'type': '即時天氣資訊',
-            'level': '資訊',
-            'area': '台南市',
-            'description': '目前無特殊天氣警報。請注意午後局部雷陣雨。',
-            'issued_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-    ]
-    return warnings
+        session_info = runtime.get_instance()._session_mgr.get_active_session_info(session_id)
+    except Exception:
+        logger.warning("無法取得 session %s，取消其訂閱", session_id, exc_info=True)
+        return False
+    if session_info is None:
+        return False
 
-@st.cache_data(ttl=300)
-def fetch_twipcam_streams(lat=22.9971, lon=120.2218, radius=10):
+    session = session_info.session
+    if fragment_id:
+        try:
+            from streamlit.proto.ClientState_pb2 import ClientState
+            client_state = ClientState()
+            client_state.CopyFrom(session._client_state)
+            client_state.fragment_id = fragment_id
+            session.request_rerun(client_state)
+            return True
+        except Exception:
+            # 無法只重跑 fragment 時退回整頁重新執行（成本高，記錄下來以便發現 Streamlit 介面變動）
+            logger.warning("fragment %s 無法單獨重新執行，改為整頁重新執行", fragment_id, exc_info=True)
+    session.request_rerun(None)
+    return True
+
+@st.cache_resource
+def get_snapshot_bus():
+    """所有 session 共用的版本推播"""
+    return SnapshotBus()
+
+def _column_buffers(series):
+    """欄位底層緩衝區位址，用來判斷是否與共用快照共享記憶體"""
+    pa_array = getattr(series.array, '_pa_array', None)
+    if pa_array is not None:
+        return {buf.address for chunk in pa_array.chunks for buf in chunk.buffers() if buf is not None}
+    values = series.to_numpy()
+    return {values.__array_interface__['data'][0]} if values.size else set()
+
+class SessionMemoryMeter:
     """
-    從 TwipCam API 獲取附近的即時影像串流
-    參數:
-        lat: 緯度（預設為成功大學）
-        lon: 經度（預設為成功大學）
-        radius: 搜尋半徑（公里，用於過濾）
+    每個 session 額外佔用的資料記憶體
+    只計算衍生資料表中未與共用快照共享的欄位，用於估算事件高峰時的容量需求
     """
-    try:
-        # TwipCam API endpoint - 獲取所有攝影機列表
-        url = "https://www.twipcam.com/api/v1/cam-list.json"
-
-        response = requests.get(url, timeout=10, verify=False)
-
-        if response.status_code == 200:
-            cameras = response.json()
-
-            # 過濾出距離目標位置在指定半徑內的攝影機
-            nearby_cameras = []
-            for cam in cameras:
-                try:
-                    cam_lat = float(cam.get('lat', 0))
-                    cam_lon = float(cam.get('lon', 0))
-
-                    if cam_lat == 0 or cam_lon == 0:
-                        continue
-
-                    # 計算距離（簡易公式，單位：公里）
-                    distance = np.sqrt((cam_lat - lat)**2 + (cam_lon - lon)**2) * 111
-
-                    if distance <= radius:
-                        nearby_cameras.append({
-                            'id': cam.get('id', 'unknown'),
-                            'name': cam.get('name', 'Unknown Camera'),
-                            'lat': cam_lat,
-                            'lon': cam_lon,
-                            'cam_url': cam.get('cam_url', ''),  # 快照圖片URL
-                            'distance': round(distance, 2),
-                            'status': 'online'
-                        })
-                except:
-                    continue
-
-            # 按距離排序，返回最近的5個
-            if nearby_cameras:
-                nearby_cameras.sort(key=lambda x: x['distance'])
-                return nearby_cameras[:5], True
-
-        # 如果API失敗，返回備用資料
-        return get_fallback_cameras(), False
 
-    except Exception as e:
-        return get_fallback_cameras(), False
-
-def get_fallback_cameras():
-    """備用攝影機資料"""
-    return [
-        {
-            'id': 'demo_1',
-            'name': '成功大學光復校區',
-            'lat': 22.9971,
-            'lon': 120.2218,
-            'url': 'https://www.twipcam.com/camera/demo1',
-            'thumbnail': 'https://via.placeholder.com/400x300.png?text=Camera+1',
-            'status': 'online'
-        },
-        {
-            'id': 'demo_2',
-            'name': '台南市東區',
-            'lat': 22.9897,
-            'lon': 120.2247,
-            'url': 'https://www.twipcam.com/camera/demo2',
-            'thumbnail': 'https://via.placeholder.com/400x300.png?text=Camera+2',
-            'status': 'online'
+    # 超過此時間未更新的 session 視為已離開（秒）
+    EXPIRE_SECONDS = 600
+
+    def __init__(self):
+        self._sessions = {}   # session_id -> (位元組數, 更新時間)
+        self._lock = threading.Lock()
+
+    def record(self, frames, shared_frames):
+        """記錄目前 session 的衍生資料表佔用量，返回位元組數"""
+        shared = set()
+        for frame in shared_frames:
+            for col in frame.columns:
+                shared |= _column_buffers(frame[col])
+
+        owned = 0
+        for frame in frames:
+            if frame is None:
+                continue
+            for col in frame.columns:
+                buffers = _column_buffers(frame[col])
+                if not buffers or not buffers <= shared:
+                    owned += int(frame[col].memory_usage(deep=True, index=False))
+
+        ctx = get_script_run_ctx()
+        session_id = ctx.session_id if ctx is not None else 'local'
+        with self._lock:
+            self._sessions[session_id] = (owned, time.time())
+        return owned
+
+    def summary(self):
+        """目前 session 數、平均與最大額外位元組數"""
+        now = time.time()
+        with self._lock:
+            for session_id in [sid for sid, (_, updated) in self._sessions.items()
+                               if now - updated > self.EXPIRE_SECONDS]:
+                del self._sessions[session_id]
+            sizes = [owned for owned, _ in self._sessions.values()]
+        return {
+            'sessions': len(sizes),
+            'mean_bytes': int(np.mean(sizes)) if sizes else 0,
+            'max_bytes': max(sizes) if sizes else 0
         }
-    ]
 
-@st.cache_data(ttl=600)
-def fetch_wind_data(lat=22.9971, lon=120.2218, zoom=11):
-    """
-    從 TwipCam API 獲取風向資料
-    參數:
-        lat: 緯度
-        lon: 經度
-        zoom: 地圖縮放程度
-    """
-    try:
-        url = f"https://www.twipcam.com/api/v1/map/wind?lat={lat}&lon={lon}&zoom={zoom}"
-
-        response = requests.get(url, timeout=10, verify=False)
-
-        if response.status_code == 200:
-            data = response.json()
-
-            # 解析 GRIB 格點資料
-            # data['data'] 是一個列表，包含 eastward_wind 和 northward_wind
-            u_component = None  # eastward wind (東西向)
-            v_component = None  # northward wind (南北向)
-
-            for item in data.get('data', []):
-                header = item.get('header', {})
-                param_name = header.get('parameterNumberName', '')
-
-                if param_name == 'eastward_wind':
-                    # 取格點資料的中間點作為代表值
-                    wind_data_array = item.get('data', [])
-                    if wind_data_array:
-                        u_component = wind_data_array[len(wind_data_array) // 2]
-
-                elif param_name == 'northward_wind':
-                    wind_data_array = item.get('data', [])
-                    if wind_data_array:
-                        v_component = wind_data_array[len(wind_data_array) // 2]
-
-            # 如果成功獲取 u 和 v 分量，計算風向和風速
-            if u_component is not None and v_component is not None:
-                direction_deg, speed, direction_text = calculate_wind_direction_and_speed(u_component, v_component)
-
-                # 獲取時間戳
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                if data.get('data') and len(data['data']) > 0:
-                    ref_time = data['data'][0].get('header', {}).get('refTime', '')
-                    if ref_time:
-                        timestamp = ref_time
-
-                wind_info = {
-                    'direction': round(direction_deg, 1),  # 風向角度
-                    'speed': round(speed, 1),  # 風速 (m/s)
-                    'direction_text': direction_text,  # 風向文字 (N, NE, E, etc.)
-                    'speed_text': f"{round(speed, 1)} m/s",
-                    'timestamp': timestamp,
-                    'is_real': True
-                }
-                return wind_info, True
-
-        # API 失敗時使用季節性歷史資料
-        return get_fallback_wind_data(), False
+@st.cache_resource
+def get_session_memory_meter():
+    """所有 session 共用的記憶體計量"""
+    return SessionMemoryMeter()
+
+# 有擷取程序時，介面多久讀一次快照庫（秒）
+SNAPSHOT_POLL_SECONDS = 15
+
+@st.cache_resource
+def get_snapshot_db():
+    """擷取程序寫入的共用快照庫（位置見 TAISAFE_SNAPSHOT_DB）"""
+    return SnapshotStore()
+
+@st.cache_resource
+def get_history_store():
+    """擷取程序記錄的測站歷史時序（位置見 TAISAFE_HISTORY_DIR）"""
+    return open_history()
+
+@st.cache_data(ttl=SNAPSHOT_POLL_SECONDS)
+def pm25_hourly_change(stations):
+    """測站最新 PM2.5 與約一小時前的平均變化，歷史不足時返回 None"""
+    now = datetime.now()
+    frame = get_history_store()['air_quality'].read(
+        now - timedelta(hours=3), now + timedelta(hours=1), stations=stations, columns=['pm25'])
+    frame = frame.dropna(subset=['pm25'])
+    if frame.empty:
+        return None
+    latest = frame.groupby('station').last()
+    cutoff = frame['station'].map(latest['time']) - pd.Timedelta(minutes=50)
+    earlier = frame[frame['time'] <= cutoff].groupby('station').last()
+    common = latest.index.intersection(earlier.index)
+    if common.empty:
+        return None
+    return float((latest.loc[common, 'pm25'] - earlier.loc[common, 'pm25']).mean())
 
-    except Exception as e:
-        # 發生錯誤時使用季節性歷史資料
-        return get_fallback_wind_data(), False
+@st.cache_data(ttl=SNAPSHOT_POLL_SECONDS)
+def load_alert_events(source='air_quality'):
+    """擷取程序保存的最近警示事件（發布／解除），沒有時返回 None"""
+    return get_snapshot_db().load_state(f'alert_events:{source}')
 
-def calculate_wind_direction_and_speed(u, v):
+@st.cache_data(ttl=SNAPSHOT_POLL_SECONDS * 4, max_entries=256)
+def load_station_trend(station, days):
+    """測站 PM2.5 趨勢（降採樣後約 400 點，含 24 小時移動平均）"""
+    return station_trend(get_history_store()['air_quality'], station, days=days)
+
+class SnapshotSourceLoader:
     """
-    從 u, v 風分量計算風向和風速
-    參數:
-        u: 東西向風速 (m/s)，正值表示向東
-        v: 南北向風速 (m/s)，正值表示向北
-    返回:
-        direction: 風向角度 (0-360度，0度為北風)
-        speed: 風速 (m/s)
-        direction_text: 風向文字 (N, NE, E, SE, S, SW, W, NW)
+    資料來源讀取端
+    有擷取程序運作時只讀共用快照庫，沒有快照的參數（例如新的使用者位置）寫入需求由擷取程序補上；
+    沒有擷取程序時（單機開發）退回本機直接抓取，依來源更新間隔節流
     """
-    import math
-
-    # 計算風速
-    speed = math.sqrt(u**2 + v**2)
 
-    # 計算風向角度（風從哪裡來）
-    # atan2(y, x) 返回的是風往哪裡去，所以要加負號
-    direction_rad = math.atan2(-u, -v)
-    direction_deg = math.degrees(direction_rad)
+    def __init__(self, name):
+        self.name = name
+        self.fetch, self.ttl = ingest.SOURCES[name]
+        self._seen = {}   # 參數 -> (上次返回的快照版本, 上次本機抓取時間)
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        db = get_snapshot_db()
+        with self._lock:
+            seen_version, fetched_locally = self._seen.get(args, (None, None))
+
+        if db.worker_alive():
+            snapshot = db.latest(self.name, args)
+            if snapshot is not None:
+                # 擷取程序可能已停止輪詢這組參數，再要求一次
+                if time.time() - snapshot['fetched_at'] > 2 * self.ttl:
+                    db.request(self.name, args)
+                with self._lock:
+                    self._seen[args] = (snapshot['version'], None)
+                return UNCHANGED if snapshot['version'] == seen_version else snapshot['value']
+            db.request(self.name, args)
+
+        # 沒有擷取程序，或擷取程序還沒抓到這組參數：本機抓取
+        if fetched_locally is not None and time.time() - fetched_locally < self.ttl:
+            return UNCHANGED
+        value = self.fetch(*args)
+        with self._lock:
+            self._seen[args] = (None, time.time())
+        return value
+
+    def force(self):
+        """重新載入：擷取程序立即重新抓取，本機抓取不再節流"""
+        db = get_snapshot_db()
+        if db.worker_alive():
+            db.request(self.name, force=True)
+        with self._lock:
+            self._seen = {args: (version, None) for args, (version, _) in self._seen.items()}
+
+@st.cache_resource
+def get_source_loaders():
+    """各資料來源的讀取端"""
+    return {name: SnapshotSourceLoader(name) for name in ingest.SOURCES}
+
+@st.cache_resource
+def get_source_store():
+    """所有 session 共用的資料來源快取"""
+    store = SourceStore(bus=get_snapshot_bus())
+    for name, loader in get_source_loaders().items():
+        # 預設參數（預設區域與中心點）永久更新，使用者位置等其他參數久未讀取即停止
+        store.register(name, loader, SNAPSHOT_POLL_SECONDS, defaults=[ingest.source_args(name)])
+    return store
+
+def cached_source(name):
+    """
+    資料來源（取代 st.cache_data）
+    返回與核心抓取函數同參數的函數，呼叫時從共用的 SourceStore 取得快取資料
+    """
+    fetch, _ = ingest.SOURCES[name]
 
-    # 轉換為 0-360 度
-    if direction_deg < 0:
-        direction_deg += 360
+    def wrapper(*args, **kwargs):
+        return get_source_store().get(name, ingest.source_args(name, *args, **kwargs))
 
-    # 轉換為方位文字
-    direction_text = degree_to_direction_text(direction_deg)
+    wrapper.__name__ = fetch.__name__
+    wrapper.__doc__ = fetch.__doc__
+    wrapper.source_name = name
+    return wrapper
 
-    return direction_deg, speed, direction_text
+def reload_source(name):
+    """要求重新載入某個來源，返回排入背景更新的項目數"""
+    get_source_loaders()[name].force()
+    return get_source_store().invalidate(name)
 
-def degree_to_direction_text(degree):
-    """
-    將角度轉換為方位文字
-    0度 = 北 (N), 90度 = 東 (E), 180度 = 南 (S), 270度 = 西 (W)
-    """
-    directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
-    # 每個方位覆蓋 45 度，加上 22.5 度偏移來四捨五入到最近的方位
-    index = int((degree + 22.5) / 45) % 8
-    return directions[index]
+# ===========================================
+# 資料來源（擷取程序快照或本機抓取 + 共用快取）
+# ===========================================
 
-def get_fallback_wind_data():
-    """
-    備用風向資料 - 基於台南地區季節性歷史風向
-    台南氣候特徵：
-    - 冬季（11-3月）：東北季風盛行，風向 NE
-    - 夏季（5-9月）：西南季風盛行，風向 SW
-    - 春季（4月）：季風轉換期，風向 E-SE
-    - 秋季（10月）：季風轉換期，風向 E-NE
-    """
-    current_month = datetime.now().month
-
-    # 根據月份設定台南地區的典型季節風向
-    if current_month in [11, 12, 1, 2, 3]:
-        # 冬季：東北季風
-        direction_text = 'NE'
-        direction_deg = 45
-        typical_speed = 4.5  # 冬季風速較強
-    elif current_month in [5, 6, 7, 8, 9]:
-        # 夏季：西南季風
-        direction_text = 'SW'
-        direction_deg = 225
-        typical_speed = 3.5  # 夏季風速較弱
-    elif current_month == 4:
-        # 春季過渡期：偏東風
-        direction_text = 'E'
-        direction_deg = 90
-        typical_speed = 3.0
-    else:  # 10月
-        # 秋季過渡期：東北東風
-        direction_text = 'NE'
-        direction_deg = 45
-        typical_speed = 3.8
+fetch_real_air_quality = cached_source('air_quality')
+fetch_real_water_quality = cached_source('water_quality')
+fetch_real_weather_warnings = cached_source('weather_warnings')
+fetch_twipcam_streams = cached_source('cameras')
+fetch_wind_data = cached_source('wind')
 
-    return {
-        'direction': direction_deg,
-        'speed': typical_speed,
-        'direction_text': direction_text,
-        'speed_text': f"{typical_speed} m/s",
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'is_real': False  # 標記為歷史資料
-    }
+# ===========================================
+# 風向顯示
+# ===========================================
 
 def get_wind_arrow_unicode(direction_text):
     """根據風向返回箭頭符號"""
@@ -596,95 +485,49 @@ def get_opposite_direction(direction_text):
     return opposites.get(direction_text, '未知')
 
 # ===========================================
-# 災害情境模擬引擎
+# 情境引擎快取（跨 session 共用）
 # ===========================================
 
-class DisasterScenario:
-    """災害情境模擬類別"""
-    
-    @staticmethod
-    def earthquake(base_data):
-        if base_data is None:
-            return None
-        df = base_data.copy()
-        df['shake_intensity'] = df['distance_to_ncku'].apply(lambda d: max(7 - d*2, 0))
-        df['status'] = df['shake_intensity'].apply(lambda x: '設備異常' if x > 5 else '正常')
-        df['color'] = [[255, 200, 0, 220]] * len(df)
-        df['radius'] = df['shake_intensity'] * 15 + 30
-        return df
-    
-    @staticmethod
-    def flooding(base_data):
-        if base_data is None:
-            return None
-        df = base_data.copy()
-        df['water_depth'] = df['lat'].apply(lambda x: max(0, (22.98 - x) * 300))
-        df['color'] = df['water_depth'].apply(
-            lambda d: [0, 100, 255, 220] if d > 50 else [100, 150, 255, 180]
-        )
-        df['radius'] = df['water_depth'] + 30
-        df['status'] = df['water_depth'].apply(
-            lambda d: f'淹水 {d:.0f}cm' if d > 10 else '正常'
-        )
-        return df
-    
-    @staticmethod
-    def war_alert(base_data):
-        if base_data is None:
-            return None
-        df = base_data.copy()
-        df['color'] = [[255, 0, 0, 240]] * len(df)
-        df['radius'] = 50
-        df['status'] = '警戒中'
-        return df
-    
-    @staticmethod
-    def air_pollution(base_data):
-        if base_data is None:
-            return None
-        df = base_data.copy()
-        df['pm25'] = df['pm25'] + np.random.randint(80, 150, len(df))
-        df['pm10'] = df['pm10'] + np.random.randint(100, 200, len(df))
-        df['aqi'] = (df['pm25'] * 1.5).astype(int).astype(str)
-        df['status'] = df['pm25'].apply(
-            lambda x: '非常不健康' if x > 150 else '對所有族群不健康' if x > 100 else '對敏感族群不健康'
-        )
-        df['color'] = df['pm25'].apply(
-            lambda x: [255, 0, 0, 240] if x > 150 else [255, 50, 0, 220]
-        )
-        df['radius'] = df['pm25'] / 3
-        return df
-    
-    @staticmethod
-    def water_contamination(base_data):
-        return {
-            'contaminated': True,
-            'pollutant': '重金屬超標',
-            'affected_rivers': ['鹽水溪', '二仁溪'],
-            'warning': '請勿使用自來水，改用瓶裝水'
-        }
+@st.cache_resource
+def load_river_network(path, mtime=None):
+    """載入河川網路（mtime 變更時重新載入）"""
+    return RiverNetwork.from_file(path)
+
+@st.cache_resource(ttl=600, max_entries=16)
+def build_scenario_timeline(scenario, base_data, wind_direction, wind_speed, region=DEFAULT_REGION):
+    """快取預先計算的時間幀，所有 session 共用同一份唯讀陣列"""
+    wind = {'direction': wind_direction, 'speed': wind_speed}
+    return ScenarioTimeline.build(scenario, base_data, wind=wind, region=region)
+
+@st.cache_resource
+def get_hazard_stage_cache():
+    """所有 session 共用的階段快取"""
+    return LRUCache()
+
+@st.cache_data(ttl=300)
+def run_air_pollution_ensemble(base_data, n_runs, seed):
+    """快取集成模擬結果，相同資料與參數不重複計算"""
+    return DisasterScenario.air_pollution_ensemble(base_data, n_runs=n_runs, seed=seed)
 
 # ===========================================
 # 視覺化輔助函數
 # ===========================================
 
+# PM2.5 分級（taisafe.rules 的 pm25_level）對應的地圖顏色
+PM25_LEVEL_COLORS = [[0, 255, 0, 200], [255, 255, 0, 200], [255, 126, 0, 200], [255, 0, 0, 220]]
+
 def prepare_map_data(df, scenario=None):
     if df is None:
         return None
 
-    # 創建副本以避免修改原始數據
-    df = df.copy()
+    # 淺複製：與共用快照共享欄位資料，寫入時才複製（Copy-on-Write）
+    df = df.copy(deep=False)
 
     if scenario == 'normal':
-        # 根據 PM2.5 值設置顏色
-        df['color'] = df['pm25'].apply(lambda x:
-            [0, 255, 0, 200] if x <= 35 else
-            [255, 255, 0, 200] if x <= 53 else
-            [255, 126, 0, 200] if x <= 70 else
-            [255, 0, 0, 220]
-        )
+        # 根據 PM2.5 分級設置顏色（斷訊測站為灰色）
+        df['color'] = classify('pm25_level', df['pm25'], labels=PM25_LEVEL_COLORS, missing=[150, 150, 150, 160])
         # 設置半徑大小
-        df['radius'] = 30 + (df['pm25'] / 150) * 30
+        df['radius'] = 30 + (df['pm25'].fillna(0) / 150) * 30
     else:
         # 確保其他情境下也有默認的 color 和 radius
         if 'color' not in df.columns:
@@ -796,6 +639,591 @@ def get_disaster_info(scenario_name):
     
     return scenarios.get(scenario_name, scenarios['normal'])
 
+def get_compound_disaster_info(hazards):
+    """合併多個災害的避難指示（依發生順序，去除重複項目）"""
+    infos = [get_disaster_info(hazard) for hazard in hazards]
+    actions, contacts = [], []
+    for info in infos:
+        actions += [a for a in info['actions'] if a not in actions]
+        contacts += [c for c in info.get('contacts', []) if c not in contacts]
+
+    return {
+        'title': '🧩 複合災害：' + '+'.join(HAZARD_LABELS[h] for h in hazards),
+        'description': ' '.join(info['description'] for info in infos),
+        'color': 'error' if any(info['color'] == 'error' for info in infos) else 'warning',
+        'actions': actions,
+        'gif_file': 'output.gif',
+        'contacts': contacts
+    }
+
+# ===========================================
+# 監視攝影機（共用快照代理、健康檢查與畫面分析）
+# ===========================================
+
+@st.cache_resource
+def get_scene_detector():
+    """所有 session 共用的畫面變化偵測器"""
+    return SceneChangeDetector()
+
+@st.cache_resource
+def get_snapshot_proxy():
+    """所有 session 共用的快照代理"""
+    return CameraSnapshotProxy(detector=get_scene_detector())
+
+# 首次顯示時最多等待探測結果的時間（秒）
+CAMERA_PROBE_WAIT = 2
+
+CAMERA_STATUS_ICONS = {
+    'online': '🟢',
+    'stale': '🟡',
+    'offline': '🔴',
+    'checking': '⚪',
+    'unknown': '⚪'
+}
+CAMERA_STATUS_LABELS = {
+    'online': '正常',
+    'stale': '影像未更新',
+    'offline': '離線',
+    'checking': '檢查中',
+    'unknown': '未知'
+}
+
+@st.cache_resource
+def get_camera_health_checker():
+    """所有 session 共用的健康檢查器"""
+    return CameraHealthChecker(get_snapshot_proxy())
+
+# ===========================================
+# 地圖規格建構（欄位投影 + 快取）
+# ===========================================
+
+MAP_STYLE = 'https://basemaps.cartocdn.com/gl/positron-gl-style/style.json'
+
+def compute_snapshot_id(df):
+    """資料快照識別碼：以內容雜湊，資料不變則 id 不變"""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+class PrebuiltDeck:
+    """
+    預先序列化的 deck 規格
+    提供 st.pydeck_chart 需要的 to_json() 與 _tooltip，重新執行時不再序列化 DataFrame
+    """
+
+    def __init__(self, spec_json, tooltip, arrays=None):
+        self.spec_json = spec_json
+        self._tooltip = tooltip
+        self.arrays = arrays or {}
+        self.layers = []
+
+    def to_json(self):
+        return self.spec_json
+
+class DeckSpecBuilder:
+    """
+    地圖規格建構器
+    每個圖層只投影需要的欄位：位置 (float32)、顏色 (uint8 RGBA)、半徑 (float32)
+    與 tooltip 欄位，轉成精簡的 deck.gl JSON 規格
+    """
+
+    DEFAULT_COLOR = (100, 100, 100, 200)
+
+    @staticmethod
+    def scatter_arrays(df, fields=()):
+        """將測站資料投影為型別化陣列"""
+        n = len(df)
+        position = np.column_stack([df['lon'].to_numpy(), df['lat'].to_numpy()]).astype(np.float32)
+        if 'color' in df.columns and n:
+            color = np.array([list(c)[:4] + [255] * (4 - len(c)) for c in df['color']], dtype=np.uint8)
+        else:
+            color = np.tile(np.array(DeckSpecBuilder.DEFAULT_COLOR, dtype=np.uint8), (n, 1))
+        if 'radius' in df.columns:
+            radius = np.nan_to_num(np.broadcast_to(df['radius'].to_numpy(dtype=np.float32), (n,)), nan=40)
+        else:
+            radius = np.full(n, 40, dtype=np.float32)
+        tooltip_fields = {}
+        for field in fields:
+            if field not in df.columns:
+                continue
+            values = df[field]
+            if pd.api.types.is_float_dtype(values):
+                # 缺值（例如無法計算的 AQI）轉為 null
+                values = values.round(2).astype(object).where(values.notna(), None)
+            tooltip_fields[field] = values.tolist()
+        return {'position': position, 'color': color, 'radius': radius, 'fields': tooltip_fields}
+
+    @staticmethod
+    def scatter_layer(layer_id, arrays, line_width=2):
+        """由型別化陣列建立 ScatterplotLayer（資料鍵縮寫為 p/c/r）"""
+        positions = np.round(arrays['position'].astype(np.float64), 5).tolist()
+        colors = arrays['color'].tolist()
+        radii = np.round(arrays['radius'].astype(np.float64), 1).tolist()
+        fields = arrays['fields']
+        records = []
+        for i in range(len(positions)):
+            record = {'p': positions[i], 'c': colors[i], 'r': radii[i]}
+            for name, values in fields.items():
+                record[name] = values[i]
+            records.append(record)
+        return {
+            '@@type': 'ScatterplotLayer',
+            'id': layer_id,
+            'data': records,
+            'getPosition': '@@=p',
+            'getFillColor': '@@=c',
+            'getRadius': '@@=r',
+            'getLineColor': [255, 255, 255],
+            'lineWidthMinPixels': line_width,
+            'pickable': True,
+            'stroked': True,
+            'filled': True
+        }
+
+    @staticmethod
+    def marker_layer(layer_id, point, radius, color=(0, 100, 255), line_width=3):
+        """單點標記（成功大學、目前位置）"""
+        return {
+            '@@type': 'ScatterplotLayer',
+            'id': layer_id,
+            'data': [{'p': [round(point['lon'], 5), round(point['lat'], 5)]}],
+            'getPosition': '@@=p',
+            'getFillColor': list(color),
+            'getRadius': radius,
+            'getLineColor': [255, 255, 255],
+            'lineWidthMinPixels': line_width,
+            'pickable': True,
+            'stroked': True,
+            'filled': True
+        }
+
+    @staticmethod
+    def heatmap_layer(layer_id, df, weight_col, opacity=0.4):
+        """熱區圖層（只帶位置與權重）"""
+        positions = np.round(df[['lon', 'lat']].to_numpy(dtype=np.float64), 5).tolist()
+        weights = np.round(df[weight_col].to_numpy(dtype=np.float64), 3).tolist()
+        return {
+            '@@type': 'HeatmapLayer',
+            'id': layer_id,
+            'data': [{'p': p, 'w': w} for p, w in zip(positions, weights)],
+            'getPosition': '@@=p',
+            'getWeight': '@@=w',
+            'opacity': opacity
+        }
+
+    @staticmethod
+    def deck(layers, center, zoom, tooltip, arrays=None):
+        """組合完整 deck 規格並序列化為精簡 JSON"""
+        spec = {
+            'initialViewState': {
+                'latitude': center['lat'],
+                'longitude': center['lon'],
+                'zoom': zoom,
+                'pitch': 0,
+                'bearing': 0
+            },
+            'layers': layers,
+            'mapProvider': 'carto',
+            'mapStyle': MAP_STYLE,
+            'views': [{'@@type': 'MapView', 'controller': True}]
+        }
+        spec_json = json.dumps(spec, ensure_ascii=False, separators=(',', ':'))
+        return PrebuiltDeck(spec_json, tooltip, arrays)
+
+@st.cache_resource
+def get_deck_spec_cache():
+    """所有 session 共用的地圖規格快取（鍵為快照 id + 情境）"""
+    return LRUCache(max_entries=128)
+
+def get_cached_deck(cache_key, build):
+    """取得快取的地圖規格，未命中時呼叫 build() 建立"""
+    cache = get_deck_spec_cache()
+    deck = cache.get(cache_key)
+    if deck is None:
+        deck = build()
+        cache[cache_key] = deck
+    return deck
+
+# ===========================================
+# 介面區塊（fragment：互動時只重新執行該區塊）
+# ===========================================
+
+@st.fragment
+def render_camera_viewer(lat, lon, disaster_info, mobile=False):
+    """災害現場監控影像：切換攝影機只重新執行此區塊"""
+    get_snapshot_bus().subscribe('cameras')
+    # 獲取即時影像串流
+    candidates, is_real_camera = fetch_twipcam_streams(lat=lat, lon=lon, radius=10)
+
+    # 背景探測候選攝影機，略過離線者
+    checker = get_camera_health_checker()
+    health_table = checker.check(candidates, wait_seconds=CAMERA_PROBE_WAIT)
+
+    # 指揮中心可切換多畫面模式
+    if not mobile and st.radio("顯示模式", ["單一畫面", "多畫面"], horizontal=True,
+                               key="camera_view_mode") == "多畫面":
+        render_camera_mosaic(candidates, health_table, checker, is_real_camera)
+        return
+
+    cameras = select_live_cameras(candidates, health_table, checker)
+    # 依畫面分析的關注分數排序，需要注意的攝影機排在前面
+    detector = get_scene_detector()
+    cameras = detector.rank(cameras)
+    for cam in cameras:
+        cam['scene'] = detector.result(cam.get('cam_url'))
+
+    if not cameras:
+        st.warning("⚠️ 目前無可用攝影機")
+        return
+
+    st.markdown("**即時監控畫面**")
+
+    # 選擇要顯示的攝影機
+    if mobile:
+        camera_names = [f"{CAMERA_STATUS_ICONS[cam['status']]}{' ⚠️' if cam['scene'] and cam['scene']['flags'] else ''} {cam.get('name', f'Camera {i+1}')} ({cam.get('distance', 0):.1f} km)" for i, cam in enumerate(cameras)]
+    else:
+        camera_names = [f"{CAMERA_STATUS_ICONS[cam['status']]}{' ⚠️' if cam['scene'] and cam['scene']['flags'] else ''} {cam.get('name', f'Camera {i+1}')}" for i, cam in enumerate(cameras)]
+    selected_camera_idx = st.selectbox(
+        "選擇攝影機",
+        range(len(cameras)),
+        format_func=lambda x: camera_names[x],
+        key="mobile_camera_select" if mobile else None
+    )
+
+    selected_camera = cameras[selected_camera_idx]
+
+    # 顯示攝影機資訊
+    distance_info = f"{selected_camera.get('distance', 0):.2f} km" if 'distance' in selected_camera else "N/A"
+    health = selected_camera.get('health') or {}
+    health_info = ""
+    if health.get('latency_ms') is not None:
+        health_info += f"\n⏱️ **延遲**: {health['latency_ms']:.0f} ms"
+    if health.get('last_success'):
+        health_info += f"\n🕒 **最後成功**: {datetime.fromtimestamp(health['last_success']).strftime('%H:%M:%S')}"
+    if health.get('image_age_s') is not None:
+        health_info += f"\n🖼️ **影像時間**: {health['image_age_s'] / 60:.0f} 分鐘前"
+    scene = selected_camera.get('scene')
+    if scene:
+        scene_flags = '、'.join(SCENE_FLAG_LABELS[flag] for flag in scene['flags']) or '無異常'
+        health_info += f"\n👁️ **畫面分析**: {scene_flags}（關注分數 {scene['score']:.2f}）"
+    st.info(f"📍 **位置**: {selected_camera.get('name', 'Unknown')}\n"
+           f"📏 **距離**: {distance_info}\n"
+           f"📡 **狀態**: {CAMERA_STATUS_ICONS[selected_camera['status']]} {CAMERA_STATUS_LABELS[selected_camera['status']]}"
+           f"{health_info}")
+
+    # 顯示即時快照影像（經由快照代理，手機端預設使用縮圖）
+    if 'cam_url' in selected_camera and selected_camera['cam_url']:
+        if mobile:
+            snapshot_size = 'medium' if st.toggle("高解析度", value=False, key="mobile_camera_hd") else 'thumb'
+        else:
+            snapshot_size = 'medium'
+        snapshot = get_snapshot_proxy().get(selected_camera['cam_url'], size=snapshot_size)
+        if snapshot:
+            st.image(snapshot,
+                    caption=f"即時快照 - {selected_camera.get('name', 'Camera')}",
+                    use_container_width=True)
+        else:
+            # 如果快照抓取失敗，顯示備用GIF
+            gif_filename = disaster_info.get('gif_file', 'output.gif')
+            gif_displayed = display_gif(gif_filename, width_percent=100)
+            if not gif_displayed:
+                st.warning("⚠️ 無法連接即時影像")
+    else:
+        # 備用：顯示 GIF 動畫
+        gif_filename = disaster_info.get('gif_file', 'output.gif')
+        gif_displayed = display_gif(gif_filename, width_percent=100)
+        if not gif_displayed:
+            st.warning("⚠️ 無法連接即時影像，請檢查攝影機狀態")
+
+    # 顯示資料來源
+    if not is_real_camera:
+        st.caption("📊 展示模式（備用資料）")
+
+def render_camera_mosaic(candidates, health_table, checker, is_real_camera):
+    """多畫面：最近 N 支可用攝影機拼成一張影像，整體一起更新"""
+    tile_count = st.select_slider("畫面數", options=[2, 4, 6, 9], value=4, key="camera_mosaic_count")
+    cameras = [cam for cam in select_live_cameras(candidates, health_table, checker, limit=tile_count)
+               if cam.get('cam_url')]
+
+    if not cameras:
+        st.warning("⚠️ 目前無可用攝影機")
+        return
+
+    columns = 2 if len(cameras) <= 4 else 3
+    mosaic = get_snapshot_proxy().mosaic([cam['cam_url'] for cam in cameras], columns)
+    st.image(mosaic, use_container_width=True)
+    st.caption("　".join(
+        f"{i + 1}. {CAMERA_STATUS_ICONS[cam['status']]} {cam.get('name', 'Camera')} ({cam.get('distance', 0):.1f} km)"
+        for i, cam in enumerate(cameras)
+    ))
+
+    if not is_real_camera:
+        st.caption("📊 展示模式（備用資料）")
+
+@st.fragment
+def render_wind_panel(lat, lon):
+    """即時風向資訊與風場動態圖（民眾手機端）"""
+    get_snapshot_bus().subscribe('wind')
+    wind_data_mobile, is_real_wind_mobile = fetch_wind_data(lat=lat, lon=lon, zoom=11)
+
+    # 顯示風向資訊
+    st.markdown("### 🌬️ 即時風向資訊")
+    col_wind1, col_wind2 = st.columns(2)
+
+    with col_wind1:
+        wind_arrow = get_wind_arrow_unicode(wind_data_mobile['direction_text'])
+        st.metric(
+            "風向",
+            f"{wind_data_mobile['direction_text']} {wind_arrow}",
+            delta="請往上風處移動"
+        )
+
+    with col_wind2:
+        st.metric(
+            "風速",
+            f"{wind_data_mobile['speed']} m/s",
+            delta=wind_data_mobile['timestamp'].split()[1] if ' ' in wind_data_mobile['timestamp'] else ''
+        )
+
+    if not is_real_wind_mobile:
+        st.caption("📊 使用季節性歷史資料（基於台南地區氣候特徵）")
+
+    st.info(f"💡 **避難提示**: 目前風向為 {wind_data_mobile['direction_text']}，污染物將往 {get_opposite_direction(wind_data_mobile['direction_text'])} 方向擴散。請盡快移動至上風處或室內避難。")
+
+    st.markdown("---")
+    st.markdown("### 📊 即時風場動態圖")
+
+    # 使用 TwipCam Wind API 嵌入即時風場地圖
+    wind_map_url = f"https://www.twipcam.com/api/v1/map/wind?lat={lat}&lon={lon}&zoom=10"
+
+    st.markdown(f"""
+    <div style="border: 2px solid #ddd; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
+        <iframe src="{wind_map_url}"
+                width="100%" height="500"
+                frameborder="0" allowfullscreen
+                style="border-radius: 10px;">
+        </iframe>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.caption("🌬️ 即時風場資料 - 請根據風向圖判斷安全避難方向（移動至上風處）")
+    st.caption(f"📍 地圖中心: ({lat:.4f}, {lon:.4f})")
+
+@st.fragment
+def render_ai_assistant(disaster_info):
+    """AI 防災主播與災害訊息：切換 AI 助理只重新執行此區塊"""
+    use_persona = st.toggle("啟用 AI 助理", value=True, key="use_persona")
+
+    if use_persona:
+        # AI 主播圖示 - 獨立一行、置中、變大
+        st.markdown("### 📺 AI 防災主播")
+        # AI 助理始終顯示 output.gif（不受情境影響）
+        gif_displayed = display_gif("output.gif", width_percent=50)
+
+        if not gif_displayed:
+            # 如果沒有 GIF，顯示原本的圖片作為後備
+            st.markdown("""
+            <div style="display: flex; justify-content: center; align-items: center;">
+                <img src="https://api.dicebear.com/7.x/bottts/svg?seed=taisafe"
+                     style="width: 200px; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
+            </div>
+            """, unsafe_allow_html=True)
+        st.markdown("<p style='text-align: center; color: #666; margin-bottom: 20px;'>即時災害警報</p>", unsafe_allow_html=True)
+
+        st.markdown("---")
+
+        # 災害訊息
+        st.error(f"### {disaster_info['title']}")
+        st.markdown(f"**{disaster_info['description']}**")
+
+        if disaster_info['actions']:
+            st.markdown("**請立即執行:**")
+            for action in disaster_info['actions'][:4]:  # 顯示前 4 項
+                st.markdown(f"• {action}")
+    else:
+        st.error(f"### {disaster_info['title']}")
+        st.markdown(f"{disaster_info['description']}")
+
+@st.fragment
+def render_command_center_map(air_data, base_air_data, scenario, wind_data, snapshot_key, region, hazard_state=None):
+    """指揮中心監測地圖：拖動時間軸只重新執行此區塊"""
+    center = region_center(region)
+    # 時序情境播放：時間幀已預先計算，拖動滑桿只切片並更新圖層
+    map_data = air_data
+    frame_idx = None
+    if scenario in ScenarioTimeline.SUPPORTED:
+        timeline = build_scenario_timeline(
+            scenario, base_air_data, wind_data['direction'], wind_data['speed'], region
+        )
+        frame_minute = st.select_slider(
+            f"⏱️ 情境時間軸（每 {SCENARIO_STEP_MINUTES} 分鐘）",
+            options=timeline['minutes'].tolist(),
+            value=0,
+            format_func=lambda m: f"T+{m // 60}:{m % 60:02d}"
+        )
+        frame_idx = frame_minute // SCENARIO_STEP_MINUTES
+        frame_max = np.nanmax(timeline['frames'][frame_idx])
+        st.caption(f"T+{frame_minute} 分鐘 | 最大值 {frame_max:.1f} {timeline['unit']}")
+
+    def build_deck():
+        frame_data = map_data
+        if frame_idx is not None:
+            frame_data = ScenarioTimeline.frame_view(air_data, timeline, frame_idx)
+
+        tooltip_html = ("<b>測站:</b> {sitename}<br/>"
+                        "<b>PM2.5:</b> {pm25}<br/>"
+                        "<b>AQI:</b> {aqi}<br/>"
+                        "<b>狀態:</b> {status}<br/>"
+                        "<b>距中心:</b> {distance_to_center} km")
+        fields = ['sitename', 'pm25', 'aqi', 'status', 'distance_to_center']
+        if 'pm25_p90' in frame_data.columns:
+            # 集成模擬：加上 P10-P90 區間與超標機率
+            tooltip_html += ("<br/><b>P10-P90:</b> {pm25_p10} - {pm25_p90}"
+                             "<br/><b>超標機率(>150):</b> {pm25_exceed_150}")
+            fields += ['pm25_p10', 'pm25_p90', 'pm25_exceed_150']
+        if 'pm25_f1' in frame_data.columns:
+            # 擷取程序附帶的 PM2.5 短時預報
+            tooltip_html += "<br/><b>預報 +1/+2/+3h:</b> {pm25_f1} / {pm25_f2} / {pm25_f3}"
+            fields += ['pm25_f1', 'pm25_f2', 'pm25_f3']
+        if 'risk' in frame_data.columns:
+            tooltip_html += "<br/><b>綜合風險:</b> {risk}<br/><b>主要災害:</b> {dominant_hazard}"
+            fields += ['risk', 'dominant_hazard']
+
+        arrays = DeckSpecBuilder.scatter_arrays(frame_data, fields)
+        layers = [
+            DeckSpecBuilder.scatter_layer('stations', arrays),
+            DeckSpecBuilder.marker_layer('center', center, radius=80)
+        ]
+        if hazard_state is not None:
+            # 複合災害：以網格綜合風險繪製熱區
+            risk_grid = HazardPipeline.to_point_frame(hazard_state, 'grid')
+            layers.insert(0, DeckSpecBuilder.heatmap_layer('risk_grid', risk_grid[risk_grid['risk'] > 0], 'risk'))
+
+        tooltip = {
+            "html": tooltip_html,
+            "style": {
+                "backgroundColor": "steelblue",
+                "color": "white",
+                "fontSize": "14px",
+                "padding": "10px"
+            }
+        }
+        return DeckSpecBuilder.deck(layers, center, zoom=11, tooltip=tooltip, arrays=arrays)
+
+    # 建立 Pydeck 圖層（依快照 id + 情境 + 風場 + 時間幀快取；空污時序的污染團隨風場移動）
+    try:
+        deck = get_cached_deck(
+            ('command_center', snapshot_key, wind_data['direction'], wind_data['speed'], frame_idx), build_deck)
+        st.pydeck_chart(deck)
+        
+        st.caption(f"🔵 {center['name']} | 🟢 良好 | 🟡 普通 | 🟠 對敏感族群不健康 | 🔴 不健康")
+        
+    except Exception as e:
+        st.error(f"地圖渲染失敗: {str(e)}")
+
+# 多少個測站同時出現 PM2.5 突波時建議切換空氣污染情境
+ANOMALY_SCENARIO_MIN_STATIONS = 2
+
+def render_anomaly_alerts(air_data):
+    """列出異常偵測的候選警示（突波、數值凍結、斷訊）"""
+    flagged = air_data[air_data['anomaly'] != '']
+    if flagged.empty:
+        return
+    spikes = flagged['anomaly'].str.contains('PM2.5 突波', regex=False).sum()
+    with st.expander(f"🔎 即時異常偵測：{len(flagged)} 個測站", expanded=spikes >= ANOMALY_SCENARIO_MIN_STATIONS):
+        if spikes >= ANOMALY_SCENARIO_MIN_STATIONS:
+            st.warning(f"{spikes} 個測站 PM2.5 同時突升，請確認是否切換「空氣污染」情境")
+        alert_df = flagged[['sitename', 'anomaly', 'pm25', 'publishtime']].copy()
+        alert_df.columns = ['測站', '異常', 'PM2.5', '發布時間']
+        st.dataframe(alert_df, use_container_width=True, hide_index=True)
+
+def render_nowcast_alerts(air_data):
+    """列出預報未來數小時 PM2.5 會達到警示門檻、目前尚未達到的測站"""
+    current = pd.to_numeric(air_data['pm25'], errors='coerce')
+    rising = air_data[(air_data['nowcast_level'] > 0) & ~(current >= air_data['nowcast_level'])]
+    if rising.empty:
+        return
+    worst = int(rising['nowcast_level'].max())
+    with st.expander(f"📈 PM2.5 短時預報：{len(rising)} 個測站預計達 {worst} μg/m³",
+                     expanded=worst >= max(NOWCAST_THRESHOLDS)):
+        forecast_df = rising[['sitename', 'pm25', 'pm25_f1', 'pm25_f2', 'pm25_f3', 'nowcast_hours']].copy()
+        forecast_df['nowcast_hours'] = forecast_df['nowcast_hours'].astype('Int64')
+        forecast_df.columns = ['測站', '目前 PM2.5', '+1 小時', '+2 小時', '+3 小時', '幾小時後達門檻']
+        st.dataframe(forecast_df.sort_values('幾小時後達門檻'), use_container_width=True, hide_index=True)
+
+def render_rule_alerts(air_data):
+    """發布中的警示（擷取程序每個發布小時評估一次警示規則）與最近的發布／解除事件"""
+    active = air_data[air_data['alerts'] != '']
+    events = load_alert_events()
+    if active.empty and (events is None or events.empty):
+        return
+    with st.expander(f"🚨 警示規則：{len(active)} 個測站發布中", expanded=not active.empty):
+        if not active.empty:
+            active_df = active[['sitename', 'alerts', 'alert_since', 'pm25']].copy()
+            active_df.columns = ['測站', '警示', '發布時間', 'PM2.5']
+            st.dataframe(active_df.sort_values('發布時間'), use_container_width=True, hide_index=True)
+        if events is not None and not events.empty:
+            st.markdown("**最近事件**")
+            event_df = events.iloc[::-1][['time', 'station', 'label', 'event', 'value']].copy()
+            event_df['event'] = event_df['event'].map(ALERT_EVENT_LABELS)
+            event_df.columns = ['時間', '測站', '警示', '事件', '數值']
+            st.dataframe(event_df.head(20), use_container_width=True, hide_index=True)
+
+@st.fragment
+def render_station_trend(stations):
+    """測站 PM2.5 趨勢圖（切換測站或天數只重跑此片段）"""
+    st.subheader("📈 測站 PM2.5 趨勢")
+    col_station, col_days = st.columns([3, 2])
+    with col_station:
+        station = st.selectbox("測站", stations, key="trend_station")
+    with col_days:
+        days = st.radio("期間", [1, 7, 30], index=2, horizontal=True,
+                        format_func=lambda d: f"{d} 天", key="trend_days")
+
+    trend = load_station_trend(station, days)
+    if trend.empty:
+        st.caption("尚無歷史資料（由背景擷取程序記錄真實測站讀值）")
+        return
+    latest = trend.iloc[-1]
+    caption = f"最新 {latest['pm25']:.1f} μg/m³（{trend.index[-1]:%m/%d %H:%M}）"
+    if pd.notna(latest['pm25_24h']):
+        caption += f" · 24 小時移動平均 {latest['pm25_24h']:.1f} μg/m³"
+    st.caption(caption)
+    st.line_chart(trend.rename(columns={'pm25': 'PM2.5', 'pm25_24h': '24 小時移動平均'}), height=260)
+
+@st.fragment
+def render_mobile_map(air_data, user_location, snapshot_key):
+    """民眾手機端目前位置地圖"""
+    def build_deck():
+        arrays = DeckSpecBuilder.scatter_arrays(air_data, ['sitename', 'pm25', 'aqi', 'status'])
+        layers = [
+            # 測站圖層
+            DeckSpecBuilder.scatter_layer('stations', arrays),
+            # 目前位置標記
+            DeckSpecBuilder.marker_layer('user_location', user_location, radius=60)
+        ]
+        tooltip = {
+            "html": "<b>測站:</b> {sitename}<br/>"
+                   "<b>PM2.5:</b> {pm25}<br/>"
+                   "<b>AQI:</b> {aqi}<br/>"
+                   "<b>狀態:</b> {status}",
+            "style": {
+                "backgroundColor": "steelblue",
+                "color": "white",
+                "fontSize": "12px",
+                "padding": "8px"
+            }
+        }
+        return DeckSpecBuilder.deck(layers, user_location, zoom=12, tooltip=tooltip, arrays=arrays)
+
+    try:
+        cache_key = ('mobile', snapshot_key, user_location['lat'], user_location['lon'])
+        deck_mobile = get_cached_deck(cache_key, build_deck)
+        st.pydeck_chart(deck_mobile)
+        st.caption("🔵 您的位置 | 🟢 良好 | 🟡 普通 | 🟠 對敏感族群不健康 | 🔴 不健康")
+
+    except Exception as e:
+        st.warning("⚠️ 地圖載入中...")
+
 # ===========================================
 # 側邊欄設定
 # ===========================================
@@ -804,6 +1232,16 @@ st.sidebar.title("🛡️ TAI-SAFE 控制台")
 st.sidebar.markdown("**成功大學智慧防災系統**")
 st.sidebar.markdown("---")
 
+# 監測區域：全國資料依縣市分割，各區域有自己的中心點、避難點與情境參數
+region = st.sidebar.selectbox(
+    "🗺️ 監測區域",
+    list(REGIONS),
+    index=list(REGIONS).index(DEFAULT_REGION),
+    format_func=region_name,
+    key="region"
+)
+center = region_center(region)
+
 # 災害情境選擇
 st.sidebar.subheader("🎭 災害情境模擬")
 scenario = st.sidebar.selectbox(
@@ -814,11 +1252,66 @@ scenario = st.sidebar.selectbox(
         ('flooding', '🌊 淹水警報'),
         ('war_alert', '⚠️ 空襲警報'),
         ('air_pollution', '🏭 空氣污染'),
-        ('water_contamination', '💧 水質污染')
+        ('water_contamination', '💧 水質污染'),
+        ('compound', '🧩 複合災害')
     ],
     format_func=lambda x: x[1]
 )[0]
 
+# 複合災害：依發生順序選擇多個災害與各自參數
+compound_stages = []
+if scenario == 'compound':
+    compound_hazards = st.sidebar.multiselect(
+        "依發生順序選擇災害",
+        options=list(HAZARD_LABELS),
+        default=['earthquake', 'air_pollution'],
+        format_func=lambda h: HAZARD_LABELS[h]
+    )
+    for hazard in compound_hazards:
+        stage_params = {}
+        if hazard == 'earthquake':
+            stage_params['scale'] = st.sidebar.slider("地震強度係數", 0.5, 1.5, 1.0, 0.1)
+        elif hazard == 'flooding':
+            stage_params['rain_factor'] = st.sidebar.slider("降雨強度係數", 0.5, 3.0, 1.0, 0.1)
+        elif hazard == 'air_pollution':
+            stage_params['seed'] = int(st.sidebar.number_input(
+                "空污亂數種子", min_value=0, value=42, step=1, key="compound_seed"
+            ))
+        compound_stages.append((hazard, stage_params))
+    if not compound_stages:
+        scenario = 'normal'
+
+# 目前生效的災害（複合情境時為多個）
+if scenario == 'compound':
+    active_hazards = [hazard for hazard, _ in compound_stages]
+elif scenario != 'normal':
+    active_hazards = [scenario]
+else:
+    active_hazards = []
+
+# 水質污染：選擇污染源測站，沿河川網路推算下游影響
+river_file = river_network_file(region)
+river_network = load_river_network(river_file, river_file.stat().st_mtime) if river_file else None
+spill_site = None
+if 'water_contamination' in active_hazards and river_network is not None:
+    spill_site = st.sidebar.selectbox(
+        "💧 污染源（河川測站）",
+        river_network.sitenames,
+        index=river_network.index.get('官田橋', 0)
+    )
+
+# 空污情境：固定亂數種子與集成模擬設定
+ensemble_runs = None
+scenario_seed = 42
+if scenario == 'air_pollution':
+    scenario_seed = st.sidebar.number_input("亂數種子", min_value=0, value=42, step=1)
+    if st.sidebar.checkbox("🎲 集成模擬（Monte Carlo）", value=False):
+        ensemble_runs = st.sidebar.select_slider(
+            "模擬次數",
+            options=[100, 1000, 10000],
+            value=1000
+        )
+
 st.sidebar.markdown("---")
 
 # 視角選擇（默認為民眾手機端）
@@ -827,13 +1320,33 @@ view_mode = st.sidebar.radio(
     ["民眾手機端", "指揮中心"]
 )
 
-if view_mode == "民眾手機端":
-    use_persona = st.sidebar.checkbox("啟用 AI 助理", value=True)
+# 重新整理：只在背景重新抓取選定的來源，完成前持續顯示目前資料
+with st.sidebar.expander("🔄 重新載入資料"):
+    refresh_sources = st.multiselect(
+        "資料來源",
+        options=list(DATA_SOURCE_LABELS),
+        format_func=lambda name: DATA_SOURCE_LABELS[name],
+        default=['air_quality', 'water_quality']
+    )
+    if st.button("重新載入", use_container_width=True):
+        queued = sum(reload_source(name) for name in refresh_sources)
+        st.toast(f"已排入 {queued} 項背景更新，完成前顯示目前資料")
+
+    if get_snapshot_db().worker_alive():
+        st.caption("📥 擷取程序運作中（讀取共用快照庫）")
+    else:
+        st.caption("📥 未偵測到擷取程序（本機直接抓取）")
 
-# 重新整理按鈕
-if st.sidebar.button("🔄 重新載入資料"):
-    st.cache_data.clear()
-    st.rerun()
+    source_status = get_source_store().status()
+    for item in sorted(source_status, key=lambda item: item['source']):
+        state = "更新中…" if item['refreshing'] else f"{item['age_s'] / 60:.0f} 分鐘前"
+        st.caption(f"{DATA_SOURCE_LABELS[item['source']]} v{item['version']}｜{state}")
+
+    # 記憶體：共用快照只存一份，各 session 只多出衍生欄位
+    memory = get_session_memory_meter().summary()
+    st.caption(f"共用快照 {sum(item['nbytes'] for item in source_status) / 1024:.1f} KB｜"
+               f"{memory['sessions']} 個 session，平均 {memory['mean_bytes'] / 1024:.1f} KB、"
+               f"最大 {memory['max_bytes'] / 1024:.1f} KB")
 
 st.sidebar.markdown("---")
 st.sidebar.caption("📡 資料來源")
@@ -845,19 +1358,56 @@ st.sidebar.caption("• 台南市政府")
 # 主要內容區
 # ===========================================
 
+# 測站與警特報資料有新版本時整頁更新（攝影機與風向由各自的 fragment 訂閱）
+get_snapshot_bus().subscribe('air_quality', 'water_quality', 'weather_warnings')
+
 # 載入資料
 with st.spinner("🔄 載入即時監測資料..."):
-    air_data, is_real_air = fetch_real_air_quality()
-    water_data, is_real_water = fetch_real_water_quality()
-    weather_warnings = fetch_real_weather_warnings()
+    air_data, is_real_air = fetch_real_air_quality(region)
+    water_data, is_real_water = fetch_real_water_quality(region)
+    weather_warnings = fetch_real_weather_warnings(region)
+
+# 套用情境前的原始測站資料（時序播放的起點；共用唯讀快照）
+base_air_data = air_data
+base_water_data = water_data
+
+# 地圖規格快取鍵：資料快照 id + 情境與其參數
+snapshot_key = (
+    compute_snapshot_id(base_air_data),
+    repr((region, scenario, scenario_seed, ensemble_runs, compound_stages, spill_site))
+)
 
 # 應用災害情境
-disaster_info = get_disaster_info(scenario)
+if scenario == 'compound':
+    disaster_info = get_compound_disaster_info(active_hazards)
+else:
+    disaster_info = get_disaster_info(scenario)
 
 if scenario != 'normal':
-    if scenario == 'water_contamination':
-        water_contamination_info = DisasterScenario.water_contamination(None)
-    else:
+    if 'water_contamination' in active_hazards and river_network is None:
+        # 區域沒有河川網路資料：所有測站一律受影響
+        water_data = DisasterScenario.water_contamination(water_data)
+    elif 'water_contamination' in active_hazards:
+        river_impact = river_network.propagate(spill_site)
+        affected_rivers = river_network.affected_rivers(river_impact)
+        # 水質資料的測站不在河川網路中時，退回所有測站一律受影響
+        if water_data['sitename'].isin(river_network.index).any():
+            site_exposure = river_network.site_exposure(water_data['sitename'], river_impact)
+        else:
+            site_exposure = None
+        water_data = DisasterScenario.water_contamination(water_data, exposure=site_exposure)
+
+    if scenario == 'compound':
+        hazard_state = HazardPipeline.run(air_data, compound_stages, cache=get_hazard_stage_cache(), region=region)
+        air_data = HazardPipeline.to_station_frame(hazard_state, air_data)
+    elif scenario == 'air_pollution':
+        if ensemble_runs:
+            air_data = run_air_pollution_ensemble(air_data, ensemble_runs, scenario_seed)
+        else:
+            air_data = DisasterScenario.air_pollution(air_data, seed=scenario_seed)
+    elif scenario == 'flooding':
+        air_data = DisasterScenario.flooding(air_data, region)
+    elif scenario != 'water_contamination':
         scenario_func = getattr(DisasterScenario, scenario)
         air_data = scenario_func(air_data)
 
@@ -865,6 +1415,9 @@ if scenario != 'normal':
 if scenario == 'normal':
     air_data = prepare_map_data(air_data, 'normal')
 
+# 記錄本 session 衍生資料的額外記憶體
+get_session_memory_meter().record([air_data, water_data], [base_air_data, base_water_data])
+
 # ===========================================
 # 視圖渲染
 # ===========================================
@@ -872,7 +1425,7 @@ if scenario == 'normal':
 if view_mode == "指揮中心":
     # 標題
     st.title("TAI-SAFE 智慧國土防災決策支援系統")
-    st.markdown(f"**監測中心**: 國立成功大學 | **監測範圍**: 台南市")
+    st.markdown(f"**監測中心**: {center['name']} | **監測範圍**: {region_name(region)}")
     
     # 資料來源標示（灰色背景）
     if not is_real_air:
@@ -930,21 +1483,27 @@ if view_mode == "指揮中心":
 
     avg_pm25 = air_data['pm25'].mean()
     max_pm25 = air_data['pm25'].max()
-    active_stations = len(air_data[air_data['status'] != '設備異常'])
+    # 設備異常與斷訊（PM2.5 缺值）的測站不計入
+    active_stations = int(((air_data['status'] != '設備異常') & air_data['pm25'].notna()).sum())
 
     # 獲取風向資料
     wind_data, is_real_wind = fetch_wind_data(
-        lat=NCKU_CENTER['lat'],
-        lon=NCKU_CENTER['lon'],
+        lat=center['lat'],
+        lon=center['lon'],
         zoom=11
     )
 
     with col1:
-        st.metric(
-            "平均 PM2.5",
-            f"{avg_pm25:.1f}",
-            delta=f"最高: {max_pm25:.0f}" if scenario == 'normal' else "⚠️ 異常"
-        )
+        if scenario != 'normal':
+            st.metric("平均 PM2.5", f"{avg_pm25:.1f}", delta="⚠️ 異常")
+        else:
+            # 有歷史時序時顯示一小時變化，否則顯示最高值
+            change = pm25_hourly_change(tuple(air_data['sitename']))
+            if change is None:
+                st.metric("平均 PM2.5", f"{avg_pm25:.1f}", delta=f"最高: {max_pm25:.0f}")
+            else:
+                st.metric("平均 PM2.5", f"{avg_pm25:.1f}", delta=f"{change:+.1f} / 1 小時",
+                          delta_color="inverse")
 
     with col2:
         risk_status = "正常" if scenario == 'normal' else disaster_info['title'].split()[1]
@@ -976,78 +1535,42 @@ if view_mode == "指揮中心":
         if scenario != 'normal':
             st.metric("避難人數", "1,847", delta="+1,847", delta_color="inverse")
         else:
-            st.metric("資料更新", "即時", delta="5 分鐘前")
+            published = pd.NaT
+            if 'publishtime' in air_data.columns:
+                published = pd.to_datetime(air_data['publishtime'], errors='coerce', format='mixed').max()
+            if pd.isna(published):
+                st.metric("資料更新", "即時")
+            else:
+                age_minutes = max((datetime.now() - published).total_seconds() / 60, 0)
+                st.metric("資料更新", f"{published:%H:%M}", delta=f"{age_minutes:.0f} 分鐘前",
+                          delta_color="off")
     
+    # 擷取程序的串流異常偵測結果
+    if scenario == 'normal' and 'anomaly' in air_data.columns:
+        render_anomaly_alerts(air_data)
+    if scenario == 'normal' and 'nowcast_level' in air_data.columns:
+        render_nowcast_alerts(air_data)
+    if scenario == 'normal' and 'alerts' in air_data.columns:
+        render_rule_alerts(air_data)
+
     # 災害監控影像（災害情境時）
     st.markdown("---")
 
     if scenario != 'normal':
         st.subheader("📹 災害現場監控影像")
 
-        # 獲取即時影像串流
-        cameras, is_real_camera = fetch_twipcam_streams(
-            lat=NCKU_CENTER['lat'],
-            lon=NCKU_CENTER['lon'],
-            radius=10
-        )
-
         col_video, col_map = st.columns([1, 1])
 
         with col_video:
-            # 顯示即時影像
-            if cameras and len(cameras) > 0:
-                st.markdown("**即時監控畫面**")
-
-                # 選擇要顯示的攝影機
-                camera_names = [f"{cam.get('name', f'Camera {i+1}')}" for i, cam in enumerate(cameras)]
-                selected_camera_idx = st.selectbox(
-                    "選擇攝影機",
-                    range(len(cameras)),
-                    format_func=lambda x: camera_names[x]
-                )
-
-                selected_camera = cameras[selected_camera_idx]
-
-                # 顯示攝影機資訊
-                distance_info = f"{selected_camera.get('distance', 0):.2f} km" if 'distance' in selected_camera else "N/A"
-                st.info(f"📍 **位置**: {selected_camera.get('name', 'Unknown')}\n"
-                       f"📏 **距離**: {distance_info}\n"
-                       f"🔴 **狀態**: {selected_camera.get('status', 'Unknown')}")
-
-                # 顯示即時快照影像
-                if 'cam_url' in selected_camera and selected_camera['cam_url']:
-                    # 顯示攝影機快照圖片
-                    try:
-                        st.image(selected_camera['cam_url'],
-                                caption=f"即時快照 - {selected_camera.get('name', 'Camera')}",
-                                use_container_width=True)
-                    except:
-                        # 如果圖片載入失敗，顯示備用GIF
-                        gif_filename = disaster_info.get('gif_file', 'output.gif')
-                        gif_displayed = display_gif(gif_filename, width_percent=100)
-                        if not gif_displayed:
-                            st.warning("⚠️ 無法連接即時影像")
-                else:
-                    # 備用：顯示 GIF 動畫
-                    gif_filename = disaster_info.get('gif_file', 'output.gif')
-                    gif_displayed = display_gif(gif_filename, width_percent=100)
-
-                    if not gif_displayed:
-                        st.warning("⚠️ 無法連接即時影像，請檢查攝影機狀態")
-
-                # 顯示資料來源
-                if not is_real_camera:
-                    st.caption("📊 展示模式（備用資料）")
-            else:
-                st.warning("⚠️ 目前無可用攝影機")
+            render_camera_viewer(center['lat'], center['lon'], disaster_info)
 
         with col_map:
             st.subheader("📍 災害分布圖")
 
             # 空污情境：顯示即時風場地圖
-            if scenario == 'air_pollution':
+            if 'air_pollution' in active_hazards:
                 st.markdown("**即時風場動態**")
-                wind_map_url = f"https://www.twipcam.com/api/v1/map/wind?lat={NCKU_CENTER['lat']}&lon={NCKU_CENTER['lon']}&zoom=9"
+                wind_map_url = f"https://www.twipcam.com/api/v1/map/wind?lat={center['lat']}&lon={center['lon']}&zoom=9"
 
                 st.markdown(f"""
                 <div style="border: 2px solid #ddd; border-radius: 10px; overflow: hidden;">
@@ -1061,69 +1584,12 @@ if view_mode == "指揮中心":
 
     # 地圖視覺化
     if scenario != 'earthquake':
-        st.subheader("📍 台南地區環境監測地圖（以成功大學為中心）")
-    
-    # 建立 Pydeck 圖層
-    try:
-        station_layer = pdk.Layer(
-            "ScatterplotLayer",
-            data=air_data,
-            get_position='[lon, lat]',
-            get_fill_color='color',
-            get_radius='radius',
-            pickable=True,
-            stroked=True,
-            filled=True,
-            get_line_color=[255, 255, 255],
-            line_width_min_pixels=2,
-        )
-        
-        ncku_marker = pdk.Layer(
-            "ScatterplotLayer",
-            data=pd.DataFrame([NCKU_CENTER]),
-            get_position='[lon, lat]',
-            get_fill_color=[0, 100, 255],
-            get_radius=80,
-            pickable=True,
-            stroked=True,
-            filled=True,
-            get_line_color=[255, 255, 255],
-            line_width_min_pixels=3,
-        )
-        
-        view_state = pdk.ViewState(
-            latitude=NCKU_CENTER['lat'],
-            longitude=NCKU_CENTER['lon'],
-            zoom=11,
-            pitch=0,
-            bearing=0
-        )
-        
-        deck = pdk.Deck(
-            layers=[station_layer, ncku_marker],
-            initial_view_state=view_state,
-            tooltip={
-                "html": "<b>測站:</b> {sitename}<br/>"
-                       "<b>PM2.5:</b> {pm25}<br/>"
-                       "<b>AQI:</b> {aqi}<br/>"
-                       "<b>狀態:</b> {status}<br/>"
-                       "<b>距成大:</b> {distance_to_ncku:.2f} km",
-                "style": {
-                    "backgroundColor": "steelblue",
-                    "color": "white",
-                    "fontSize": "14px",
-                    "padding": "10px"
-                }
-            },
-            map_style='https://basemaps.cartocdn.com/gl/positron-gl-style/style.json'
-        )
-        
-        st.pydeck_chart(deck)
-        
-        st.caption("🔵 成功大學 | 🟢 良好 | 🟡 普通 | 🟠 對敏感族群不健康 | 🔴 不健康")
-        
-    except Exception as e:
-        st.error(f"地圖渲染失敗: {str(e)}")
+        st.subheader(f"📍 {region_name(region)}環境監測地圖（以{center['name']}為中心）")
+
+    render_command_center_map(
+        air_data, base_air_data, scenario, wind_data, snapshot_key, region,
+        hazard_state if scenario == 'compound' else None
+    )
     
     # 詳細資料表
     st.markdown("---")
@@ -1131,18 +1597,56 @@ if view_mode == "指揮中心":
     
     with col_left:
         st.subheader("📊 空氣品質監測站數據")
-        display_cols = ['sitename', 'pm25', 'pm10', 'aqi', 'status', 'distance_to_ncku']
+        display_cols = ['sitename', 'pm25', 'pm10', 'aqi', 'aqi_pollutant', 'status', 'distance_to_center']
+        display_names = ['測站', 'PM2.5', 'PM10', 'AQI', '指標污染物', '狀態', '距中心(km)']
+        # 擷取程序附帶的滾動平均
+        if 'pm25_24h' in air_data.columns:
+            display_cols[2:2] = ['pm25_8h', 'pm25_24h']
+            display_names[2:2] = ['PM2.5 8h', 'PM2.5 24h']
         display_df = air_data[display_cols].copy()
-        display_df.columns = ['測站', 'PM2.5', 'PM10', 'AQI', '狀態', '距成大(km)']
+        display_df.columns = display_names
+        display_df['AQI'] = display_df['AQI'].round().astype('Int64')
         display_df['PM2.5'] = display_df['PM2.5'].round(1)
         display_df['PM10'] = display_df['PM10'].round(1)
-        display_df['距成大(km)'] = display_df['距成大(km)'].round(2)
+        display_df['距中心(km)'] = display_df['距中心(km)'].round(2)
         st.dataframe(display_df.head(10), use_container_width=True, hide_index=True)
+
+        # 集成模擬：顯示每站不確定性區間與超標機率
+        if 'pm25_p90' in air_data.columns:
+            st.markdown(f"**🎲 集成模擬區間（{int(air_data['ensemble_runs'].iloc[0]):,} 次）**")
+            band_cols = ['sitename', 'pm25_p10', 'pm25_p50', 'pm25_p90'] + \
+                [f'pm25_exceed_{t}' for t in PM25_EXCEEDANCE_THRESHOLDS]
+            band_df = air_data[band_cols].copy()
+            band_df.columns = ['測站', 'P10', 'P50', 'P90'] + \
+                [f'超標機率(>{t})' for t in PM25_EXCEEDANCE_THRESHOLDS]
+            band_df[['P10', 'P50', 'P90']] = band_df[['P10', 'P50', 'P90']].round(1)
+            st.dataframe(band_df.head(10), use_container_width=True, hide_index=True)
+    
+        # 複合災害：避難點綜合風險
+        if scenario == 'compound':
+            st.markdown("**🏫 避難點綜合風險**")
+            shelter_df = HazardPipeline.to_point_frame(hazard_state, 'shelters')
+            shelter_df = shelter_df[['name', 'risk', 'dominant_hazard', 'status']]
+            shelter_df.columns = ['避難點', '綜合風險', '主要災害', '狀態']
+            st.dataframe(shelter_df.sort_values('綜合風險'), use_container_width=True, hide_index=True)
     
     with col_right:
         st.subheader("💧 河川水質監測")
         st.dataframe(water_data.head(10), use_container_width=True, hide_index=True)
+
+        # 水質污染：污染源下游各測站的流達時間與稀釋濃度
+        if 'water_contamination' in active_hazards and spill_site is not None:
+            st.markdown(f"**🧭 污染傳播（污染源：{spill_site}）**")
+            st.caption(f"受影響河川：{'、'.join(affected_rivers)}")
+            downstream_df = river_impact.dropna(subset=['arrival_h']).sort_values('arrival_h')
+            downstream_df = downstream_df[['sitename', 'river', 'arrival_h', 'concentration']]
+            downstream_df.columns = ['測站', '河川', '流達時間(h)', '濃度(mg/L)']
+            st.dataframe(downstream_df, use_container_width=True, hide_index=True)
     
+    # 測站趨勢
+    st.markdown("---")
+    render_station_trend(tuple(base_air_data['sitename']))
+
     # 天氣警報
     if weather_warnings:
         st.markdown("---")
@@ -1163,166 +1667,31 @@ else:  # 民眾手機端視角
         </div>
         """, unsafe_allow_html=True)
     
-    if 'user_location' not in st.session_state:
-        st.session_state.user_location = NCKU_CENTER.copy()
+    # 切換區域時目前位置移到新區域的中心點
+    if st.session_state.get('user_location_region') != region:
+        st.session_state.user_location = {'lat': center['lat'], 'lon': center['lon']}
+        st.session_state.user_location_region = region
 
     # 顯示目前位置（移除橘色icon）
-    st.info(f"📍 **目前位置**\n成功大學附近\n({st.session_state.user_location['lat']:.4f}, {st.session_state.user_location['lon']:.4f})")
+    st.info(f"📍 **目前位置**\n{center['name']}附近\n({st.session_state.user_location['lat']:.4f}, {st.session_state.user_location['lon']:.4f})")
 
     # 顯示地圖
     st.markdown("---")
     st.subheader("🗺️ 目前位置")
 
-    try:
-        # 建立測站圖層
-        station_layer_mobile = pdk.Layer(
-            "ScatterplotLayer",
-            data=air_data,
-            get_position='[lon, lat]',
-            get_fill_color='color',
-            get_radius='radius',
-            pickable=True,
-            stroked=True,
-            filled=True,
-            get_line_color=[255, 255, 255],
-            line_width_min_pixels=2,
-        )
-
-        # 目前位置標記
-        current_location_marker = pdk.Layer(
-            "ScatterplotLayer",
-            data=pd.DataFrame([st.session_state.user_location]),
-            get_position='[lon, lat]',
-            get_fill_color=[0, 100, 255],
-            get_radius=60,
-            pickable=True,
-            stroked=True,
-            filled=True,
-            get_line_color=[255, 255, 255],
-            line_width_min_pixels=3,
-        )
-
-        view_state_mobile = pdk.ViewState(
-            latitude=st.session_state.user_location['lat'],
-            longitude=st.session_state.user_location['lon'],
-            zoom=12,
-            pitch=0,
-            bearing=0
-        )
-
-        deck_mobile = pdk.Deck(
-            layers=[station_layer_mobile, current_location_marker],
-            initial_view_state=view_state_mobile,
-            tooltip={
-                "html": "<b>測站:</b> {sitename}<br/>"
-                       "<b>PM2.5:</b> {pm25}<br/>"
-                       "<b>AQI:</b> {aqi}<br/>"
-                       "<b>狀態:</b> {status}",
-                "style": {
-                    "backgroundColor": "steelblue",
-                    "color": "white",
-                    "fontSize": "12px",
-                    "padding": "8px"
-                }
-            },
-            map_style='https://basemaps.cartocdn.com/gl/positron-gl-style/style.json'
-        )
-
-        st.pydeck_chart(deck_mobile)
-        st.caption("🔵 您的位置 | 🟢 良好 | 🟡 普通 | 🟠 對敏感族群不健康 | 🔴 不健康")
-
-    except Exception as e:
-        st.warning("⚠️ 地圖載入中...")
+    render_mobile_map(air_data, st.session_state.user_location, snapshot_key)
 
     avg_pm25_mobile = air_data['pm25'].mean()
     
     if scenario != 'normal':
         st.markdown("---")
 
-        if use_persona:
-            # AI 主播圖示 - 獨立一行、置中、變大
-            st.markdown("### 📺 AI 防災主播")
-            # AI 助理始終顯示 output.gif（不受情境影響）
-            gif_displayed = display_gif("output.gif", width_percent=50)
-
-            if not gif_displayed:
-                # 如果沒有 GIF，顯示原本的圖片作為後備
-                st.markdown("""
-                <div style="display: flex; justify-content: center; align-items: center;">
-                    <img src="https://api.dicebear.com/7.x/bottts/svg?seed=taisafe"
-                         style="width: 200px; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-                </div>
-                """, unsafe_allow_html=True)
-            st.markdown("<p style='text-align: center; color: #666; margin-bottom: 20px;'>即時災害警報</p>", unsafe_allow_html=True)
-
-            st.markdown("---")
-
-            # 災害訊息
-            st.error(f"### {disaster_info['title']}")
-            st.markdown(f"**{disaster_info['description']}**")
-
-            if disaster_info['actions']:
-                st.markdown("**請立即執行:**")
-                for action in disaster_info['actions'][:4]:  # 顯示前 4 項
-                    st.markdown(f"• {action}")
-        else:
-            st.error(f"### {disaster_info['title']}")
-            st.markdown(f"{disaster_info['description']}")
+        render_ai_assistant(disaster_info)
         
         # 空氣污染情境：顯示風場圖和即時風向（在按鈕上方）
-        if scenario == 'air_pollution':
+        if 'air_pollution' in active_hazards:
             st.markdown("---")
-
-            # 顯示即時風向資料
-            wind_data_mobile, is_real_wind_mobile = fetch_wind_data(
-                lat=st.session_state.user_location['lat'],
-                lon=st.session_state.user_location['lon'],
-                zoom=11
-            )
-
-            # 顯示風向資訊
-            st.markdown("### 🌬️ 即時風向資訊")
-            col_wind1, col_wind2 = st.columns(2)
-
-            with col_wind1:
-                wind_arrow = get_wind_arrow_unicode(wind_data_mobile['direction_text'])
-                st.metric(
-                    "風向",
-                    f"{wind_data_mobile['direction_text']} {wind_arrow}",
-                    delta="請往上風處移動"
-                )
-
-            with col_wind2:
-                st.metric(
-                    "風速",
-                    f"{wind_data_mobile['speed']} m/s",
-                    delta=wind_data_mobile['timestamp'].split()[1] if ' ' in wind_data_mobile['timestamp'] else ''
-                )
-
-            if not is_real_wind_mobile:
-                st.caption("📊 使用季節性歷史資料（基於台南地區氣候特徵）")
-
-            st.info(f"💡 **避難提示**: 目前風向為 {wind_data_mobile['direction_text']}，污染物將往 {get_opposite_direction(wind_data_mobile['direction_text'])} 方向擴散。請盡快移動至上風處或室內避難。")
-
-            st.markdown("---")
-            st.markdown("### 📊 即時風場動態圖")
-
-            # 使用 TwipCam Wind API 嵌入即時風場地圖
-            wind_map_url = f"https://www.twipcam.com/api/v1/map/wind?lat={st.session_state.user_location['lat']}&lon={st.session_state.user_location['lon']}&zoom=10"
-
-            st.markdown(f"""
-            <div style="border: 2px solid #ddd; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-                <iframe src="{wind_map_url}"
-                        width="100%" height="500"
-                        frameborder="0" allowfullscreen
-                        style="border-radius: 10px;">
-                </iframe>
-            </div>
-            """, unsafe_allow_html=True)
-
-            st.caption("🌬️ 即時風場資料 - 請根據風向圖判斷安全避難方向（移動至上風處）")
-            st.caption("📍 地圖中心: 成功大學附近")
-
+            render_wind_panel(st.session_state.user_location['lat'], st.session_state.user_location['lon'])
             st.markdown("---")
         
         # 緊急聯絡資訊直接顯示
@@ -1344,8 +1713,11 @@ else:  # 民眾手機端視角
     
     else:
         st.success("✅ 目前所在區域安全")
-        pm25_status = "良好" if avg_pm25_mobile < 35 else "普通" if avg_pm25_mobile < 53 else "不健康"
-        st.metric("即時 PM2.5", f"{avg_pm25_mobile:.1f}", pm25_status)
+        if pd.isna(avg_pm25_mobile):
+            st.metric("即時 PM2.5", "—", "測站斷訊", delta_color="off")
+        else:
+            pm25_status = classify('pm25_level', [avg_pm25_mobile], labels=['良好', '普通', '不健康', '不健康'])[0]
+            st.metric("即時 PM2.5", f"{avg_pm25_mobile:.1f}", pm25_status)
     
     st.markdown("---")
 
@@ -1354,83 +1726,36 @@ else:  # 民眾手機端視角
         # 災害情境：顯示監控影像
         st.subheader("📹 災害現場監控影像")
 
-        # 獲取即時影像串流
-        cameras_mobile, is_real_camera_mobile = fetch_twipcam_streams(
-            lat=st.session_state.user_location['lat'],
-            lon=st.session_state.user_location['lon'],
-            radius=10
+        render_camera_viewer(
+            st.session_state.user_location['lat'],
+            st.session_state.user_location['lon'],
+            disaster_info,
+            mobile=True
         )
 
-        if cameras_mobile and len(cameras_mobile) > 0:
-            st.markdown("**即時監控畫面**")
-
-            # 選擇要顯示的攝影機
-            camera_names_mobile = [f"{cam.get('name', f'Camera {i+1}')} ({cam.get('distance', 0):.1f} km)" for i, cam in enumerate(cameras_mobile)]
-            selected_camera_idx_mobile = st.selectbox(
-                "選擇攝影機",
-                range(len(cameras_mobile)),
-                format_func=lambda x: camera_names_mobile[x],
-                key="mobile_camera_select"
-            )
-
-            selected_camera_mobile = cameras_mobile[selected_camera_idx_mobile]
-
-            # 顯示攝影機資訊
-            distance_info_mobile = f"{selected_camera_mobile.get('distance', 0):.2f} km" if 'distance' in selected_camera_mobile else "N/A"
-            st.info(f"📍 **位置**: {selected_camera_mobile.get('name', 'Unknown')}\n"
-                   f"📏 **距離**: {distance_info_mobile}\n"
-                   f"🔴 **狀態**: {selected_camera_mobile.get('status', 'Unknown')}")
-
-            # 顯示即時快照影像
-            if 'cam_url' in selected_camera_mobile and selected_camera_mobile['cam_url']:
-                try:
-                    st.image(selected_camera_mobile['cam_url'],
-                            caption=f"即時快照 - {selected_camera_mobile.get('name', 'Camera')}",
-                            use_container_width=True)
-                except:
-                    # 如果圖片載入失敗，顯示備用GIF
-                    gif_filename = disaster_info.get('gif_file', 'output.gif')
-                    gif_displayed = display_gif(gif_filename, width_percent=100)
-                    if not gif_displayed:
-                        st.warning("⚠️ 無法連接即時影像")
-            else:
-                # 備用：顯示 GIF 動畫
-                gif_filename = disaster_info.get('gif_file', 'output.gif')
-                gif_displayed = display_gif(gif_filename, width_percent=100)
-                if not gif_displayed:
-                    st.warning("⚠️ 無法連接即時影像，請檢查攝影機狀態")
-
-            # 顯示資料來源
-            if not is_real_camera_mobile:
-                st.caption("📊 展示模式（備用資料）")
-        else:
-            st.warning("⚠️ 目前無可用攝影機")
-
         # 根據災害類型顯示模擬異常數據
-        if scenario == 'water_contamination':
+        if 'water_contamination' in active_hazards:
             st.markdown("---")
             st.subheader("💧 河川水質監測數據（模擬異常數據）")
-            # 創建模擬異常水質數據
-            abnormal_water_data = water_data.copy()
-            # 模擬異常:提高污染指標
-            abnormal_water_data['ph'] = abnormal_water_data['ph'].apply(lambda x: round(float(x) * 0.8, 2) if isinstance(x, (int, float, str)) and str(x).replace('.', '').isdigit() else x)
-            abnormal_water_data['do'] = abnormal_water_data['do'].apply(lambda x: round(float(x) * 0.5, 2) if isinstance(x, (int, float, str)) and str(x).replace('.', '').isdigit() else x)
-            abnormal_water_data['bod'] = abnormal_water_data['bod'].apply(lambda x: round(float(x) * 3.0, 2) if isinstance(x, (int, float, str)) and str(x).replace('.', '').isdigit() else x)
-            abnormal_water_data['nh3n'] = abnormal_water_data['nh3n'].apply(lambda x: round(float(x) * 5.0, 2) if isinstance(x, (int, float, str)) and str(x).replace('.', '').isdigit() else x)
-            abnormal_water_data['rpi'] = abnormal_water_data['rpi'].apply(lambda x: round(float(x) * 2.5, 2) if isinstance(x, (int, float, str)) and str(x).replace('.', '').isdigit() else x)
-            st.dataframe(abnormal_water_data.head(10), use_container_width=True, hide_index=True)
-
-        elif scenario == 'air_pollution':
+            if spill_site is not None:
+                st.warning(f"⚠️ 請避免接觸{'、'.join(affected_rivers)}水域（污染源：{spill_site}）")
+            else:
+                st.warning("⚠️ 請避免接觸轄區河川水域")
+            # water_data 已由 DisasterScenario.water_contamination 放大污染指標
+            st.dataframe(water_data.head(10), use_container_width=True, hide_index=True)
+
+        if 'air_pollution' in active_hazards:
             st.markdown("---")
             st.subheader("📊 空氣品質監測站數據（模擬異常數據）")
             # 創建模擬異常空氣數據 - 使用已經由 DisasterScenario.air_pollution 處理過的 air_data
             # air_data 在此情境下已經包含了異常高的 PM2.5 和 PM10 數值
-            display_cols = ['sitename', 'pm25', 'pm10', 'aqi', 'status', 'distance_to_ncku']
+            display_cols = ['sitename', 'pm25', 'pm10', 'aqi', 'status', 'distance_to_center']
             display_df_abnormal = air_data[display_cols].copy()
-            display_df_abnormal.columns = ['測站', 'PM2.5', 'PM10', 'AQI', '狀態', '距成大(km)']
+            display_df_abnormal.columns = ['測站', 'PM2.5', 'PM10', 'AQI', '狀態', '距中心(km)']
+            display_df_abnormal['AQI'] = display_df_abnormal['AQI'].round().astype('Int64')
             display_df_abnormal['PM2.5'] = display_df_abnormal['PM2.5'].round(1)
             display_df_abnormal['PM10'] = display_df_abnormal['PM10'].round(1)
-            display_df_abnormal['距成大(km)'] = display_df_abnormal['距成大(km)'].round(2)
+            display_df_abnormal['距中心(km)'] = display_df_abnormal['距中心(km)'].round(2)
             st.dataframe(display_df_abnormal.head(10), use_container_width=True, hide_index=True)
 
     else:
@@ -1438,17 +1763,21 @@ else:  # 民眾手機端視角
         st.subheader("📍 附近監測站")
 
         nearest_stations = air_data.head(5)
+        # 斷訊測站為白色
+        pm25_colors = classify('pm25_level', nearest_stations['pm25'], labels=['🟢', '🟡', '🔴', '🔴'], missing='⚪')
 
-        for _, station in nearest_stations.iterrows():
+        for (_, station), pm25_color in zip(nearest_stations.iterrows(), pm25_colors):
             col1, col2, col3 = st.columns([3, 1, 1])
 
             with col1:
                 st.write(f"**{station['sitename']}**")
-                st.caption(f"{station['distance_to_ncku']:.2f} km")
+                st.caption(f"{station['distance_to_center']:.2f} km")
 
             with col2:
-                pm25_color = "🟢" if station['pm25'] < 35 else "🟡" if station['pm25'] < 53 else "🔴"
-                st.metric("PM2.5", f"{station['pm25']:.0f}")
+                if pd.isna(station['pm25']):
+                    st.metric("PM2.5", "—")
+                else:
+                    st.metric("PM2.5", f"{station['pm25']:.0f}")
 
             with col3:
                 st.write(pm25_color)
@@ -1457,12 +1786,13 @@ else:  # 民眾手機端視角
         # 顯示詳細監測數據
         st.markdown("---")
         st.subheader("📊 空氣品質監測站數據")
-        display_cols = ['sitename', 'pm25', 'pm10', 'aqi', 'status', 'distance_to_ncku']
+        display_cols = ['sitename', 'pm25', 'pm10', 'aqi', 'status', 'distance_to_center']
         display_df = air_data[display_cols].copy()
-        display_df.columns = ['測站', 'PM2.5', 'PM10', 'AQI', '狀態', '距成大(km)']
+        display_df.columns = ['測站', 'PM2.5', 'PM10', 'AQI', '狀態', '距中心(km)']
+        display_df['AQI'] = display_df['AQI'].round().astype('Int64')
         display_df['PM2.5'] = display_df['PM2.5'].round(1)
         display_df['PM10'] = display_df['PM10'].round(1)
-        display_df['距成大(km)'] = display_df['距成大(km)'].round(2)
+        display_df['距中心(km)'] = display_df['距中心(km)'].round(2)
         st.dataframe(display_df.head(10), use_container_width=True, hide_index=True)
 
         st.markdown("---")
@@ -1472,4 +1802,7 @@ else:  # 民眾手機端視角
 # 頁尾
 st.markdown("---")
 st.caption("**TAI-SAFE Project** | 國立成功大學 智慧防災系統")
-st.caption(f"資料更新時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+air_quality_status = [item for item in get_source_store().status() if item['source'] == 'air_quality']
+if air_quality_status:
+    data_time = datetime.now() - timedelta(seconds=air_quality_status[0]['age_s'])
+    st.caption(f"資料更新時間: {data_time.strftime('%Y-%m-%d %H:%M:%S')}（版本 {air_quality_status[0]['version']}）")
@@ -0,0 +1,100 @@
+"""
+TAI-SAFE 核心函式庫（不依賴 Streamlit）
+資料擷取、正規化、地理運算與災害情境引擎，可供 Streamlit 介面、背景工作程序、
+命令列工具與效能測試共用
+
+子模組於第一次存取時才載入，`import taisafe` 不會載入 pandas 等大型套件：
+
+    import taisafe
+    air_data, is_real = taisafe.fetch_real_air_quality()
+    df = taisafe.DisasterScenario.flooding(air_data)
+"""
+
+import importlib
+
+__version__ = '5.1.0'
+
+# 公開名稱 -> 所在子模組
+_EXPORTS = {
+    # 地理與風場
+    'NCKU_CENTER': 'geo',
+    'distance_km': 'geo',
+    'idw': 'geo',
+    'calculate_wind_direction_and_speed': 'geo',
+    'degree_to_direction_text': 'geo',
+    # 監測區域
+    'REGIONS': 'regions',
+    'DEFAULT_REGION': 'regions',
+    'nearest_region': 'regions',
+    'region_center': 'regions',
+    'region_shelters': 'regions',
+    'scenario_config': 'regions',
+    # 資料擷取與正規化
+    'WATER_QUALITY_COLUMNS': 'ingest',
+    'normalize_water_quality': 'ingest',
+    'fetch_real_air_quality': 'ingest',
+    'fetch_nationwide_air_quality': 'ingest',
+    'fetch_nationwide_water_quality': 'ingest',
+    'split_regions': 'ingest',
+    'fetch_real_water_quality': 'ingest',
+    'fetch_real_weather_warnings': 'ingest',
+    'fetch_twipcam_streams': 'ingest',
+    'fetch_wind_data': 'ingest',
+    'get_fallback_air_data': 'ingest',
+    'get_fallback_water_data': 'ingest',
+    'get_fallback_cameras': 'ingest',
+    'get_fallback_wind_data': 'ingest',
+    'SOURCES': 'ingest',
+    'source_args': 'ingest',
+    # 資料來源快取
+    'SourceStore': 'sources',
+    'freeze_frame': 'sources',
+    'UNCHANGED': 'sources',
+    # 跨程序共用快照庫、測站歷史時序與背景擷取程序
+    'SnapshotStore': 'snapshots',
+    'HistoryStore': 'history',
+    'RollingAggregates': 'aggregates',
+    'StreamingAnomalyDetector': 'anomaly',
+    'PM25Nowcaster': 'nowcast',
+    'lttb': 'aggregates',
+    'station_trend': 'aggregates',
+    'to_epoch': 'timeutil',
+    'IngestionWorker': 'worker',
+    'SnapshotAPI': 'api',
+    # 空氣品質指標
+    'AQI_BREAKPOINTS': 'aqi',
+    'compute_aqi': 'aqi',
+    'apply_aqi': 'aqi',
+    # 門檻規則與警示
+    'LEVEL_RULES': 'rules',
+    'ALERT_RULES': 'rules',
+    'classify': 'rules',
+    'AlertEngine': 'rules',
+    # 災害情境
+    'DisasterScenario': 'scenarios',
+    'PM25_EXCEEDANCE_THRESHOLDS': 'scenarios',
+    'WATER_CONTAMINATION_FACTORS': 'scenarios',
+    'RiverNetwork': 'river',
+    'ScenarioTimeline': 'timeline',
+    'HazardPipeline': 'pipeline',
+    # 共用工具
+    'LRUCache': 'cache',
+    # 監視攝影機
+    'CameraSnapshotProxy': 'cameras',
+    'CameraHealthChecker': 'cameras',
+    'SceneChangeDetector': 'cameras',
+    'select_live_cameras': 'cameras',
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
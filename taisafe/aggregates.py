@@ -0,0 +1,221 @@
+"""
+測站滾動平均與趨勢圖降採樣
+RollingAggregates 以每站 24 小時的環狀陣列維護各時間窗的累加值與有效筆數，
+新讀值到達時只加入新的一小時、扣除滑出時間窗的小時，不重新掃描歷史
+"""
+
+import numpy as np
+import pandas as pd
+
+from .timeutil import to_epoch
+
+# 時間窗名稱 -> (小時數, 最少有效小時數)；未達有效小時數時平均值為 NaN
+AGGREGATE_WINDOWS = {
+    '4h': (4, 2),
+    '8h': (8, 6),
+    '12h': (12, 6),
+    '24h': (24, 16),
+}
+# 維護滾動平均的污染物
+AGGREGATE_COLUMNS = ['pm25', 'pm10', 'o3', 'co', 'so2', 'no2']
+# 趨勢圖預設點數
+TREND_POINTS = 400
+
+# ===========================================
+# 增量滾動平均
+# ===========================================
+
+class RollingAggregates:
+    """
+    每站逐時滾動平均
+    讀值以發布時間所在的小時歸入環狀陣列的一格，同一小時重複收到時以新值取代；
+    sums / counts 形狀為 (時間窗, 測站, 欄位)，相對於各站最新的小時
+    """
+
+    def __init__(self, columns=AGGREGATE_COLUMNS, windows=AGGREGATE_WINDOWS):
+        self.columns = list(columns)
+        self.windows = dict(windows)
+        self._hours = np.array([hours for hours, _ in self.windows.values()], dtype=np.int64)
+        self._min_valid = np.array([valid for _, valid in self.windows.values()], dtype=np.int64)
+        self.slots = int(self._hours.max())
+
+        self._index = {}   # 測站 -> 陣列列號
+        self.stations = []
+        n_windows, n_columns = len(self.windows), len(self.columns)
+        self._values = np.full((0, self.slots, n_columns), np.nan)
+        self._slot_hour = np.full((0, self.slots), -1, dtype=np.int64)
+        self._latest = np.full(0, -1, dtype=np.int64)
+        self._sums = np.zeros((n_windows, 0, n_columns))
+        self._counts = np.zeros((n_windows, 0, n_columns), dtype=np.int64)
+
+    def _rows(self, stations):
+        """測站名稱 -> 列號，新測站擴充陣列"""
+        new = [station for station in dict.fromkeys(stations) if station not in self._index]
+        if new:
+            for station in new:
+                self._index[station] = len(self.stations)
+                self.stations.append(station)
+            n = len(new)
+            self._values = np.concatenate([self._values, np.full((n, self.slots, len(self.columns)), np.nan)])
+            self._slot_hour = np.concatenate([self._slot_hour, np.full((n, self.slots), -1, dtype=np.int64)])
+            self._latest = np.concatenate([self._latest, np.full(n, -1, dtype=np.int64)])
+            self._sums = np.concatenate([self._sums, np.zeros((len(self.windows), n, len(self.columns)))], axis=1)
+            self._counts = np.concatenate(
+                [self._counts, np.zeros((len(self.windows), n, len(self.columns)), dtype=np.int64)], axis=1)
+        return np.array([self._index[station] for station in stations], dtype=np.int64)
+
+    def update(self, frame, station_column='sitename', time_column='publishtime'):
+        """
+        加入一批讀值（可含多個小時，例如從歷史回補），返回採用的筆數
+        比各站最新小時早超過 24 小時的讀值略過
+        """
+        times = pd.to_datetime(frame[time_column], errors='coerce', format='mixed')
+        valid = times.notna().to_numpy()
+        if not valid.any():
+            return 0
+        hours = to_epoch(times[valid]) // 3600
+        stations = frame[station_column].astype(str).to_numpy()[valid]
+        values = np.column_stack([
+            pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64)[valid]
+            if col in frame.columns else np.full(valid.sum(), np.nan)
+            for col in self.columns
+        ])
+        rows = self._rows(stations)
+
+        applied = 0
+        # 依小時分批，每批內各站最多一筆（同站同小時取最後一筆）
+        for hour in np.unique(hours):
+            in_hour = np.flatnonzero(hours == hour)
+            _, last = np.unique(rows[in_hour][::-1], return_index=True)
+            in_hour = in_hour[::-1][last]
+            applied += self._apply(rows[in_hour], int(hour), values[in_hour])
+        return applied
+
+    def _apply(self, rows, hour, values):
+        keep = hour > self._latest[rows] - self.slots
+        rows, values = rows[keep], values[keep]
+        if len(rows) == 0:
+            return 0
+
+        new_latest = np.maximum(self._latest[rows], hour)
+        slot_hours = self._slot_hour[rows]                     # (n, slots)
+        slot_values = self._values[rows]                       # (n, slots, 欄位)
+        filled = (~np.isnan(slot_values)).astype(np.int64)
+        zeroed = np.nan_to_num(slot_values)
+
+        for w, window in enumerate(self._hours):
+            # 最新小時往後移時，扣除滑出時間窗的小時
+            old_start = (self._latest[rows] - window)[:, None]
+            new_start = (new_latest - window)[:, None]
+            leaving = (slot_hours > old_start) & (slot_hours <= new_start)
+            # 同一小時重複收到：先扣除舊值
+            leaving |= (slot_hours == hour) & (hour > new_start)
+            self._sums[w, rows] -= np.einsum('ns,nsc->nc', leaving, zeroed)
+            self._counts[w, rows] -= np.einsum('ns,nsc->nc', leaving.astype(np.int64), filled)
+
+            entering = hour > new_start[:, 0]
+            self._sums[w, rows[entering]] += np.nan_to_num(values[entering])
+            self._counts[w, rows[entering]] += ~np.isnan(values[entering])
+
+        slot = hour % self.slots
+        self._values[rows, slot] = values
+        self._slot_hour[rows, slot] = hour
+        self._latest[rows] = new_latest
+        return len(rows)
+
+    def backfill(self, history, now=None):
+        """從歷史時序回補最近 24 小時（程序重啟時使用），返回自身"""
+        now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+        frame = history.read(now - pd.Timedelta(hours=self.slots), now + pd.Timedelta(hours=1),
+                             columns=[col for col in self.columns if col in history.columns])
+        self.update(frame, station_column='station', time_column='time')
+        return self
+
+    def means(self, window):
+        """時間窗平均 DataFrame（index 為測站），有效小時數不足時為 NaN"""
+        w = list(self.windows).index(window)
+        counts = self._counts[w]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts >= self._min_valid[w], self._sums[w] / counts, np.nan)
+        return pd.DataFrame(means, index=pd.Index(self.stations, name='station'), columns=self.columns)
+
+    def attach(self, frame, station_column='sitename'):
+        """
+        在測站資料加上 <欄位>_<時間窗> 平均欄位（淺複製）
+        沒有累積資料的測站為 NaN
+        """
+        df = frame.copy(deep=False)
+        rows = df[station_column].astype(str).map(self._index)
+        found = rows.notna().to_numpy()
+        rows = rows.fillna(0).to_numpy(dtype=np.int64)
+        for window in self.windows:
+            means = self.means(window).to_numpy()
+            for c, col in enumerate(self.columns):
+                df[f'{col}_{window}'] = np.where(found, means[rows, c], np.nan)
+        return df
+
+# ===========================================
+# 趨勢圖降採樣
+# ===========================================
+
+def lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets 降採樣，返回保留點的索引
+    保留第一與最後一點，其餘每個分組取與前一保留點、下一組平均點構成最大三角形的點
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+
+    keep = np.empty(points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def minmax_buckets(x, y, buckets):
+    """每個時間分組保留最小與最大值的點，返回排序後的索引（突波不會被平均掉）"""
+    n = len(x)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    span = max(x[-1] - x[0], 1.0)
+    bucket = np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1)
+    order = np.lexsort((y, bucket))
+    ordered = bucket[order]
+    boundary = ordered[1:] != ordered[:-1]
+    first = np.concatenate([[True], boundary])
+    last = np.concatenate([boundary, [True]])
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+def station_trend(history, station, days=30, column='pm25', points=TREND_POINTS, method='lttb', now=None):
+    """
+    單一測站近 days 天的趨勢：降採樣後的讀值與 24 小時移動平均
+    移動平均以完整解析度計算後再取保留點，返回 index 為時間的 DataFrame
+    """
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    frame = history.read(now - pd.Timedelta(days=days), now + pd.Timedelta(hours=1),
+                         stations=[station], columns=[column])
+    frame = frame.dropna(subset=[column])
+    if frame.empty:
+        return pd.DataFrame(columns=[column, f'{column}_24h'], index=pd.DatetimeIndex([], name='time'))
+
+    series = frame.set_index('time')[column].astype(np.float64)
+    moving = series.rolling('24h', min_periods=AGGREGATE_WINDOWS['24h'][1]).mean()
+    x = to_epoch(series.index).astype(np.float64)
+    y = series.to_numpy()
+    keep = lttb(x, y, points) if method == 'lttb' else minmax_buckets(x, y, points // 2)
+    return pd.DataFrame({column: y[keep], f'{column}_24h': moving.to_numpy()[keep]},
+                        index=series.index[keep])
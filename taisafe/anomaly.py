@@ -0,0 +1,212 @@
+"""
+測站讀值串流異常偵測
+每次全國抓取（新的發布時間）以固定大小的 (測站, 污染物) 陣列更新 EWMA 平均與變異數，
+O(測站數) 標出突波、數值凍結與斷訊；狀態以 SnapshotStore.save_state 保存，擷取程序重啟後延續
+"""
+
+import numpy as np
+import pandas as pd
+
+from .timeutil import to_epoch
+
+# 偵測的污染物
+ANOMALY_COLUMNS = ['pm25', 'pm10', 'o3', 'co', 'so2', 'no2']
+# 偵測參數
+#   alpha:          EWMA 平滑係數（每小時一筆，約 10 小時記憶）
+#   warmup:         累積幾筆後才判斷突波
+#   spike_z:        偏離 EWMA 幾個標準差視為突波（突波值截斷後才併入基線，不會拉高基線）
+#   flatline_hours: 連續幾小時完全相同的讀值視為數值凍結（只檢查變動大的污染物）
+#   dropout_hours:  連續幾小時缺值（'ND'、'-'、空白或測站未回報）視為斷訊
+ANOMALY_PARAMS = {
+    'alpha': 0.1,
+    'warmup': 6,
+    'spike_z': 4.0,
+    'flatline_hours': 6,
+    'dropout_hours': 3,
+}
+# 標準差下限：避免長時間穩定的測站因變異數趨近 0 而把小幅變動判為突波
+ANOMALY_MIN_STD = {'pm25': 3.0, 'pm10': 5.0, 'o3': 4.0, 'co': 0.1, 'so2': 1.0, 'no2': 3.0}
+# 檢查數值凍結的污染物（SO2 / CO 低濃度時本來就常常連續相同）
+ANOMALY_FLATLINE_COLUMNS = ['pm25', 'pm10', 'o3']
+
+ANOMALY_LABELS = {
+    'spike': '突波',
+    'flatline': '數值凍結',
+    'dropout': '斷訊',
+}
+_COLUMN_LABELS = {'pm25': 'PM2.5', 'pm10': 'PM10', 'o3': 'O3', 'co': 'CO', 'so2': 'SO2', 'no2': 'NO2'}
+
+# 每站每污染物的狀態陣列
+_STATE_FIELDS = {
+    'mean': np.float64,     # EWMA 平均
+    'var': np.float64,      # EWMA 變異數
+    'n': np.int64,          # 已併入的筆數
+    'last': np.float64,     # 上一筆讀值
+    'same': np.int64,       # 連續相同的小時數
+    'missing': np.int64,    # 連續缺值的小時數
+    'z': np.float64,        # 最新一筆的 z 分數
+}
+
+class StreamingAnomalyDetector:
+    """
+    串流異常偵測
+    以全國資料中最新的發布小時為一步：同一小時重複抓到時不更新，
+    該小時沒有回報或數值無法解析的測站視為缺值
+    """
+
+    def __init__(self, columns=ANOMALY_COLUMNS, params=None):
+        self.columns = list(columns)
+        self.params = dict(ANOMALY_PARAMS, **(params or {}))
+        self.hour = -1   # 最後處理的發布小時
+        self._index = {}
+        self.stations = []
+        self._min_var = np.array([ANOMALY_MIN_STD.get(col, 1.0) ** 2 for col in self.columns])
+        self._flatline_mask = np.array([col in ANOMALY_FLATLINE_COLUMNS for col in self.columns])
+        self._state = {field: self._empty(0, dtype) for field, dtype in _STATE_FIELDS.items()}
+
+    def _empty(self, n, dtype):
+        fill = np.nan if dtype is np.float64 else 0
+        return np.full((n, len(self.columns)), fill, dtype=dtype)
+
+    def _rows(self, stations):
+        new = [station for station in dict.fromkeys(stations) if station not in self._index]
+        if new:
+            for station in new:
+                self._index[station] = len(self.stations)
+                self.stations.append(station)
+            for field, dtype in _STATE_FIELDS.items():
+                self._state[field] = np.concatenate([self._state[field], self._empty(len(new), dtype)])
+        return np.array([self._index[station] for station in stations], dtype=np.int64)
+
+    # ---------- 更新 ----------
+
+    def update(self, frame, station_column='sitename', time_column='publishtime'):
+        """
+        併入一次抓取，返回是否為新的發布小時（重複的快照不改變狀態）
+        """
+        times = pd.to_datetime(frame[time_column], errors='coerce', format='mixed')
+        valid = times.notna().to_numpy()
+        if not valid.any():
+            return False
+        hours = np.full(len(frame), -1, dtype=np.int64)
+        hours[valid] = to_epoch(times[valid]) // 3600
+        hour = int(hours.max())
+        if hour <= self.hour:
+            return False
+
+        rows = self._rows(frame[station_column].astype(str).tolist())
+        x = np.full((len(self.stations), len(self.columns)), np.nan)
+        current = hours == hour
+        for c, col in enumerate(self.columns):
+            if col in frame.columns:
+                values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64)
+                x[rows[current], c] = values[current]
+        # 資料中沒有的欄位不算缺值（不累計斷訊）
+        self._step(x, np.array([col in frame.columns for col in self.columns]))
+        self.hour = hour
+        return True
+
+    def _step(self, x, observed=None):
+        """
+        一步更新：x 形狀為 (測站, 污染物)，NaN 為缺值
+        observed 為各污染物欄位是否在這次資料中（沒有的欄位維持原本的連續缺值小時數）
+        """
+        state, params = self._state, self.params
+        alpha = params['alpha']
+        present = ~np.isnan(x)
+        observed = np.ones(len(self.columns), dtype=bool) if observed is None else observed
+
+        state['missing'] = np.where(present, 0, np.where(observed, state['missing'] + 1, state['missing']))
+        state['same'] = np.where(present, np.where(x == state['last'], state['same'] + 1, 0), state['same'])
+
+        std = np.sqrt(np.maximum(np.nan_to_num(state['var']), self._min_var))
+        first = present & (state['n'] == 0)
+        z = np.where(present & ~first, (x - state['mean']) / std, np.nan)
+        state['z'] = np.where(present, z, state['z'])
+
+        # 突波值截斷到 ±spike_z 個標準差後才併入 EWMA
+        limit = params['spike_z'] * std
+        clipped = np.clip(x, state['mean'] - limit, state['mean'] + limit)
+        delta = np.where(first, 0.0, clipped - state['mean'])
+        mean = np.where(first, x, state['mean'] + alpha * delta)
+        var = np.where(first, 0.0, (1 - alpha) * (np.nan_to_num(state['var']) + alpha * delta ** 2))
+        state['mean'] = np.where(present, mean, state['mean'])
+        state['var'] = np.where(present, var, state['var'])
+        state['last'] = np.where(present, x, state['last'])
+        state['n'] = state['n'] + present
+
+    # ---------- 結果 ----------
+
+    def flags(self):
+        """目前的異常旗標 {'spike' | 'flatline' | 'dropout': (測站, 污染物) 布林陣列}"""
+        state, params = self._state, self.params
+        with np.errstate(invalid='ignore'):
+            spike = (state['n'] > params['warmup']) & (np.abs(state['z']) >= params['spike_z'])
+        spike &= state['missing'] == 0
+        flatline = (state['same'] >= params['flatline_hours'] - 1) & self._flatline_mask & (state['missing'] == 0)
+        # 從未回報過的 (測站, 污染物) 沒有可中斷的讀值，不算斷訊
+        dropout = (state['missing'] >= params['dropout_hours']) & (state['n'] > 0)
+        return {'spike': spike, 'flatline': flatline, 'dropout': dropout}
+
+    def alerts(self):
+        """候選警示 DataFrame：station、column、kind、value、z（依 |z| 由大到小）"""
+        rows = []
+        for kind, mask in self.flags().items():
+            station_idx, column_idx = np.nonzero(mask)
+            rows.append(pd.DataFrame({
+                'station': np.asarray(self.stations, dtype=object)[station_idx],
+                'column': np.asarray(self.columns, dtype=object)[column_idx],
+                'kind': kind,
+                'value': self._state['last'][station_idx, column_idx],
+                'z': self._state['z'][station_idx, column_idx],
+            }))
+        alerts = pd.concat(rows, ignore_index=True)
+        order = np.argsort(-np.nan_to_num(np.abs(alerts['z'].to_numpy(dtype=np.float64))), kind='stable')
+        return alerts.iloc[order].reset_index(drop=True)
+
+    def attach(self, frame, station_column='sitename'):
+        """
+        在測站資料加上 anomaly（例如「PM2.5 突波、O3 斷訊」，沒有異常為空字串）
+        與 anomaly_dropout（PM2.5 斷訊）欄位，返回淺複製
+        """
+        df = frame.copy(deep=False)
+        flags = self.flags()
+        labels = np.full(len(self.stations), '', dtype=object)
+        for kind, mask in flags.items():
+            for c, col in enumerate(self.columns):
+                hit = mask[:, c]
+                text = f'{_COLUMN_LABELS.get(col, col)} {ANOMALY_LABELS[kind]}'
+                labels[hit] = np.where(labels[hit] == '', text, labels[hit] + '、' + text)
+
+        rows = df[station_column].astype(str).map(self._index)
+        found = rows.notna().to_numpy()
+        rows = rows.fillna(0).to_numpy(dtype=np.int64)
+        df['anomaly'] = np.where(found, labels[rows], '')
+        pm25 = self.columns.index('pm25') if 'pm25' in self.columns else None
+        df['anomaly_dropout'] = found & (flags['dropout'][rows, pm25] if pm25 is not None else False)
+        return df
+
+    # ---------- 保存 ----------
+
+    def to_state(self):
+        """可由 SnapshotStore.save_state 保存的狀態 (發布小時, DataFrame)"""
+        frame = pd.DataFrame({'station': self.stations})
+        for field in _STATE_FIELDS:
+            for c, col in enumerate(self.columns):
+                frame[f'{col}_{field}'] = self._state[field][:, c]
+        return (self.hour, frame)
+
+    @classmethod
+    def from_state(cls, state, columns=ANOMALY_COLUMNS, params=None):
+        """由 to_state 的結果還原；state 為 None（第一次啟動）時返回新的偵測器"""
+        detector = cls(columns, params)
+        if state is None:
+            return detector
+        hour, frame = state
+        detector.hour = int(hour)
+        detector._rows(frame['station'].astype(str).tolist())
+        for field, dtype in _STATE_FIELDS.items():
+            for c, col in enumerate(detector.columns):
+                if f'{col}_{field}' in frame.columns:
+                    detector._state[field][:, c] = frame[f'{col}_{field}'].to_numpy(dtype=dtype)
+        return detector
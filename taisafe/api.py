@@ -0,0 +1,332 @@
+"""
+唯讀 HTTP API：從共用快照庫提供目前資料、最近測站／避難點與災害情境
+給簡訊閘道、數位看板等外部系統使用；只讀擷取程序寫入的快照，不會呼叫上游 API
+
+    python -m taisafe.api --port 8765
+    curl -H 'Accept-Encoding: gzip' localhost:8765/v1/snapshots/air_quality
+    curl 'localhost:8765/v1/snapshots/air_quality?format=arrow' > air.arrow
+    curl 'localhost:8765/v1/nearest/shelter?lat=22.99&lon=120.22&k=3'
+
+端點：
+    /v1/sources                       各來源最新版本與資料時間
+    /v1/snapshots/<來源>?參數          最新快照（空品／水質帶 region，cameras / wind 帶 lat、lon 等）
+    /v1/nearest/station?lat=&lon=&k=  最近的空品測站（所在區域由座標判斷，可用 region 指定）
+    /v1/nearest/shelter?lat=&lon=&k=  全國最近的避難點
+    /v1/scenarios                     可用情境
+    /v1/scenarios/<情境>?region=&seed= 以目前快照套用情境後的測站資料
+
+每個回應依資料版本產生 ETag（If-None-Match 命中返回 304），快照類回應以 Last-Modified
+標示擷取程序最後抓取的時間，並依 Accept-Encoding 提供 gzip；表格資料可用 ?format=arrow 或
+Accept: application/vnd.apache.arrow.stream 取得 Arrow IPC
+"""
+
+import argparse
+import gzip
+import hashlib
+import inspect
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from .cache import LRUCache
+from .geo import distance_km
+from .ingest import SOURCES, source_args
+from .regions import DEFAULT_REGION, REGIONS, all_shelters, nearest_region
+from .scenarios import DisasterScenario
+from .snapshots import SNAPSHOT_DB_PATH, SnapshotStore, encode_snapshot
+
+API_PORT = 8765
+# 同一快照多久向快照庫確認一次版本（秒）；期間內的請求完全不查資料庫
+API_VERSION_CHECK_SECONDS = 1
+# 已編碼回應的快取數量
+API_RESPONSE_CACHE_ENTRIES = 512
+# 小於此大小的回應不壓縮（位元組）
+API_GZIP_MIN_BYTES = 512
+# 最近測站／避難點最多返回幾筆
+API_NEAREST_MAX = 20
+# 快照超過來源更新間隔幾倍仍未更新時，再要求擷取程序抓取（擷取程序會停止輪詢久未被要求的參數）
+API_STALE_FACTOR = 2
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+JSON_MIME = 'application/json; charset=utf-8'
+
+# 可由 API 套用的情境：情境名稱 -> (套用的來源, 情境函數)
+API_SCENARIOS = {
+    'earthquake': ('air_quality', DisasterScenario.earthquake),
+    'flooding': ('air_quality', DisasterScenario.flooding),
+    'war_alert': ('air_quality', DisasterScenario.war_alert),
+    'air_pollution': ('air_quality', DisasterScenario.air_pollution),
+    'water_contamination': ('water_quality', DisasterScenario.water_contamination),
+}
+
+class APIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# ===========================================
+# 回應編碼
+# ===========================================
+
+def _to_json(value):
+    """抓取結果 -> JSON；DataFrame 轉為 records"""
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient='records', force_ascii=False))
+    if isinstance(value, tuple):
+        return [_to_json(item) for item in value]
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    return value
+
+def _encode(value, fmt):
+    """返回 (Content-Type, 內容)"""
+    if fmt == 'arrow':
+        frame = value[0] if isinstance(value, tuple) else value
+        if not isinstance(frame, pd.DataFrame):
+            raise APIError(406, "此端點沒有表格資料，無法以 Arrow 格式提供")
+        _, body = encode_snapshot(frame)
+        return ARROW_MIME, body
+    body = json.dumps(_to_json(value), ensure_ascii=False, separators=(',', ':'), default=str)
+    return JSON_MIME, body.encode('utf-8')
+
+def _query_float(query, name):
+    try:
+        return float(query[name])
+    except KeyError:
+        raise APIError(400, f"缺少參數 {name}")
+    except ValueError:
+        raise APIError(400, f"參數 {name} 必須是數字")
+
+def _query_int(query, name, default, lower, upper):
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise APIError(400, f"參數 {name} 必須是整數")
+    return min(max(value, lower), upper)
+
+# ===========================================
+# API
+# ===========================================
+
+class SnapshotAPI:
+    """
+    與 HTTP 伺服器分離的端點邏輯
+    每個回應以 (路徑, 參數, 資料版本, 格式) 為鍵快取已編碼的內容與 gzip 版本，
+    同一版本的重複請求只做一次字典查詢
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._responses = LRUCache(max_entries=API_RESPONSE_CACHE_ENTRIES)
+        self._heads = {}   # (來源, 參數) -> (確認時間, 快照)
+        self._lock = threading.Lock()
+        self._routes = {
+            'sources': self._sources,
+            'snapshots': self._snapshot,
+            'nearest': self._nearest,
+            'scenarios': self._scenario,
+        }
+
+    def handle(self, target, accept='', accept_encoding='', if_none_match=None):
+        """處理 GET 請求，返回 (狀態碼, 標頭, 內容)"""
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        parts = [part for part in url.path.split('/') if part]
+        fmt = query.pop('format', None) or ('arrow' if ARROW_MIME in accept else 'json')
+        try:
+            if fmt not in ('json', 'arrow'):
+                raise APIError(400, "format 只能是 json 或 arrow")
+            if len(parts) < 2 or parts[0] != 'v1' or parts[1] not in self._routes:
+                raise APIError(404, "找不到此端點")
+            token, build, fetched_at = self._routes[parts[1]](parts[2:], query)
+            key = (url.path, tuple(sorted(query.items())), token, fmt)
+            response = self._responses.get(key)
+            if response is None:
+                content_type, body = _encode(build(), fmt)
+                etag = '"' + hashlib.blake2b(repr(key).encode('utf-8'), digest_size=12).hexdigest() + '"'
+                gzipped = gzip.compress(body, compresslevel=6) if len(body) >= API_GZIP_MIN_BYTES else None
+                response = (etag, content_type, body, gzipped)
+                self._responses[key] = response
+        except APIError as error:
+            body = json.dumps({'error': str(error)}, ensure_ascii=False).encode('utf-8')
+            return error.status, {'Content-Type': JSON_MIME}, body
+
+        etag, content_type, body, gzipped = response
+        if gzipped is not None and 'gzip' in accept_encoding:
+            # 不同編碼的內容位元組不同，ETag 也要不同
+            etag, body = etag[:-1] + '-gz"', gzipped
+            headers = {'Content-Encoding': 'gzip'}
+        else:
+            headers = {}
+        headers.update({'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept, Accept-Encoding'})
+        if fetched_at is not None:
+            # 同一版本的資料時間會隨重新抓取更新，不放進快取的回應
+            headers['Last-Modified'] = formatdate(fetched_at, usegmt=True)
+        if if_none_match is not None and etag in if_none_match:
+            return 304, headers, b''
+        headers['Content-Type'] = content_type
+        return 200, headers, body
+
+    def _latest(self, source, args):
+        """
+        最新快照；API_VERSION_CHECK_SECONDS 內不重複查詢快照庫
+        快照過舊時（擷取程序已停止輪詢這組參數）再要求抓取，仍先返回現有快照
+        """
+        now = time.monotonic()
+        with self._lock:
+            head = self._heads.get((source, args))
+        if head is not None and now - head[0] < API_VERSION_CHECK_SECONDS:
+            return head[1]
+
+        snapshot = self.store.latest(source, args)
+        if snapshot is None:
+            # 讓擷取程序補抓這組參數，API 本身不呼叫上游
+            self.store.request(source, args)
+            raise APIError(404, f"{source}{list(args)} 尚無快照，已要求擷取程序抓取")
+        if time.time() - snapshot['fetched_at'] > API_STALE_FACTOR * SOURCES[source][1]:
+            self.store.request(source, args)
+        with self._lock:
+            self._heads[(source, args)] = (now, snapshot)
+        return snapshot
+
+    def _source_args(self, source, query):
+        """查詢參數 -> 抓取函數參數（依預設值型別轉換）"""
+        params = inspect.signature(SOURCES[source][0]).parameters
+        kwargs = {}
+        for name, value in query.items():
+            if name not in params:
+                raise APIError(400, f"{source} 不接受參數 {name}")
+            if name == 'region':
+                self._region(query, DEFAULT_REGION)
+            default = params[name].default
+            try:
+                kwargs[name] = type(default)(value) if default is not inspect.Parameter.empty else value
+            except ValueError:
+                raise APIError(400, f"參數 {name} 格式錯誤")
+        return source_args(source, **kwargs)
+
+    def _region(self, query, default):
+        region = query.get('region', default)
+        if region not in REGIONS:
+            raise APIError(400, f"未知的區域，可用：{', '.join(REGIONS)}")
+        return region
+
+    # ---------- 端點 ----------
+
+    def _sources(self, rest, query):
+        # 返回絕對的資料時間而非經過秒數，內容只隨版本與抓取時間改變，可以快取
+        status = [{key: value for key, value in item.items() if key != 'age_s'}
+                  for item in self.store.status()]
+        token = tuple(sorted((item['source'], repr(item['args']), item['version'], item['fetched_at'])
+                             for item in status))
+        fetched_at = max((item['fetched_at'] for item in status), default=None)
+        return token, lambda: status, fetched_at
+
+    def _snapshot(self, rest, query):
+        if len(rest) != 1 or rest[0] not in SOURCES:
+            raise APIError(404, f"未知的資料來源，可用：{', '.join(SOURCES)}")
+        snapshot = self._latest(rest[0], self._source_args(rest[0], query))
+        return snapshot['version'], lambda: snapshot['value'], snapshot['fetched_at']
+
+    def _nearest(self, rest, query):
+        if rest == ['station']:
+            lat, lon = _query_float(query, 'lat'), _query_float(query, 'lon')
+            k = _query_int(query, 'k', 1, 1, API_NEAREST_MAX)
+            region = self._region(query, nearest_region(lat, lon))
+            snapshot = self._latest('air_quality', (region,))
+
+            def build():
+                stations = snapshot['value'][0]
+                distance = distance_km(stations['lat'].to_numpy(), stations['lon'].to_numpy(), lat, lon)
+                order = np.argsort(distance)[:k]
+                return stations.iloc[order].assign(distance_km=np.round(distance[order], 3))
+            return snapshot['version'], build, snapshot['fetched_at']
+
+        if rest == ['shelter']:
+            lat, lon = _query_float(query, 'lat'), _query_float(query, 'lon')
+            k = _query_int(query, 'k', 1, 1, API_NEAREST_MAX)
+
+            def build():
+                shelters = pd.DataFrame(all_shelters())
+                distance = distance_km(shelters['lat'].to_numpy(), shelters['lon'].to_numpy(), lat, lon)
+                order = np.argsort(distance)[:k]
+                return shelters.iloc[order].assign(distance_km=np.round(distance[order], 3))
+            return 'static', build, None
+
+        raise APIError(404, "可用：/v1/nearest/station、/v1/nearest/shelter")
+
+    def _scenario(self, rest, query):
+        if not rest:
+            return 'static', lambda: [{'scenario': name, 'source': source}
+                                      for name, (source, _) in API_SCENARIOS.items()], None
+        if len(rest) != 1 or rest[0] not in API_SCENARIOS:
+            raise APIError(404, f"未知的情境，可用：{', '.join(API_SCENARIOS)}")
+
+        source, scenario = API_SCENARIOS[rest[0]]
+        region = self._region(query, DEFAULT_REGION)
+        snapshot = self._latest(source, (region,))
+        kwargs = {'region': region} if rest[0] == 'flooding' else {}
+        if 'seed' in query:
+            if rest[0] != 'air_pollution':
+                raise APIError(400, "只有 air_pollution 情境接受 seed")
+            kwargs['seed'] = _query_int(query, 'seed', 0, 0, 2 ** 31)
+        return snapshot['version'], lambda: scenario(snapshot['value'][0], **kwargs), snapshot['fetched_at']
+
+# ===========================================
+# HTTP 伺服器
+# ===========================================
+
+class _Handler(BaseHTTPRequestHandler):
+    # 長連線：看板等客戶端輪詢時不必每次重新建立 TCP 連線
+    protocol_version = 'HTTP/1.1'
+    # 標頭與內容分開送出，關閉 Nagle 避免與延遲 ACK 互等
+    disable_nagle_algorithm = True
+    api = None
+
+    def do_GET(self):
+        status, headers, body = self.api.handle(
+            self.path,
+            accept=self.headers.get('Accept', ''),
+            accept_encoding=self.headers.get('Accept-Encoding', ''),
+            if_none_match=self.headers.get('If-None-Match')
+        )
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 高請求量下不逐筆輸出存取紀錄
+        pass
+
+def make_server(store, host='0.0.0.0', port=API_PORT):
+    """建立 API 伺服器（呼叫端負責 serve_forever）"""
+    handler = type('SnapshotAPIHandler', (_Handler,), {'api': SnapshotAPI(store)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TAI-SAFE 唯讀 HTTP API")
+    parser.add_argument('--db', default=SNAPSHOT_DB_PATH, help="快照庫路徑")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=API_PORT)
+    options = parser.parse_args(argv)
+
+    server = make_server(SnapshotStore(options.db), options.host, options.port)
+    print(f"TAI-SAFE API 監聽 http://{options.host}:{options.port}/v1/sources")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+空氣品質指標（AQI）
+依環境部 AQI 分級表（105 年 12 月起）以 np.searchsorted 對整個陣列查表內插，
+測站、避難點或網格一次計算；有滾動平均欄位（taisafe.aggregates）時使用規定的平均時間
+"""
+
+import numpy as np
+import pandas as pd
+
+# AQI 級距
+AQI_INDEX_LOW = np.array([0, 51, 101, 151, 201, 301, 401], dtype=np.float64)
+AQI_INDEX_HIGH = np.array([50, 100, 150, 200, 300, 400, 500], dtype=np.float64)
+
+# 子指標 -> (小數位數, 起始級距, 濃度下限, 濃度上限)
+#   o3_8h / o3_1h: ppb（臭氧八小時值只到 200 ppb，更高時以小時值計算；小時值自 125 ppb 起適用）
+#   pm25 / pm10:   μg/m³，移動平均
+#   co_8h:         ppm，八小時平均
+#   so2:           ppb，小時值；305 ppb 以上改用 24 小時平均
+#   no2:           ppb，小時值
+AQI_BREAKPOINTS = {
+    'o3_8h': (0, 0, [0, 55, 71, 86, 106], [54, 70, 85, 105, 200]),
+    'o3_1h': (0, 2, [125, 165, 205, 405, 505], [164, 204, 404, 504, 604]),
+    'pm25': (1, 0, [0.0, 15.5, 35.5, 54.5, 150.5, 250.5, 350.5], [15.4, 35.4, 54.4, 150.4, 250.4, 350.4, 500.4]),
+    'pm10': (0, 0, [0, 55, 126, 255, 355, 425, 505], [54, 125, 254, 354, 424, 504, 604]),
+    'co_8h': (1, 0, [0.0, 4.5, 9.5, 12.5, 15.5, 30.5, 40.5], [4.4, 9.4, 12.4, 15.4, 30.4, 40.4, 50.4]),
+    'so2': (0, 0, [0, 21, 76, 186, 305, 605, 805], [20, 75, 185, 304, 604, 804, 1004]),
+    'no2': (0, 0, [0, 31, 101, 361, 650, 1250, 1650], [30, 100, 360, 649, 1249, 1649, 2049]),
+}
+
+# 子指標 -> 指標污染物名稱（同環境部 pollutant 欄位）
+AQI_POLLUTANT_NAMES = {
+    'o3_8h': '臭氧八小時',
+    'o3_1h': '臭氧',
+    'pm25': '細懸浮微粒',
+    'pm10': '懸浮微粒',
+    'co_8h': '一氧化碳八小時',
+    'so2': '二氧化硫',
+    'no2': '二氧化氮',
+}
+
+def _column(data, name):
+    """欄位 -> float64 陣列（無法解析的值為 NaN），沒有此欄位時返回 None"""
+    if name not in data:
+        return None
+    values = np.asarray(data[name]).ravel()
+    if values.dtype.kind in 'fiub':
+        return values.astype(np.float64, copy=False)
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+def aqi_concentrations(data, use_averages=True):
+    """
+    各子指標使用的濃度 {子指標: 陣列}
+    use_averages 為 True 且有滾動平均欄位時：PM2.5 / PM10 為 0.5 × 12 小時平均 + 0.5 × 4 小時平均，
+    臭氧與一氧化碳為八小時平均，SO2 高濃度時為 24 小時平均；缺平均值的測站以即時值代替
+    """
+    def averaged(instant, average):
+        if instant is None or average is None:
+            return instant if average is None else average
+        return np.where(np.isnan(average), instant, average)
+
+    def moving(name):
+        instant = _column(data, name)
+        if not use_averages:
+            return instant
+        long_avg, short_avg = _column(data, f'{name}_12h'), _column(data, f'{name}_4h')
+        if long_avg is None or short_avg is None:
+            return instant
+        return averaged(instant, 0.5 * long_avg + 0.5 * short_avg)
+
+    o3 = _column(data, 'o3')
+    so2 = _column(data, 'so2')
+    if use_averages and so2 is not None:
+        so2_24h = _column(data, 'so2_24h')
+        if so2_24h is not None:
+            so2 = np.where((so2 >= 305) & ~np.isnan(so2_24h), so2_24h, so2)
+
+    return {
+        'o3_8h': averaged(o3, _column(data, 'o3_8h') if use_averages else None),
+        'o3_1h': o3,
+        'pm25': moving('pm25'),
+        'pm10': moving('pm10'),
+        'co_8h': averaged(_column(data, 'co'), _column(data, 'co_8h') if use_averages else None),
+        'so2': so2,
+        'no2': _column(data, 'no2'),
+    }
+
+def sub_index(name, concentration):
+    """
+    單一子指標：濃度截位到分級表的小數位數後查表線性內插
+    低於分級表下限（臭氧小時值 < 125 ppb）或超出分級表（臭氧八小時值 > 200 ppb）時為 NaN，
+    超過最高級距時為 500
+    """
+    decimals, first_level, lows, highs = AQI_BREAKPOINTS[name]
+    lows, highs = np.asarray(lows, dtype=np.float64), np.asarray(highs, dtype=np.float64)
+    scale = 10.0 ** decimals
+    c = np.floor(np.asarray(concentration, dtype=np.float64) * scale + 1e-9) / scale
+
+    idx = np.searchsorted(lows, c, side='right') - 1
+    valid = (idx >= 0) & ~np.isnan(c)
+    idx = np.clip(idx, 0, len(lows) - 1)
+    level = first_level + idx
+    index = ((AQI_INDEX_HIGH[level] - AQI_INDEX_LOW[level]) / (highs[idx] - lows[idx]) *
+             (np.minimum(c, highs[idx]) - lows[idx]) + AQI_INDEX_LOW[level])
+
+    above = c > highs[-1]
+    top_level = first_level + len(lows) - 1 == len(AQI_INDEX_HIGH) - 1
+    index = np.where(above, 500.0 if top_level else np.nan, index)
+    return np.where(valid, index, np.nan)
+
+def compute_aqi(data, use_averages=True):
+    """
+    data: DataFrame 或 {欄位: 陣列}（pm25、pm10、o3、co、so2、no2，缺的污染物不計）
+    返回 (AQI 陣列, 指標污染物陣列)；AQI 取各子指標最大值並四捨五入，
+    全部子指標都無法計算時為 NaN；AQI ≤ 50 時不標示指標污染物
+    """
+    concentrations = aqi_concentrations(data, use_averages)
+    names = [name for name, values in concentrations.items() if values is not None]
+    if not names:
+        n = len(next(iter(data.values()))) if isinstance(data, dict) else len(data)
+        return np.full(n, np.nan), np.full(n, '', dtype=object)
+
+    subs = np.stack([sub_index(name, concentrations[name]) for name in names])
+    filled = np.where(np.isnan(subs), -np.inf, subs)
+    dominant = filled.argmax(axis=0)
+    best = filled.max(axis=0)
+    aqi = np.where(np.isinf(best), np.nan, np.floor(best + 0.5))
+
+    labels = np.array([AQI_POLLUTANT_NAMES[name] for name in names], dtype=object)[dominant]
+    pollutant = np.where(aqi > 50, labels, '').astype(object)
+    return aqi, pollutant
+
+def apply_aqi(df, use_averages=True, keep_reported=False):
+    """
+    加上 aqi（數值）與 aqi_pollutant 欄位，返回淺複製
+    keep_reported 為 True 時保留資料中已有的 AQI（環境部發布值），只補算缺值
+    """
+    df = df.copy(deep=False)
+    aqi, pollutant = compute_aqi(df, use_averages)
+    if keep_reported and 'aqi' in df.columns:
+        reported = pd.to_numeric(df['aqi'], errors='coerce').to_numpy(dtype=np.float64)
+        has_reported = ~np.isnan(reported)
+        aqi = np.where(has_reported, reported, aqi)
+        if 'aqi_pollutant' in df.columns:
+            pollutant = np.where(has_reported, df['aqi_pollutant'].fillna('').to_numpy(dtype=object), pollutant)
+    df['aqi'] = aqi
+    df['aqi_pollutant'] = pollutant
+    return df
@@ -0,0 +1,28 @@
+"""
+共用的記憶體快取
+"""
+
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """有上限的 LRU 快取（跨 session 共用，執行緒安全）"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,476 @@
+"""
+監視攝影機：快照代理、健康檢查與畫面變化偵測
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+
+import numpy as np
+import requests
+import urllib3
+from PIL import Image, ImageDraw
+
+# 禁用 SSL 警告
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# ===========================================
+# 攝影機畫面變化偵測（NumPy）
+# ===========================================
+
+# 分析用灰階影像尺寸（寬, 高）
+SCENE_ANALYSIS_SIZE = (64, 48)
+
+# 背景模型更新速率
+SCENE_BACKGROUND_ALPHA = 0.1
+
+# 像素與背景亮度差超過此值視為變化
+SCENE_PIXEL_DELTA = 25.0
+
+# 變化像素比例超過此值視為畫面突變
+SCENE_CHANGE_RATIO = 0.3
+
+# 平均亮度低於此值或亮度幾乎一致視為黑畫面
+SCENE_BLACKOUT_MEAN = 12.0
+SCENE_BLACKOUT_STD = 3.0
+
+# 與前一張的平均差低於此值視為未變動，畫面持續未變動達秒數即判定凍結
+# （縮小取平均後感測器雜訊已大幅降低，門檻需很小；
+#  以經過時間而非張數判定，健康檢查與快照代理各自抓取同一支攝影機時不會提早誤判，
+#  與攝影機快照逾時 CAMERA_STALE_SECONDS 一致）
+SCENE_FROZEN_DELTA = 0.05
+SCENE_FROZEN_SECONDS = 600
+
+SCENE_FLAG_LABELS = {
+    'change': '畫面突變',
+    'blackout': '黑畫面',
+    'frozen': '畫面凍結'
+}
+
+class SceneChangeDetector:
+    """
+    攝影機畫面變化偵測
+    每支攝影機以低解析度灰階影像維護移動平均背景，
+    每次取得新快照時計算與背景的差異，標記突變、黑畫面與凍結畫面並給出關注分數；
+    同一張影像（原始位元組相同）只分析一次，重複抓到時僅依經過時間更新凍結判定；
+    所有攝影機的狀態存放在連續陣列中，數百支攝影機也只需少量 CPU
+    """
+
+    def __init__(self, capacity=64):
+        width, height = SCENE_ANALYSIS_SIZE
+        self._index = {}   # cam_url -> 列索引
+        self._background = np.zeros((capacity, height, width), dtype=np.float32)
+        self._previous = np.zeros((capacity, height, width), dtype=np.float32)
+        self._changed_at = np.zeros(capacity, dtype=np.float64)   # 畫面最後一次變動的時間
+        self._digests = {}   # cam_url -> 最近一次分析的原始快照摘要
+        self._results = {}   # cam_url -> 最近一次分析結果
+        self._lock = threading.Lock()
+
+    def update(self, url, image, digest=None):
+        """
+        以新快照（PIL 影像）更新該攝影機的背景並返回分析結果
+        digest 為原始快照的摘要；與上次分析的相同時不重複分析，只重新判定凍結
+        """
+        now = time.time()
+        with self._lock:
+            if digest is not None and url in self._results and self._digests.get(url) == digest:
+                return self._refresh_frozen(url, now)
+
+        # 先縮小再轉灰階，大圖的前處理成本約降為三分之一
+        frame = np.asarray(image.resize(SCENE_ANALYSIS_SIZE, reducing_gap=2.0).convert('L'), dtype=np.float32)
+
+        with self._lock:
+            row = self._index.get(url)
+            first_frame = row is None
+            if first_frame:
+                row = self._allocate(url)
+                # 第一張影像直接作為背景
+                self._background[row] = frame
+                self._previous[row] = frame
+
+            background = self._background[row]
+            change_ratio = float(np.mean(np.abs(frame - background) > SCENE_PIXEL_DELTA))
+            frame_delta = float(np.mean(np.abs(frame - self._previous[row])))
+            blackout = frame.mean() < SCENE_BLACKOUT_MEAN or frame.std() < SCENE_BLACKOUT_STD
+
+            if first_frame or frame_delta >= SCENE_FROZEN_DELTA:
+                self._changed_at[row] = now
+            frozen = now - self._changed_at[row] >= SCENE_FROZEN_SECONDS
+
+            background *= 1 - SCENE_BACKGROUND_ALPHA
+            background += SCENE_BACKGROUND_ALPHA * frame
+            self._previous[row] = frame
+            self._digests[url] = digest
+
+            result = self._result(change_ratio, blackout, frozen, now)
+            self._results[url] = result
+            return result
+
+    def _refresh_frozen(self, url, now):
+        """同一張快照再次抓到：沿用上次分析結果，只依經過時間更新凍結判定"""
+        previous = self._results[url]
+        frozen = now - self._changed_at[self._index[url]] >= SCENE_FROZEN_SECONDS
+        if frozen == ('frozen' in previous['flags']):
+            return previous
+        result = self._result(previous['change_ratio'], 'blackout' in previous['flags'], frozen, now)
+        self._results[url] = result
+        return result
+
+    @staticmethod
+    def _result(change_ratio, blackout, frozen, now):
+        flags = []
+        if change_ratio > SCENE_CHANGE_RATIO:
+            flags.append('change')
+        if blackout:
+            flags.append('blackout')
+        if frozen:
+            flags.append('frozen')
+
+        # 關注分數：黑畫面 1.0、凍結 0.7，否則依變化比例
+        score = min(change_ratio / SCENE_CHANGE_RATIO, 1.0)
+        if frozen:
+            score = max(score, 0.7)
+        if blackout:
+            score = 1.0
+
+        return {
+            'score': round(score, 3),
+            'change_ratio': round(change_ratio, 3),
+            'flags': flags,
+            'updated': now
+        }
+
+    def result(self, url):
+        with self._lock:
+            return self._results.get(url)
+
+    def rank(self, cameras):
+        """依關注分數由高到低排序（同分維持原順序，即距離順序）"""
+        def score(cam):
+            result = self.result(cam.get('cam_url'))
+            return result['score'] if result else 0.0
+        return sorted(cameras, key=score, reverse=True)
+
+    def _allocate(self, url):
+        row = len(self._index)
+        if row >= len(self._changed_at):
+            capacity = len(self._changed_at) * 2
+            self._background = self._grow(self._background, capacity)
+            self._previous = self._grow(self._previous, capacity)
+            self._changed_at = self._grow(self._changed_at, capacity)
+        self._index[url] = row
+        return row
+
+    @staticmethod
+    def _grow(array, capacity):
+        grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+# ===========================================
+# 攝影機快照代理（縮圖快取）
+# ===========================================
+
+# 每支攝影機最多每隔多久向來源抓一次快照（秒）
+SNAPSHOT_REFRESH_SECONDS = 60
+
+# 快照快取總容量上限（位元組）
+SNAPSHOT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# 各解析度的最長邊（像素）
+SNAPSHOT_SIZES = {
+    'thumb': 320,
+    'medium': 640,
+    'full': 1280
+}
+SNAPSHOT_JPEG_QUALITY = 80
+
+# 並行抓取快照的執行緒數
+SNAPSHOT_FETCH_WORKERS = 8
+
+# 多畫面拼接的單格尺寸（寬, 高）
+MOSAIC_TILE_SIZE = (320, 180)
+
+class CameraSnapshotProxy:
+    """
+    攝影機快照代理
+    每支攝影機在更新間隔內最多抓取一次，縮放並重新壓縮成多種解析度，
+    存入以位元組數為上限的 LRU 快取，所有 session 共用
+    """
+
+    def __init__(self, max_bytes=SNAPSHOT_CACHE_MAX_BYTES, refresh_seconds=SNAPSHOT_REFRESH_SECONDS,
+                 timeout=5, detector=None):
+        self.max_bytes = max_bytes
+        self.detector = detector
+        self.refresh_seconds = refresh_seconds
+        self.timeout = timeout
+        self._entries = OrderedDict()   # (url, size) -> JPEG bytes
+        self._total_bytes = 0
+        self._fetched_at = {}           # url -> 上次成功抓取時間
+        self._url_locks = {}            # url -> 鎖，同一網址同時只有一個請求
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=SNAPSHOT_FETCH_WORKERS,
+                                            thread_name_prefix='snapshot-fetch')
+
+    def get(self, url, size='medium'):
+        """
+        取得快照 JPEG
+        快取新鮮時直接返回；過期時重新抓取，失敗則返回舊快照（沒有則 None）
+        """
+        cached = self._lookup(url, size, require_fresh=True)
+        if cached is not None:
+            return cached
+
+        with self._url_lock(url):
+            # 等待鎖的期間可能已被其他 session 更新
+            cached = self._lookup(url, size, require_fresh=True)
+            if cached is not None:
+                return cached
+
+            raw = self._fetch(url)
+            variants = self.ingest(url, raw) if raw else None
+            if not variants:
+                return self._lookup(url, size, require_fresh=False)
+            return variants.get(size)
+
+    def ingest(self, url, raw):
+        """
+        寫入一張已抓取的原始快照（健康檢查探測時順便預熱快取）
+        返回各解析度的 JPEG，無法解碼時返回 None
+        """
+        image = self._decode(raw)
+        if image is None:
+            return None
+        if self.detector is not None:
+            # 健康檢查與快照代理可能抓到同一張快照，以摘要避免重複分析
+            self.detector.update(url, image, digest=hashlib.blake2b(raw, digest_size=16).digest())
+        variants = self._render_variants(image)
+        with self._lock:
+            for variant_size, data in variants.items():
+                self._store((url, variant_size), data)
+            self._fetched_at[url] = time.time()
+            self._evict()
+        return variants
+
+    def mosaic(self, urls, columns):
+        """
+        多畫面拼接
+        並行取得各攝影機的縮圖，於伺服器端拼成單張 JPEG；
+        以各格快照的抓取時間作為版本，任一格更新時才重新拼接
+        """
+        tiles = list(self._executor.map(lambda url: self.get(url, size='thumb'), urls))
+        with self._lock:
+            versions = tuple(self._fetched_at.get(url, 0) for url in urls)
+        key = (('mosaic', tuple(urls), columns, versions), 'mosaic')
+
+        cached = self._lookup_key(key)
+        if cached is not None:
+            return cached
+
+        data = self._compose(tiles, columns)
+        with self._lock:
+            self._store(key, data)
+            self._evict()
+        return data
+
+    def stats(self):
+        """快取統計：項目數、總位元組數"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total_bytes}
+
+    def _lookup(self, url, size, require_fresh):
+        with self._lock:
+            if require_fresh and time.time() - self._fetched_at.get(url, 0) > self.refresh_seconds:
+                return None
+        return self._lookup_key((url, size))
+
+    def _lookup_key(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def _url_lock(self, url):
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _fetch(self, url):
+        try:
+            response = requests.get(url, timeout=self.timeout, verify=False)
+            if response.status_code == 200 and response.content:
+                return response.content
+        except Exception:
+            pass
+        return None
+
+    def _decode(self, raw):
+        try:
+            return Image.open(BytesIO(raw)).convert('RGB')
+        except Exception:
+            return None
+
+    def _render_variants(self, image):
+        """輸出各解析度的 JPEG"""
+        variants = {}
+        for size, max_edge in SNAPSHOT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((max_edge, max_edge))
+            buffer = BytesIO()
+            resized.save(buffer, format='JPEG', quality=SNAPSHOT_JPEG_QUALITY, optimize=True)
+            variants[size] = buffer.getvalue()
+        return variants
+
+    def _compose(self, tiles, columns):
+        """將各格 JPEG 置中貼到畫布上，左上角標示編號，缺圖的格子顯示離線"""
+        tile_w, tile_h = MOSAIC_TILE_SIZE
+        rows = -(-len(tiles) // columns)
+        canvas = Image.new('RGB', (columns * tile_w, rows * tile_h), (20, 20, 20))
+        draw = ImageDraw.Draw(canvas)
+
+        for i, data in enumerate(tiles):
+            x0, y0 = (i % columns) * tile_w, (i // columns) * tile_h
+            image = self._decode(data) if data else None
+            if image is not None:
+                image.thumbnail(MOSAIC_TILE_SIZE)
+                canvas.paste(image, (x0 + (tile_w - image.width) // 2, y0 + (tile_h - image.height) // 2))
+            else:
+                draw.rectangle([x0, y0, x0 + tile_w - 1, y0 + tile_h - 1], fill=(60, 60, 60))
+                draw.text((x0 + tile_w // 2 - 24, y0 + tile_h // 2 - 6), "OFFLINE", fill=(200, 200, 200))
+            draw.rectangle([x0, y0, x0 + 22, y0 + 18], fill=(0, 0, 0))
+            draw.text((x0 + 6, y0 + 3), str(i + 1), fill=(255, 255, 255))
+
+        buffer = BytesIO()
+        canvas.save(buffer, format='JPEG', quality=SNAPSHOT_JPEG_QUALITY, optimize=True)
+        return buffer.getvalue()
+
+    def _store(self, key, data):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_bytes -= len(old)
+        self._entries[key] = data
+        self._total_bytes += len(data)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, data = self._entries.popitem(last=False)
+            self._total_bytes -= len(data)
+
+# ===========================================
+# 攝影機健康檢查（背景並行探測）
+# ===========================================
+
+# 同時探測的攝影機數量上限
+CAMERA_PROBE_WORKERS = 8
+
+# 單次探測逾時（秒）
+CAMERA_PROBE_TIMEOUT = 3
+
+# 同一支攝影機兩次探測的最短間隔（秒）
+CAMERA_PROBE_INTERVAL = 60
+
+# 影像超過此時間未更新視為停滯（秒）
+CAMERA_STALE_SECONDS = 600
+
+class CameraHealthChecker:
+    """
+    攝影機健康檢查
+    以有上限的執行緒池並行探測快照網址，記錄延遲、最後成功時間與影像新鮮度，
+    狀態表由所有 session 共用；探測成功的影像同時寫入快照代理
+    """
+
+    def __init__(self, proxy, max_workers=CAMERA_PROBE_WORKERS, timeout=CAMERA_PROBE_TIMEOUT,
+                 interval=CAMERA_PROBE_INTERVAL):
+        self.proxy = proxy
+        self.timeout = timeout
+        self.interval = interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='camera-probe')
+        self._status = {}      # cam_url -> 狀態紀錄
+        self._in_flight = {}   # cam_url -> Future
+        self._lock = threading.Lock()
+
+    def check(self, cameras, wait_seconds=0):
+        """
+        對狀態過期的攝影機排入背景探測，返回目前的狀態表 {cam_url: 紀錄}
+        wait_seconds > 0 時最多等待該時間讓尚無紀錄的攝影機取得首次結果
+        """
+        now = time.time()
+        first_round = []
+        with self._lock:
+            for cam in cameras:
+                url = cam.get('cam_url')
+                if not url or url in self._in_flight:
+                    continue
+                record = self._status.get(url)
+                if record is not None and now - record['last_checked'] < self.interval:
+                    continue
+                future = self._executor.submit(self._probe, url)
+                self._in_flight[url] = future
+                if record is None:
+                    first_round.append(future)
+
+        if first_round and wait_seconds > 0:
+            wait(first_round, timeout=wait_seconds)
+        return self.snapshot()
+
+    def snapshot(self):
+        """狀態表的複本"""
+        with self._lock:
+            return {url: dict(record) for url, record in self._status.items()}
+
+    def status_of(self, camera, table):
+        """單一攝影機的狀態代碼"""
+        url = camera.get('cam_url')
+        if not url:
+            return 'unknown'
+        record = table.get(url)
+        return record['status'] if record else 'checking'
+
+    def _probe(self, url):
+        started = time.perf_counter()
+        raw, image_time = None, None
+        try:
+            response = requests.get(url, timeout=self.timeout, verify=False)
+            if response.status_code == 200 and response.content:
+                raw = response.content
+                last_modified = response.headers.get('Last-Modified')
+                if last_modified:
+                    image_time = parsedate_to_datetime(last_modified).timestamp()
+        except Exception:
+            pass
+        latency_ms = (time.perf_counter() - started) * 1000
+        decoded = raw is not None and self.proxy.ingest(url, raw) is not None
+
+        now = time.time()
+        with self._lock:
+            record = self._status.get(url, {'last_success': None, 'failures': 0})
+            record['last_checked'] = now
+            record['latency_ms'] = round(latency_ms, 1)
+            if decoded:
+                record['last_success'] = now
+                record['failures'] = 0
+                record['image_age_s'] = round(now - image_time, 1) if image_time else None
+                stale = record['image_age_s'] is not None and record['image_age_s'] > CAMERA_STALE_SECONDS
+                record['status'] = 'stale' if stale else 'online'
+            else:
+                record['failures'] += 1
+                record['image_age_s'] = None
+                record['status'] = 'offline'
+            self._status[url] = record
+            self._in_flight.pop(url, None)
+
+def select_live_cameras(cameras, table, checker, limit=5):
+    """依距離挑選最近且未離線的攝影機，並附上實際狀態"""
+    live = []
+    for cam in cameras:
+        status = checker.status_of(cam, table)
+        if status == 'offline':
+            continue
+        live.append(dict(cam, status=status, health=table.get(cam.get('cam_url'))))
+        if len(live) >= limit:
+            break
+    return live
@@ -0,0 +1,75 @@
+"""
+地理與風場運算：距離、反距離加權內插、風向換算
+"""
+
+import math
+
+import numpy as np
+
+# ===========================================
+# 成功大學座標 (WGS84)
+# ===========================================
+
+NCKU_CENTER = {
+    'lat': 22.9971,
+    'lon': 120.2218
+}
+
+# ===========================================
+# 距離與內插
+# ===========================================
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """兩點間的近似距離（公里，每度約 111 公里），可傳入陣列"""
+    return np.sqrt((np.asarray(lat1) - lat2)**2 + (np.asarray(lon1) - lon2)**2) * 111
+
+def idw(src_lat, src_lon, values, dst_lat, dst_lon, power=2):
+    """反距離加權內插（缺值的來源點不參與）"""
+    valid = ~np.isnan(values)
+    if not valid.all():
+        src_lat, src_lon, values = src_lat[valid], src_lon[valid], values[valid]
+    dist_sq = (dst_lat[:, None] - src_lat[None, :])**2 + (dst_lon[:, None] - src_lon[None, :])**2
+    weights = 1.0 / np.maximum(dist_sq, 1e-12) ** (power / 2)
+    return (weights @ values) / weights.sum(axis=1)
+
+# ===========================================
+# 風向換算
+# ===========================================
+
+def calculate_wind_direction_and_speed(u, v):
+    """
+    從 u, v 風分量計算風向和風速
+    參數:
+        u: 東西向風速 (m/s)，正值表示向東
+        v: 南北向風速 (m/s)，正值表示向北
+    返回:
+        direction: 風向角度 (0-360度，0度為北風)
+        speed: 風速 (m/s)
+        direction_text: 風向文字 (N, NE, E, SE, S, SW, W, NW)
+    """
+    # 計算風速
+    speed = math.sqrt(u**2 + v**2)
+
+    # 計算風向角度（風從哪裡來）
+    # atan2(y, x) 返回的是風往哪裡去，所以要加負號
+    direction_rad = math.atan2(-u, -v)
+    direction_deg = math.degrees(direction_rad)
+
+    # 轉換為 0-360 度
+    if direction_deg < 0:
+        direction_deg += 360
+
+    # 轉換為方位文字
+    direction_text = degree_to_direction_text(direction_deg)
+
+    return direction_deg, speed, direction_text
+
+def degree_to_direction_text(degree):
+    """
+    將角度轉換為方位文字
+    0度 = 北 (N), 90度 = 東 (E), 180度 = 南 (S), 270度 = 西 (W)
+    """
+    directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+    # 每個方位覆蓋 45 度，加上 22.5 度偏移來四捨五入到最近的方位
+    index = int((degree + 22.5) / 45) % 8
+    return directions[index]
@@ -0,0 +1,262 @@
+"""
+測站歷史時序資料庫（只追加）
+以 (測站, 發布時間) 為鍵，依日期分割：當天的資料寫入 SQLite（重複抓到相同發布時間時不重複寫入），
+過了當天後壓縮為 float32 欄位的 Parquet 檔；查詢只開啟時間範圍內的日期分割
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .cache import LRUCache
+from .ingest import WATER_QUALITY_COLUMNS
+from .timeutil import to_epoch
+
+# 歷史資料根目錄（可用環境變數 TAISAFE_HISTORY_DIR 指定）
+HISTORY_DIR = Path(os.environ.get('TAISAFE_HISTORY_DIR', os.path.join('.taisafe_cache', 'history')))
+
+# 資料集 -> 時間欄位與數值欄位
+HISTORY_DATASETS = {
+    'air_quality': {
+        'time': 'publishtime',
+        'columns': ['pm25', 'pm10', 'o3', 'co', 'so2', 'no2', 'aqi', 'wind_speed', 'wind_direc'],
+    },
+    'water_quality': {
+        'time': 'monitoring_date',
+        'columns': WATER_QUALITY_COLUMNS,
+    },
+}
+# 記憶體中保留的已壓縮日期分割數（Parquet 壓縮後不再變動，趨勢圖重複查詢不必重讀檔案）
+HISTORY_CACHE_DAYS = 64
+
+def _day_range(start, end):
+    """[start, end) 涵蓋的日期"""
+    day = start.date()
+    while datetime.combine(day, datetime.min.time()) < end:
+        yield day
+        day += timedelta(days=1)
+
+class HistoryStore:
+    """
+    單一資料集（空品或水質）的歷史時序
+    目錄結構：<root>/<資料集>/<YYYY-MM>/<YYYY-MM-DD>.db（當天）或 .parquet（已壓縮）
+    """
+
+    def __init__(self, dataset, root=HISTORY_DIR):
+        self.dataset = dataset
+        self.time_column = HISTORY_DATASETS[dataset]['time']
+        self.columns = list(HISTORY_DATASETS[dataset]['columns'])
+        self.root = Path(root) / dataset
+        self._conns = {}   # 日期 -> SQLite 連線
+        self._lock = threading.RLock()
+        self._cold = LRUCache(HISTORY_CACHE_DAYS)   # 日期 -> (檔案修改時間, Arrow Table)
+
+    # ---------- 路徑 ----------
+
+    def _path(self, day, suffix):
+        return self.root / f'{day:%Y-%m}' / f'{day:%Y-%m-%d}{suffix}'
+
+    def _conn(self, day):
+        conn = self._conns.get(day)
+        if conn is None:
+            path = self._path(day, '.db')
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            value_columns = ', '.join(f'"{col}" REAL' for col in self.columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS readings (station TEXT NOT NULL, ts INTEGER NOT NULL, "
+                         f"{value_columns}, PRIMARY KEY (station, ts)) WITHOUT ROWID")
+            # 舊分割缺少後來加入的欄位時補上
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(readings)")}
+            for col in self.columns:
+                if col not in existing:
+                    conn.execute(f'ALTER TABLE readings ADD COLUMN "{col}" REAL')
+            self._conns[day] = conn
+        return conn
+
+    # ---------- 寫入 ----------
+
+    def write(self, frame):
+        """
+        追加一次抓取的測站資料，返回新增筆數
+        同一 (測站, 發布時間) 已存在時略過，重複寫入同一批資料不會改變內容
+        """
+        times = pd.to_datetime(frame[self.time_column], errors='coerce', format='mixed')
+        valid = times.notna().to_numpy()
+        if not valid.any():
+            return 0
+
+        values = {col: pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64)[valid]
+                  if col in frame.columns else np.full(valid.sum(), np.nan)
+                  for col in self.columns}
+        stations = frame['sitename'].astype(str).to_numpy()[valid]
+        ts = to_epoch(times[valid])
+        days = pd.DatetimeIndex(times[valid]).date
+
+        placeholders = ', '.join('?' * (len(self.columns) + 2))
+        inserted = 0
+        with self._lock:
+            for day in sorted(set(days)):
+                mask = days == day
+                keep = mask & ~self._compacted_keys(day, stations, ts)
+                if not keep.any():
+                    continue
+                # SQLite 不認得 NaN，缺值存為 NULL
+                rows = zip(stations[keep].tolist(), ts[keep].tolist(),
+                           *[[None if np.isnan(v) else v for v in values[col][keep]] for col in self.columns])
+                conn = self._conn(day)
+                before = conn.total_changes
+                conn.execute("BEGIN")
+                conn.executemany(f"INSERT OR IGNORE INTO readings VALUES ({placeholders})", rows)
+                conn.execute("COMMIT")
+                inserted += conn.total_changes - before
+        return inserted
+
+    def _compacted_keys(self, day, stations, ts):
+        """已壓縮為 Parquet 的日期中已存在的鍵（遲到的資料寫回 SQLite，下次壓縮再合併）"""
+        table = self._cold_table(day)
+        if table is None:
+            return np.zeros(len(ts), dtype=bool)
+        existing = table.select(['station', 'ts']).to_pandas()
+        keys = pd.MultiIndex.from_arrays([existing['station'], existing['ts']])
+        return pd.MultiIndex.from_arrays([stations, ts]).isin(keys)
+
+    def compact(self, before=None):
+        """
+        將 before（預設今天）之前的 SQLite 日期分割壓縮為 Parquet
+        同一天已有 Parquet 時合併後重寫，返回壓縮的日期數
+        """
+        before = before or date.today()
+        compacted = 0
+        with self._lock:
+            for path in sorted(self.root.glob('*/*.db')):
+                day = date.fromisoformat(path.stem)
+                if day >= before:
+                    continue
+                conn = self._conns.pop(day, None) or sqlite3.connect(path)
+                frame = pd.read_sql_query("SELECT * FROM readings", conn)
+                conn.close()
+
+                parquet_path = self._path(day, '.parquet')
+                if parquet_path.exists():
+                    cold = self._select(pq.read_table(parquet_path), self.columns).to_pandas()
+                    frame = pd.concat([cold, frame], ignore_index=True)
+                    frame = frame.drop_duplicates(['station', 'ts'], keep='first')
+                self._write_parquet(frame, parquet_path)
+
+                for suffix in ('.db', '.db-wal', '.db-shm'):
+                    self._path(day, suffix).unlink(missing_ok=True)
+                compacted += 1
+        return compacted
+
+    def _cold_table(self, day):
+        """已壓縮日期分割的 Arrow Table（依檔案修改時間快取），沒有時返回 None"""
+        path = self._path(day, '.parquet')
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cold.get(day)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, pq.read_table(path))
+            self._cold[day] = cached
+        return cached[1]
+
+    @staticmethod
+    def _select(table, columns):
+        """選取欄位，舊分割沒有的欄位補空值"""
+        for col in columns:
+            if col not in table.column_names:
+                table = table.append_column(col, pa.nulls(len(table), pa.float32()))
+        return table.select(['station', 'ts'] + columns)
+
+    def _write_parquet(self, frame, path):
+        frame = frame.sort_values(['station', 'ts'])
+        table = pa.table(
+            [pa.array(frame['station'].to_numpy(dtype=object), pa.string()),
+             pa.array(frame['ts'].to_numpy(dtype=np.int64))] +
+            [pa.array(frame[col].to_numpy(dtype=np.float32), pa.float32()) for col in self.columns],
+            names=['station', 'ts'] + self.columns
+        )
+        tmp_path = path.with_suffix('.parquet.tmp')
+        pq.write_table(table, tmp_path, compression='zstd', use_dictionary=['station'])
+        os.replace(tmp_path, path)
+
+    # ---------- 查詢 ----------
+
+    def read(self, start, end, stations=None, columns=None):
+        """
+        時間範圍 [start, end) 的讀值
+        返回欄位 station、time 與數值欄位（float32），依測站與時間排序
+        """
+        columns = self.columns if columns is None else list(columns)
+        start, end = pd.Timestamp(start).to_pydatetime(), pd.Timestamp(end).to_pydatetime()
+        start_ts, end_ts = int(to_epoch([start])[0]), int(to_epoch([end])[0])
+
+        cold, hot = [], []
+        for day in _day_range(start, end):
+            table = self._cold_table(day)
+            if table is not None:
+                mask = pc.and_(pc.greater_equal(table['ts'], start_ts), pc.less(table['ts'], end_ts))
+                if stations is not None:
+                    mask = pc.and_(mask, pc.is_in(table['station'], pa.array(list(stations), pa.string())))
+                cold.append(self._select(table, columns).filter(mask))
+            if self._path(day, '.db').exists():
+                hot.append(self._read_sqlite(day, start_ts, end_ts, stations, columns))
+
+        # 已壓縮的分割先在 Arrow 端合併，只轉換一次 DataFrame
+        parts = ([pa.concat_tables(cold).to_pandas()] if cold else []) + hot
+        if parts:
+            frame = pd.concat(parts, ignore_index=True).drop_duplicates(['station', 'ts'])
+        else:
+            frame = pd.DataFrame({'station': pd.Series(dtype=object), 'ts': pd.Series(dtype=np.int64),
+                                  **{col: pd.Series(dtype=np.float32) for col in columns}})
+        frame = frame.sort_values(['station', 'ts'], ignore_index=True)
+        frame.insert(1, 'time', pd.to_datetime(frame['ts'].to_numpy(dtype=np.int64), unit='s'))
+        return frame.drop(columns='ts').astype({col: np.float32 for col in columns})
+
+    def _read_sqlite(self, day, start_ts, end_ts, stations, columns):
+        with self._lock:
+            conn = self._conn(day)
+            quoted = ', '.join(f'"{col}"' for col in columns)
+            query = f"SELECT station, ts, {quoted} FROM readings WHERE ts >= ? AND ts < ?"
+            params = [start_ts, end_ts]
+            if stations is not None:
+                stations = list(stations)
+                query += f" AND station IN ({', '.join('?' * len(stations))})"
+                params += stations
+            return pd.read_sql_query(query, conn, params=params)
+
+    def downsample(self, start, end, bucket_seconds, stations=None, columns=None, how='mean'):
+        """
+        降採樣讀取：每個測站每 bucket_seconds 一筆
+        how 為 'mean'、'min'、'max' 或 'last'
+        """
+        frame = self.read(start, end, stations, columns)
+        bucket = frame['time'].dt.floor(f'{int(bucket_seconds)}s')
+        value_columns = [col for col in frame.columns if col not in ('station', 'time')]
+        grouped = frame[value_columns].groupby([frame['station'], bucket.rename('time')], sort=True)
+        return getattr(grouped, how)().reset_index().astype({col: np.float32 for col in value_columns})
+
+    def stats(self):
+        """分割數與磁碟用量"""
+        hot = list(self.root.glob('*/*.db'))
+        cold = list(self.root.glob('*/*.parquet'))
+        return {
+            'hot_days': len(hot),
+            'cold_days': len(cold),
+            'bytes': sum(path.stat().st_size for path in self.root.glob('*/*') if path.is_file())
+        }
+
+def open_history(root=HISTORY_DIR):
+    """所有資料集的歷史時序 {資料集: HistoryStore}"""
+    return {dataset: HistoryStore(dataset, root) for dataset in HISTORY_DATASETS}
@@ -0,0 +1,219 @@
+"""
+PM2.5 短時預報（未來數小時）
+每站一組線性模型：特徵為最近 NOWCAST_LAGS 小時的 PM2.5 與測站風場 u/v，每個預報時距各一組係數。
+所有測站的正規方程式疊成 (時距, 測站, p, p) 陣列一次求解；每個新的發布小時只把新樣本
+以遺忘因子累加進正規方程式後重解，不重新掃描歷史
+"""
+
+import numpy as np
+import pandas as pd
+
+from .timeutil import to_epoch
+
+# 預報時距（小時）
+NOWCAST_HORIZON = 3
+# PM2.5 落後項數（含當下）
+NOWCAST_LAGS = 3
+# 每小時的遺忘因子（約 100 小時記憶）
+NOWCAST_FORGET = 0.99
+# 係數向「持續預報」（下一小時 = 當下）收縮的強度，樣本少時預報接近當下值
+NOWCAST_RIDGE = 20.0
+# 有效樣本權重低於此值的測站不發布預報
+NOWCAST_MIN_SAMPLES = 24
+# 啟動時從歷史時序訓練的天數
+NOWCAST_TRAIN_DAYS = 14
+# 預報警示門檻（μg/m³）
+NOWCAST_THRESHOLDS = (53, 70)
+
+def wind_components(speed, direction):
+    """
+    風速、風向（度，風的來向）-> (u, v)
+    u 正值為向東吹，v 正值為向北吹；缺值為 0（不提供風場資訊）
+    """
+    speed = pd.to_numeric(pd.Series(np.asarray(speed)), errors='coerce').to_numpy(dtype=np.float64)
+    direction = pd.to_numeric(pd.Series(np.asarray(direction)), errors='coerce').to_numpy(dtype=np.float64)
+    rad = np.deg2rad(direction)
+    u = np.nan_to_num(-speed * np.sin(rad))
+    v = np.nan_to_num(-speed * np.cos(rad))
+    return u, v
+
+class PM25Nowcaster:
+    """
+    PM2.5 短時預報
+    每站保留最近 (落後項 + 時距) 小時的 PM2.5 / u / v 環狀陣列，
+    時距 h 的樣本為「h 小時前的特徵 -> 本小時的 PM2.5」
+    """
+
+    def __init__(self, horizon=NOWCAST_HORIZON, lags=NOWCAST_LAGS, forget=NOWCAST_FORGET,
+                 ridge=NOWCAST_RIDGE, min_samples=NOWCAST_MIN_SAMPLES):
+        self.horizon = horizon
+        self.lags = lags
+        self.forget = forget
+        self.ridge = ridge
+        self.min_samples = min_samples
+        self.slots = lags + horizon
+        self.n_features = lags + 3   # PM2.5 落後項、u、v、截距
+        self.hour = -1
+
+        self._index = {}
+        self.stations = []
+        p, h = self.n_features, self.horizon
+        self._pm25 = np.full((0, self.slots), np.nan)
+        self._u = np.zeros((0, self.slots))
+        self._v = np.zeros((0, self.slots))
+        self._slot_hour = np.full((0, self.slots), -1, dtype=np.int64)
+        self._xtx = np.zeros((h, 0, p, p))
+        self._xty = np.zeros((h, 0, p))
+        self._weight = np.zeros((h, 0))
+        self.coef = np.zeros((h, 0, p))
+
+        # 收縮目標：持續預報（當下 PM2.5 係數為 1）
+        self._prior = np.zeros(p)
+        self._prior[0] = 1.0
+
+    def _rows(self, stations):
+        new = [station for station in dict.fromkeys(stations) if station not in self._index]
+        if new:
+            for station in new:
+                self._index[station] = len(self.stations)
+                self.stations.append(station)
+            n, p, h = len(new), self.n_features, self.horizon
+            self._pm25 = np.concatenate([self._pm25, np.full((n, self.slots), np.nan)])
+            self._u = np.concatenate([self._u, np.zeros((n, self.slots))])
+            self._v = np.concatenate([self._v, np.zeros((n, self.slots))])
+            self._slot_hour = np.concatenate([self._slot_hour, np.full((n, self.slots), -1, dtype=np.int64)])
+            self._xtx = np.concatenate([self._xtx, np.zeros((h, n, p, p))], axis=1)
+            self._xty = np.concatenate([self._xty, np.zeros((h, n, p))], axis=1)
+            self._weight = np.concatenate([self._weight, np.zeros((h, n))], axis=1)
+            self.coef = np.concatenate([self.coef, np.broadcast_to(self._prior, (h, n, p))], axis=1)
+        return np.array([self._index[station] for station in stations], dtype=np.int64)
+
+    def _features(self, hour):
+        """各站在 hour 的特徵 (測站, p) 與是否完整（落後項都有 PM2.5）"""
+        n = len(self.stations)
+        x = np.empty((n, self.n_features))
+        ok = np.ones(n, dtype=bool)
+        for lag in range(self.lags):
+            slot = (hour - lag) % self.slots
+            present = self._slot_hour[:, slot] == hour - lag
+            x[:, lag] = np.where(present, self._pm25[:, slot], np.nan)
+            ok &= present & ~np.isnan(x[:, lag])
+        slot = hour % self.slots
+        present = self._slot_hour[:, slot] == hour
+        x[:, self.lags] = np.where(present, self._u[:, slot], 0.0)
+        x[:, self.lags + 1] = np.where(present, self._v[:, slot], 0.0)
+        x[:, self.lags + 2] = 1.0
+        return x, ok
+
+    # ---------- 更新 ----------
+
+    def update(self, frame, station_column='sitename', time_column='publishtime', solve=True):
+        """
+        併入一次抓取（全國資料中最新的發布小時），返回是否為新的小時
+        solve 為 False 時只累加正規方程式（批次回補歷史時最後再一次求解）
+        """
+        times = pd.to_datetime(frame[time_column], errors='coerce', format='mixed')
+        valid = times.notna().to_numpy()
+        if not valid.any():
+            return False
+        hours = np.full(len(frame), -1, dtype=np.int64)
+        hours[valid] = to_epoch(times[valid]) // 3600
+        hour = int(hours.max())
+        if hour <= self.hour:
+            return False
+
+        current = hours == hour
+        rows = self._rows(frame[station_column].astype(str).to_numpy()[current].tolist())
+        pm25 = pd.to_numeric(frame['pm25'], errors='coerce').to_numpy(dtype=np.float64)[current]
+        if 'wind_speed' in frame.columns and 'wind_direc' in frame.columns:
+            u, v = wind_components(frame['wind_speed'].to_numpy()[current], frame['wind_direc'].to_numpy()[current])
+        else:
+            u = v = np.zeros(len(rows))
+        slot = hour % self.slots
+        self._pm25[rows, slot] = pm25
+        self._u[rows, slot] = u
+        self._v[rows, slot] = v
+        self._slot_hour[rows, slot] = hour
+
+        # 舊樣本依經過的小時數衰減
+        if self.hour >= 0:
+            decay = self.forget ** (hour - self.hour)
+            self._xtx *= decay
+            self._xty *= decay
+            self._weight *= decay
+        self.hour = hour
+
+        target = np.full(len(self.stations), np.nan)
+        target[rows] = pm25
+        for h in range(self.horizon):
+            x, ok = self._features(hour - (h + 1))
+            use = ok & ~np.isnan(target)
+            x, y = x[use], target[use]
+            self._xtx[h, use] += np.einsum('np,nq->npq', x, x)
+            self._xty[h, use] += x * y[:, None]
+            self._weight[h, use] += 1
+        if solve:
+            self._solve()
+        return True
+
+    def _solve(self):
+        """所有時距、所有測站的正規方程式一次求解"""
+        eye = np.eye(self.n_features)
+        a = self._xtx + self.ridge * eye
+        b = self._xty + self.ridge * self._prior
+        self.coef = np.linalg.solve(a, b[..., None])[..., 0]
+
+    def backfill(self, history, now=None, days=NOWCAST_TRAIN_DAYS):
+        """從歷史時序逐小時累加正規方程式，最後一次求解，返回自身"""
+        now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+        frame = history.read(now - pd.Timedelta(days=days), now + pd.Timedelta(hours=1),
+                             columns=[col for col in ('pm25', 'wind_speed', 'wind_direc') if col in history.columns])
+        if frame.empty:
+            return self
+        hours = to_epoch(frame['time']) // 3600
+        for _, part in frame.groupby(hours, sort=True):
+            self.update(part, station_column='station', time_column='time', solve=False)
+        self._solve()
+        return self
+
+    # ---------- 預報 ----------
+
+    def predict(self):
+        """
+        以最新小時的特徵預報，返回 (測站, 時距) 陣列；
+        該小時沒有完整落後項或樣本不足的測站為 NaN
+        """
+        if self.hour < 0:
+            return np.full((len(self.stations), self.horizon), np.nan)
+        x, ok = self._features(self.hour)
+        forecast = np.maximum(np.einsum('sp,hsp->sh', np.nan_to_num(x), self.coef), 0.0)
+        usable = ok[:, None] & (self._weight.T >= self.min_samples)
+        return np.where(usable, forecast, np.nan)
+
+    def attach(self, frame, station_column='sitename', thresholds=NOWCAST_THRESHOLDS):
+        """
+        在測站資料加上預報欄位（淺複製）：
+            pm25_f1 ... pm25_f<時距>: 未來第 h 小時的 PM2.5
+            nowcast_level:            時距內會達到的最高門檻（未達任何門檻為 0）
+            nowcast_hours:            最早在第幾小時達到該門檻（未達為 NaN）
+        """
+        df = frame.copy(deep=False)
+        forecast = self.predict()
+        rows = df[station_column].astype(str).map(self._index)
+        found = rows.notna().to_numpy()
+        rows = rows.fillna(0).to_numpy(dtype=np.int64)
+        station_forecast = np.where(found[:, None], forecast[rows], np.nan)
+        for h in range(self.horizon):
+            df[f'pm25_f{h + 1}'] = station_forecast[:, h].round(1)
+
+        level = np.zeros(len(df))
+        hours = np.full(len(df), np.nan)
+        with np.errstate(invalid='ignore'):
+            for threshold in sorted(thresholds):
+                crossed = station_forecast >= threshold
+                hit = crossed.any(axis=1)
+                level = np.where(hit, threshold, level)
+                hours = np.where(hit, crossed.argmax(axis=1) + 1, hours)
+        df['nowcast_level'] = level
+        df['nowcast_hours'] = hours
+        return df
@@ -0,0 +1,229 @@
+"""
+複合災害情境管線
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .aqi import compute_aqi
+from .geo import distance_km, idw
+from .regions import DEFAULT_REGION, region_center, region_shelters
+from .rules import classify
+from .scenarios import DisasterScenario
+
+# 風險網格：以區域中心點為中心的 N × N 格點
+HAZARD_GRID_SIZE = 40
+HAZARD_GRID_SPAN_DEG = 0.2
+
+HAZARD_LABELS = {
+    'earthquake': '地震',
+    'flooding': '淹水',
+    'war_alert': '空襲',
+    'air_pollution': '空氣污染',
+    'water_contamination': '水質污染'
+}
+
+class HazardPipeline:
+    """
+    複合災害情境管線
+    測站、避難點與網格的座標串接成同一組陣列（共享狀態），
+    每個災害階段讀取共享狀態並加入自己的風險圖層，一次走完所有階段，
+    中間不產生 DataFrame 副本。每個階段的結果以
+    （前一階段的鍵, 階段名稱, 參數）為鍵快取，修改某一災害參數時
+    只會重算該階段與其後的階段
+    """
+
+    @staticmethod
+    def initial_state(base_data, region=DEFAULT_REGION):
+        """建立共享狀態：測站、區域避難點、網格三組點位串接為單一陣列"""
+        center = region_center(region)
+        shelters = region_shelters(region)
+        grid_offsets = np.linspace(-HAZARD_GRID_SPAN_DEG / 2, HAZARD_GRID_SPAN_DEG / 2, HAZARD_GRID_SIZE)
+        grid_lat, grid_lon = np.meshgrid(center['lat'] + grid_offsets, center['lon'] + grid_offsets)
+
+        station_lat = base_data['lat'].to_numpy(dtype=np.float64)
+        station_lon = base_data['lon'].to_numpy(dtype=np.float64)
+        lat = np.concatenate([station_lat, [s['lat'] for s in shelters], grid_lat.ravel()])
+        lon = np.concatenate([station_lon, [s['lon'] for s in shelters], grid_lon.ravel()])
+
+        n_stations, n_shelters = len(base_data), len(shelters)
+        segments = {
+            'stations': slice(0, n_stations),
+            'shelters': slice(n_stations, n_stations + n_shelters),
+            'grid': slice(n_stations + n_shelters, len(lat))
+        }
+
+        # 避難點與網格沒有量測值，以測站反距離加權內插 PM2.5 / PM10
+        pm25 = idw(station_lat, station_lon, base_data['pm25'].to_numpy(dtype=np.float64), lat, lon)
+        pm10 = idw(station_lat, station_lon, base_data['pm10'].to_numpy(dtype=np.float64), lat, lon)
+        pm25[segments['stations']] = base_data['pm25'].to_numpy(dtype=np.float64)
+        pm10[segments['stations']] = base_data['pm10'].to_numpy(dtype=np.float64)
+
+        return {
+            'region': region,
+            'shelter_names': [s['name'] for s in shelters],
+            'lat': lat,
+            'lon': lon,
+            'segments': segments,
+            'pm25': pm25,
+            'pm10': pm10,
+            'layers': {}
+        }
+
+    @staticmethod
+    def run(base_data, stages, cache=None, region=DEFAULT_REGION):
+        """
+        依序執行災害階段
+        參數:
+            base_data: 測站資料
+            stages: [(災害名稱, 參數 dict), ...]，依發生順序排列
+            cache: 階段結果快取（dict-like），None 表示不快取
+            region: 區域代碼（決定網格中心、避難點與情境參數）
+        返回:
+            最後一個階段後的共享狀態
+        """
+        if cache is None:
+            cache = {}
+        key = HazardPipeline._hash((region, pd.util.hash_pandas_object(base_data[['lat', 'lon', 'pm25', 'pm10']]).sum()))
+        state = cache.get(key)
+        if state is None:
+            state = HazardPipeline.initial_state(base_data, region)
+            cache[key] = state
+
+        for name, params in stages:
+            key = HazardPipeline._hash((key, name, sorted(params.items())))
+            cached = cache.get(key)
+            if cached is None:
+                stage_func = getattr(HazardPipeline, f'_stage_{name}')
+                cached = stage_func(state, **params)
+                cache[key] = cached
+            state = cached
+        return state
+
+    @staticmethod
+    def combined(state, segment='stations'):
+        """
+        由各災害圖層合成綜合風險與狀態
+        綜合風險 = 1 - Π(1 - 各圖層風險)，狀態取風險最高的圖層
+        """
+        idx = state['segments'][segment]
+        layers = state['layers']
+        if not layers:
+            n = idx.stop - idx.start
+            return np.zeros(n), np.full(n, '正常', dtype=object), np.full(n, '', dtype=object)
+
+        names = list(layers)
+        risks = np.stack([layers[name]['risk'][idx] for name in names])
+        labels = np.stack([layers[name]['status'][idx] for name in names])
+        combined_risk = 1 - np.prod(1 - risks, axis=0)
+        dominant = risks.argmax(axis=0)
+        columns = np.arange(risks.shape[1])
+        status = np.where(risks.max(axis=0) > 0, labels[dominant, columns], '正常')
+        dominant_hazard = np.array([HAZARD_LABELS[name] for name in names], dtype=object)[dominant]
+        return combined_risk, status, dominant_hazard
+
+    @staticmethod
+    def to_station_frame(state, base_data):
+        """將最終狀態轉回地圖用的測站資料（整條管線只在這裡建立一次新表）"""
+        idx = state['segments']['stations']
+        df = base_data.copy(deep=False)
+        df['pm25'] = state['pm25'][idx]
+        df['pm10'] = state['pm10'][idx]
+        for field in ('shake_intensity', 'water_depth', 'aqi', 'aqi_pollutant'):
+            if field in state:
+                df[field] = state[field][idx]
+
+        risk, status, dominant = HazardPipeline.combined(state, 'stations')
+        df['risk'] = risk.round(3)
+        df['status'] = status
+        df['dominant_hazard'] = dominant
+        df['color'] = HazardPipeline.risk_colors(risk)
+        df['radius'] = 30 + risk * 60
+        return df
+
+    @staticmethod
+    def to_point_frame(state, segment):
+        """避難點或網格的綜合風險資料"""
+        idx = state['segments'][segment]
+        risk, status, dominant = HazardPipeline.combined(state, segment)
+        df = pd.DataFrame({
+            'lat': state['lat'][idx],
+            'lon': state['lon'][idx],
+            'risk': risk.round(3),
+            'status': status,
+            'dominant_hazard': dominant
+        })
+        if 'aqi' in state:
+            df['aqi'] = state['aqi'][idx]
+        if segment == 'shelters':
+            df.insert(0, 'name', state['shelter_names'])
+        return df
+
+    @staticmethod
+    def risk_colors(risk):
+        """綜合風險 0-1 對應黃 → 紅"""
+        green = (220 * (1 - np.clip(risk, 0, 1))).astype(int)
+        return [[255, int(g), 0, 220] for g in green]
+
+    # ---------- 災害階段：讀取共享狀態，回傳加入新圖層的狀態 ----------
+
+    @staticmethod
+    def _with_layer(state, name, risk, status, **fields):
+        """淺複製共享狀態並加入圖層，未修改的陣列直接共用"""
+        new_state = dict(state, **fields)
+        new_state['layers'] = dict(state['layers'], **{name: {'risk': risk, 'status': status}})
+        return new_state
+
+    @staticmethod
+    def _stage_earthquake(state, epicenter_lat=None, epicenter_lon=None, scale=1.0):
+        # 未指定震央時以區域中心點為震央
+        center = region_center(state['region'])
+        epicenter_lat = center['lat'] if epicenter_lat is None else epicenter_lat
+        epicenter_lon = center['lon'] if epicenter_lon is None else epicenter_lon
+        distance = distance_km(state['lat'], state['lon'], epicenter_lat, epicenter_lon)
+        intensity = np.maximum(7 * scale - distance * 2, 0)
+        risk = np.clip(intensity / 7, 0, 1)
+        status = classify('shake_status', intensity)
+        return HazardPipeline._with_layer(state, 'earthquake', risk, status, shake_intensity=intensity)
+
+    @staticmethod
+    def _stage_flooding(state, rain_factor=1.0):
+        depth = DisasterScenario._flood_peak_depth(state['lat'], state['region']) * rain_factor
+        # 前一階段若有地震，設備損壞處排水能力下降
+        if 'shake_intensity' in state:
+            depth = depth * (1 + 0.1 * state['shake_intensity'])
+        risk = np.clip(depth / 100, 0, 1)
+        status = np.array([f'淹水 {d:.0f}cm' if d > 10 else '正常' for d in depth], dtype=object)
+        return HazardPipeline._with_layer(state, 'flooding', risk, status, water_depth=depth)
+
+    @staticmethod
+    def _stage_war_alert(state):
+        n = len(state['lat'])
+        return HazardPipeline._with_layer(state, 'war_alert', np.full(n, 0.8), np.full(n, '警戒中', dtype=object))
+
+    @staticmethod
+    def _stage_air_pollution(state, seed=42):
+        rng_pm25, rng_pm10 = DisasterScenario._air_pollution_rngs(seed)
+        n = len(state['lat'])
+        pm25 = state['pm25'] + rng_pm25.integers(80, 150, n)
+        pm10 = state['pm10'] + rng_pm10.integers(100, 200, n)
+        # 斷訊測站（PM2.5 為 NaN）風險計為 0
+        risk = np.clip(np.nan_to_num(pm25) / 250, 0, 1)
+        status = classify('pm25_scenario', pm25)
+        # 所有點位（含避難點與網格）一次查表；只有 PM2.5 / PM10 的內插值
+        aqi, pollutant = compute_aqi({'pm25': pm25, 'pm10': pm10}, use_averages=False)
+        return HazardPipeline._with_layer(state, 'air_pollution', risk, status, pm25=pm25, pm10=pm10,
+                                          aqi=aqi, aqi_pollutant=pollutant)
+
+    @staticmethod
+    def _stage_water_contamination(state):
+        # 水質污染影響供水而非空間點位，於點位圖層以低風險標示
+        n = len(state['lat'])
+        return HazardPipeline._with_layer(state, 'water_contamination', np.full(n, 0.2),
+                                          np.full(n, '停止使用自來水', dtype=object))
+
+    @staticmethod
+    def _hash(obj):
+        return hashlib.sha1(repr(obj).encode('utf-8')).hexdigest()
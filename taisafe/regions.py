@@ -0,0 +1,113 @@
+"""
+監測區域設定：各縣市的中心點、避難點與情境參數
+環境部 aqx_p_432 / wrq_p_432 一次返回全國資料，依 county 欄位分割到各區域
+"""
+
+import numpy as np
+
+from .geo import NCKU_CENTER, distance_km
+
+DEFAULT_REGION = 'tainan'
+
+# 區域代碼 -> 設定
+#   county:   環境部資料中的縣市名稱（「台」統一為「臺」）
+#   center:   地圖中心、測站距離與地震情境震央
+#   shelters: 避難點（尚未建檔的縣市為空，情境管線只計算測站與網格）
+#   scenario: 情境參數，未設定的項目使用 _SCENARIO_DEFAULTS
+REGIONS = {
+    'keelung': {'county': '基隆市', 'center': {'name': '基隆市政府', 'lat': 25.1318, 'lon': 121.7443}},
+    'taipei': {'county': '臺北市', 'center': {'name': '臺北市政府', 'lat': 25.0375, 'lon': 121.5637}},
+    'new_taipei': {'county': '新北市', 'center': {'name': '新北市政府', 'lat': 25.0120, 'lon': 121.4650}},
+    'taoyuan': {'county': '桃園市', 'center': {'name': '桃園市政府', 'lat': 24.9936, 'lon': 121.3010}},
+    'hsinchu_city': {'county': '新竹市', 'center': {'name': '新竹市政府', 'lat': 24.8066, 'lon': 120.9686}},
+    'hsinchu': {'county': '新竹縣', 'center': {'name': '新竹縣政府', 'lat': 24.8270, 'lon': 121.0129}},
+    'miaoli': {'county': '苗栗縣', 'center': {'name': '苗栗縣政府', 'lat': 24.5602, 'lon': 120.8214}},
+    'taichung': {'county': '臺中市', 'center': {'name': '臺中市政府', 'lat': 24.1618, 'lon': 120.6468}},
+    'changhua': {'county': '彰化縣', 'center': {'name': '彰化縣政府', 'lat': 24.0809, 'lon': 120.5385}},
+    'nantou': {'county': '南投縣', 'center': {'name': '南投縣政府', 'lat': 23.9029, 'lon': 120.6906}},
+    'yunlin': {'county': '雲林縣', 'center': {'name': '雲林縣政府', 'lat': 23.7092, 'lon': 120.5430}},
+    'chiayi_city': {'county': '嘉義市', 'center': {'name': '嘉義市政府', 'lat': 23.4801, 'lon': 120.4491}},
+    'chiayi': {'county': '嘉義縣', 'center': {'name': '嘉義縣政府', 'lat': 23.4587, 'lon': 120.2930}},
+    'tainan': {
+        'county': '臺南市',
+        'center': {'name': '國立成功大學', **NCKU_CENTER},
+        # 座標同 get_disaster_info 的建議避難地點
+        'shelters': [
+            {'name': '成功大學光復校區操場', 'lat': 22.9968, 'lon': 120.2185},
+            {'name': '後甲國中操場', 'lat': 22.9939, 'lon': 120.2260},
+            {'name': '台南一中操場', 'lat': 22.9922, 'lon': 120.2163},
+            {'name': '大學東寧社區聯合活動中心', 'lat': 22.9930, 'lon': 120.2248},
+            {'name': '成功大學圖書館', 'lat': 22.9978, 'lon': 120.2185},
+            {'name': '成功大學醫學院', 'lat': 22.9958, 'lon': 120.2137},
+        ],
+        'scenario': {
+            'flood_reference_lat': 22.98,
+            'plume_source': {'name': '永康工業區', 'lat': 23.0250, 'lon': 120.2480},
+            'river_network': 'tainan_river_network.json',
+        },
+    },
+    'kaohsiung': {'county': '高雄市', 'center': {'name': '高雄市政府', 'lat': 22.6203, 'lon': 120.3120}},
+    'pingtung': {'county': '屏東縣', 'center': {'name': '屏東縣政府', 'lat': 22.6727, 'lon': 120.4880}},
+    'yilan': {'county': '宜蘭縣', 'center': {'name': '宜蘭縣政府', 'lat': 24.7303, 'lon': 121.7632}},
+    'hualien': {'county': '花蓮縣', 'center': {'name': '花蓮縣政府', 'lat': 23.9871, 'lon': 121.6015}},
+    'taitung': {'county': '臺東縣', 'center': {'name': '臺東縣政府', 'lat': 22.7583, 'lon': 121.1444}},
+    'penghu': {'county': '澎湖縣', 'center': {'name': '澎湖縣政府', 'lat': 23.5655, 'lon': 119.5793}},
+    'kinmen': {'county': '金門縣', 'center': {'name': '金門縣政府', 'lat': 24.4370, 'lon': 118.3186}},
+    'lienchiang': {'county': '連江縣', 'center': {'name': '連江縣政府', 'lat': 26.1578, 'lon': 119.9516}},
+}
+
+# 情境參數預設值
+#   flood_reference_lat: 淹水情境中此緯度以南開始積水（預設為中心點以南約 2 公里）
+#   plume_source:        空污擴散情境的假設污染源（預設為中心點）
+#   river_network:       data/ 下的河川網路檔，None 表示水質污染不沿河川推算
+_SCENARIO_DEFAULTS = {
+    'flood_reference_lat': None,
+    'plume_source': None,
+    'river_network': None,
+}
+
+_COUNTY_TO_REGION = {config['county']: region for region, config in REGIONS.items()}
+_CENTER_LAT = np.array([config['center']['lat'] for config in REGIONS.values()])
+_CENTER_LON = np.array([config['center']['lon'] for config in REGIONS.values()])
+
+def normalize_county(county):
+    """縣市名稱正規化（台 -> 臺，去除空白）"""
+    return str(county or '').strip().replace('台', '臺')
+
+def region_of_county(county):
+    """縣市名稱 -> 區域代碼，不在設定中時返回 None"""
+    return _COUNTY_TO_REGION.get(normalize_county(county))
+
+def nearest_region(lat, lon):
+    """離指定座標最近的區域（以區域中心點判斷）"""
+    return list(REGIONS)[int(np.argmin(distance_km(_CENTER_LAT, _CENTER_LON, lat, lon)))]
+
+def region_name(region):
+    return REGIONS[region]['county']
+
+def region_center(region):
+    """區域中心點 {'name', 'lat', 'lon'}"""
+    return REGIONS[region]['center']
+
+def region_shelters(region):
+    return REGIONS[region].get('shelters', [])
+
+def all_shelters():
+    """全國所有已建檔的避難點（附區域代碼）"""
+    return [dict(shelter, region=region)
+            for region in REGIONS for shelter in region_shelters(region)]
+
+def scenario_config(region):
+    """區域情境參數（補上預設值）"""
+    config = dict(_SCENARIO_DEFAULTS, **REGIONS[region].get('scenario', {}))
+    center = region_center(region)
+    if config['flood_reference_lat'] is None:
+        config['flood_reference_lat'] = center['lat'] - 0.02
+    if config['plume_source'] is None:
+        config['plume_source'] = center
+    return config
+
+def partition_by_region(df, column='county'):
+    """全國資料依縣市欄位分割，返回 {區域代碼: DataFrame}；不在設定中的縣市略過"""
+    regions = df[column].map(region_of_county)
+    return {region: part for region, part in df.groupby(regions, sort=False)}
@@ -0,0 +1,293 @@
+"""
+門檻規則引擎
+分級規則（PM2.5 狀態、地圖顏色、震度狀態）以 np.searchsorted 對整個陣列分級；
+警示規則宣告門檻、持續時間與解除門檻（遲滯），AlertEngine 每個新的發布小時評估一次，
+輸出警示的發布與解除事件，狀態以 SnapshotStore.save_state 保存
+"""
+
+import numpy as np
+import pandas as pd
+
+from .timeutil import to_epoch
+
+# ===========================================
+# 分級規則
+# ===========================================
+
+# 名稱 -> 規則
+#   column:     預設欄位
+#   thresholds: 門檻（由低到高）
+#   labels:     各級標籤（比門檻多一個）
+#   closed:     'upper' 時等於門檻屬於較高一級（x >= 門檻），'lower' 時屬於較低一級（x > 門檻才升級）
+#   missing:    缺值（NaN）的標籤
+LEVEL_RULES = {
+    'pm25_level': {
+        'column': 'pm25',
+        'thresholds': [35, 53, 70],
+        'labels': ['良好', '普通', '對敏感族群不健康', '不健康'],
+        'closed': 'upper',
+        'missing': '斷訊',
+    },
+    'pm25_scenario': {
+        'column': 'pm25',
+        'thresholds': [100, 150],
+        'labels': ['對敏感族群不健康', '對所有族群不健康', '非常不健康'],
+        'closed': 'lower',
+        'missing': '斷訊',
+    },
+    'shake_status': {
+        'column': 'shake_intensity',
+        'thresholds': [0, 5],
+        'labels': ['正常', '地震影響', '設備異常'],
+        'closed': 'lower',
+        'missing': '正常',
+    },
+}
+
+def _compile_level(rule):
+    """規則 -> (門檻陣列, searchsorted 的 side)"""
+    thresholds = np.asarray(rule['thresholds'], dtype=np.float64)
+    if len(rule['labels']) != len(thresholds) + 1:
+        raise ValueError(f"分級規則的標籤數必須比門檻多一個：{rule}")
+    return thresholds, 'right' if rule['closed'] == 'upper' else 'left'
+
+_COMPILED_LEVELS = {name: _compile_level(rule) for name, rule in LEVEL_RULES.items()}
+
+def level_index(name, values):
+    """各值所屬的級數（0 為最低級），缺值為 -1"""
+    thresholds, side = _COMPILED_LEVELS[name]
+    values = pd.to_numeric(pd.Series(np.asarray(values).ravel()), errors='coerce').to_numpy(dtype=np.float64)
+    level = np.searchsorted(thresholds, values, side=side)
+    return np.where(np.isnan(values), -1, level)
+
+def classify(name, values, labels=None, missing=None):
+    """
+    依分級規則把整個陣列對應到標籤，返回 object 陣列
+    labels / missing 可替換規則的標籤（例如同一組門檻對應到顏色或表情符號），門檻只在規則中定義一次
+    """
+    rule = LEVEL_RULES[name]
+    labels = rule['labels'] if labels is None else labels
+    missing = rule['missing'] if missing is None else missing
+    # 標籤可能是 list（顏色），逐一放入 object 陣列，避免 numpy 展開成二維
+    table = np.empty(len(labels) + 1, dtype=object)
+    for i, label in enumerate(list(labels) + [missing]):
+        table[i] = label
+    return table[level_index(name, values)]
+
+# ===========================================
+# 警示規則（門檻、持續時間、遲滯）
+# ===========================================
+
+# 名稱 -> 規則
+#   column:      評估的欄位（快照沒有此欄位時不發布也不解除）
+#   raise:       連續 raise_hours 小時 >= raise 時發布
+#   clear:       發布中連續 clear_hours 小時 < clear 時解除（clear 低於 raise，避免在門檻附近反覆發布）
+#   label:       顯示名稱
+ALERT_RULES = {
+    'pm25_sensitive': {
+        'column': 'pm25', 'raise': 53, 'raise_hours': 2, 'clear': 45, 'clear_hours': 2,
+        'label': 'PM2.5 對敏感族群不健康',
+    },
+    'pm25_unhealthy': {
+        'column': 'pm25', 'raise': 70, 'raise_hours': 1, 'clear': 60, 'clear_hours': 2,
+        'label': 'PM2.5 不健康',
+    },
+    'aqi_unhealthy': {
+        'column': 'aqi', 'raise': 151, 'raise_hours': 1, 'clear': 130, 'clear_hours': 2,
+        'label': 'AQI 紅色警示',
+    },
+    'pm25_forecast': {
+        'column': 'nowcast_level', 'raise': 53, 'raise_hours': 1, 'clear': 53, 'clear_hours': 2,
+        'label': 'PM2.5 預報將超標',
+    },
+}
+# 保留的最近警示事件筆數
+ALERT_EVENT_LIMIT = 200
+
+ALERT_EVENT_LABELS = {
+    'raised': '發布',
+    'cleared': '解除',
+}
+
+# 每站每規則的狀態陣列 -> (型別, 初始值)
+_ALERT_FIELDS = {
+    'active': (np.bool_, False),       # 是否發布中
+    'raise_run': (np.int64, 0),        # 連續達發布門檻的小時數
+    'clear_run': (np.int64, 0),        # 連續低於解除門檻的小時數
+    'since': (np.int64, -1),           # 發布的小時（未發布為 -1）
+    'value': (np.float64, np.nan),     # 最新一筆讀值
+}
+
+class AlertEngine:
+    """
+    警示規則引擎
+    規則編譯為 (規則,) 的門檻陣列，每個新的發布小時以 (測站, 規則) 陣列一次評估；
+    同一小時重複抓到時不更新，該小時沒有讀值的測站維持原狀態（不累計也不中斷持續時間）
+    """
+
+    def __init__(self, rules=None):
+        self.rules = dict(ALERT_RULES if rules is None else rules)
+        self.names = list(self.rules)
+        specs = self.rules.values()
+        self._columns = [rule['column'] for rule in specs]
+        self._raise = np.array([rule['raise'] for rule in specs], dtype=np.float64)
+        self._clear = np.array([rule['clear'] for rule in specs], dtype=np.float64)
+        self._raise_hours = np.array([rule['raise_hours'] for rule in specs], dtype=np.int64)
+        self._clear_hours = np.array([rule['clear_hours'] for rule in specs], dtype=np.int64)
+        if (self._clear > self._raise).any():
+            raise ValueError("警示規則的解除門檻不可高於發布門檻")
+        self._labels = np.array([rule['label'] for rule in specs], dtype=object)
+
+        self.hour = -1   # 最後評估的發布小時
+        self._index = {}
+        self.stations = []
+        self._state = {field: self._empty(0, *spec) for field, spec in _ALERT_FIELDS.items()}
+        self.events = self._empty_events()
+
+    def _empty(self, n, dtype, fill):
+        return np.full((n, len(self.names)), fill, dtype=dtype)
+
+    @staticmethod
+    def _empty_events():
+        return pd.DataFrame({'time': pd.Series(dtype='datetime64[s]'), 'station': pd.Series(dtype=object),
+                             'rule': pd.Series(dtype=object), 'label': pd.Series(dtype=object),
+                             'event': pd.Series(dtype=object), 'value': pd.Series(dtype=np.float64)})
+
+    def _rows(self, stations):
+        new = [station for station in dict.fromkeys(stations) if station not in self._index]
+        if new:
+            for station in new:
+                self._index[station] = len(self.stations)
+                self.stations.append(station)
+            for field, spec in _ALERT_FIELDS.items():
+                self._state[field] = np.concatenate([self._state[field], self._empty(len(new), *spec)])
+        return np.array([self._index[station] for station in stations], dtype=np.int64)
+
+    # ---------- 評估 ----------
+
+    def update(self, frame, station_column='sitename', time_column='publishtime'):
+        """
+        以一次抓取評估所有規則，返回這一小時的事件 DataFrame
+        （time、station、rule、label、event 為 'raised' / 'cleared'、value）；
+        不是新的發布小時時返回 None，狀態不變
+        """
+        times = pd.to_datetime(frame[time_column], errors='coerce', format='mixed')
+        valid = times.notna().to_numpy()
+        if not valid.any():
+            return None
+        hours = np.full(len(frame), -1, dtype=np.int64)
+        hours[valid] = to_epoch(times[valid]) // 3600
+        hour = int(hours.max())
+        if hour <= self.hour:
+            return None
+
+        rows = self._rows(frame[station_column].astype(str).tolist())
+        x = np.full((len(self.stations), len(self.names)), np.nan)
+        current = hours == hour
+        for r, col in enumerate(self._columns):
+            if col in frame.columns:
+                values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64)
+                x[rows[current], r] = values[current]
+        raised, cleared = self._step(x, hour)
+        self.hour = hour
+
+        events = []
+        for kind, mask in (('raised', raised), ('cleared', cleared)):
+            station_idx, rule_idx = np.nonzero(mask)
+            events.append(pd.DataFrame({
+                'time': pd.Series(pd.to_datetime(np.full(len(station_idx), hour * 3600), unit='s'),
+                                  dtype='datetime64[s]'),
+                'station': np.asarray(self.stations, dtype=object)[station_idx],
+                'rule': np.asarray(self.names, dtype=object)[rule_idx],
+                'label': self._labels[rule_idx],
+                'event': kind,
+                'value': x[station_idx, rule_idx],
+            }))
+        events = pd.concat(events, ignore_index=True)
+        if len(events):
+            self.events = pd.concat([self.events, events], ignore_index=True).tail(ALERT_EVENT_LIMIT)
+            self.events = self.events.reset_index(drop=True)
+        return events
+
+    def _step(self, x, hour):
+        """一步評估：x 形狀為 (測站, 規則)，NaN 不改變持續時間；返回 (發布, 解除) 布林陣列"""
+        state = self._state
+        present = ~np.isnan(x)
+        with np.errstate(invalid='ignore'):
+            above = x >= self._raise
+            below = x < self._clear
+        state['raise_run'] = np.where(present, np.where(above, state['raise_run'] + 1, 0), state['raise_run'])
+        state['clear_run'] = np.where(present, np.where(below, state['clear_run'] + 1, 0), state['clear_run'])
+        state['value'] = np.where(present, x, state['value'])
+
+        active = state['active']
+        raised = ~active & present & (state['raise_run'] >= self._raise_hours)
+        cleared = active & present & (state['clear_run'] >= self._clear_hours)
+        state['active'] = (active | raised) & ~cleared
+        state['since'] = np.where(raised, hour, np.where(cleared, -1, state['since']))
+        return raised, cleared
+
+    # ---------- 結果 ----------
+
+    def active(self):
+        """發布中的警示 DataFrame：station、rule、label、since、value（依發布時間排序）"""
+        station_idx, rule_idx = np.nonzero(self._state['active'])
+        alerts = pd.DataFrame({
+            'station': np.asarray(self.stations, dtype=object)[station_idx],
+            'rule': np.asarray(self.names, dtype=object)[rule_idx],
+            'label': self._labels[rule_idx],
+            'since': pd.to_datetime(self._state['since'][station_idx, rule_idx] * 3600, unit='s'),
+            'value': self._state['value'][station_idx, rule_idx],
+        })
+        return alerts.sort_values('since', kind='stable', ignore_index=True)
+
+    def attach(self, frame, station_column='sitename'):
+        """
+        在測站資料加上 alerts（發布中的警示，例如「PM2.5 不健康、AQI 紅色警示」，沒有為空字串）
+        與 alert_since（最早一項發布中警示的時間）欄位，返回淺複製
+        """
+        df = frame.copy(deep=False)
+        active = self._state['active']
+        labels = np.full(len(self.stations), '', dtype=object)
+        for r in range(len(self.names)):
+            hit = active[:, r]
+            labels[hit] = np.where(labels[hit] == '', self._labels[r], labels[hit] + '、' + self._labels[r])
+        # fmin 略過 NaN：沒有發布中警示的測站為 NaN
+        since = np.fmin.reduce(np.where(active, self._state['since'], np.nan), axis=1, initial=np.nan)
+
+        rows = df[station_column].astype(str).map(self._index)
+        found = rows.notna().to_numpy()
+        rows = rows.fillna(0).to_numpy(dtype=np.int64)
+        df['alerts'] = np.where(found, labels[rows], '')
+        df['alert_since'] = pd.to_datetime(np.where(found, since[rows], np.nan) * 3600, unit='s')
+        return df
+
+    # ---------- 保存 ----------
+
+    def to_state(self):
+        """可由 SnapshotStore.save_state 保存的狀態 (評估小時, DataFrame)；事件另存 self.events"""
+        frame = pd.DataFrame({'station': self.stations})
+        for field in _ALERT_FIELDS:
+            for r, name in enumerate(self.names):
+                frame[f'{name}_{field}'] = self._state[field][:, r]
+        return (self.hour, frame)
+
+    @classmethod
+    def from_state(cls, state, events=None, rules=None):
+        """
+        由 to_state 的結果（與保存的事件）還原；state 為 None（第一次啟動）時返回新的引擎
+        規則有增減時，新規則從未發布開始
+        """
+        engine = cls(rules)
+        if events is not None:
+            engine.events = events.copy()
+        if state is None:
+            return engine
+        hour, frame = state
+        engine.hour = int(hour)
+        engine._rows(frame['station'].astype(str).tolist())
+        for field, (dtype, _) in _ALERT_FIELDS.items():
+            for r, name in enumerate(engine.names):
+                if f'{name}_{field}' in frame.columns:
+                    engine._state[field][:, r] = frame[f'{name}_{field}'].to_numpy(dtype=dtype)
+        return engine
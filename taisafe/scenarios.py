@@ -0,0 +1,167 @@
+"""
+災害情境模擬引擎
+"""
+
+import numpy as np
+import pandas as pd
+
+from .aqi import compute_aqi
+from .regions import DEFAULT_REGION, scenario_config
+from .rules import classify
+
+# 集成模擬超標機率門檻 (PM2.5 μg/m³，與地圖配色分級一致)
+PM25_EXCEEDANCE_THRESHOLDS = (35, 53, 70, 150)
+
+# 水質污染情境倍率：pH 下降、溶氧下降、BOD/氨氮/RPI 上升
+WATER_CONTAMINATION_FACTORS = {
+    'ph': 0.8,
+    'do': 0.5,
+    'bod': 3.0,
+    'nh3n': 5.0,
+    'rpi': 2.5
+}
+
+class DisasterScenario:
+    """災害情境模擬類別"""
+    
+    @staticmethod
+    def earthquake(base_data):
+        if base_data is None:
+            return None
+        df = base_data.copy(deep=False)
+        df['shake_intensity'] = df['distance_to_center'].apply(lambda d: max(7 - d*2, 0))
+        # 單一情境只區分設備異常與正常
+        df['status'] = classify('shake_status', df['shake_intensity'], labels=['正常', '正常', '設備異常'])
+        df['color'] = [[255, 200, 0, 220]] * len(df)
+        df['radius'] = df['shake_intensity'] * 15 + 30
+        return df
+    
+    @staticmethod
+    def flooding(base_data, region=DEFAULT_REGION):
+        if base_data is None:
+            return None
+        df = base_data.copy(deep=False)
+        df['water_depth'] = DisasterScenario._flood_peak_depth(df['lat'].to_numpy(), region)
+        return DisasterScenario._apply_flood_status(df)
+
+    @staticmethod
+    def _flood_peak_depth(lat, region=DEFAULT_REGION):
+        """依緯度估算最大淹水深度 (cm)，區域淹水基準緯度以南越往南越低窪"""
+        reference_lat = scenario_config(region)['flood_reference_lat']
+        return np.maximum(0, (reference_lat - np.asarray(lat, dtype=np.float64)) * 300)
+
+    @staticmethod
+    def _apply_flood_status(df):
+        """依 water_depth 設定淹水情境的顏色、半徑與狀態"""
+        depth = df['water_depth'].to_numpy()
+        df['color'] = [[0, 100, 255, 220] if d > 50 else [100, 150, 255, 180] for d in depth]
+        df['radius'] = df['water_depth'] + 30
+        df['status'] = [f'淹水 {d:.0f}cm' if d > 10 else '正常' for d in depth]
+        return df
+    
+    @staticmethod
+    def war_alert(base_data):
+        if base_data is None:
+            return None
+        df = base_data.copy(deep=False)
+        df['color'] = [[255, 0, 0, 240]] * len(df)
+        df['radius'] = 50
+        df['status'] = '警戒中'
+        return df
+    
+    @staticmethod
+    def air_pollution(base_data, seed=None):
+        """
+        空污情境（單一實現）
+        seed: 亂數種子，固定種子可讓每次重新執行得到相同結果
+        """
+        if base_data is None:
+            return None
+        df = base_data.copy(deep=False)
+        rng_pm25, rng_pm10 = DisasterScenario._air_pollution_rngs(seed)
+        df['pm25'] = df['pm25'] + rng_pm25.integers(80, 150, len(df))
+        df['pm10'] = df['pm10'] + rng_pm10.integers(100, 200, len(df))
+        return DisasterScenario._apply_air_pollution_status(df)
+
+    @staticmethod
+    def air_pollution_ensemble(base_data, n_runs=1000, seed=42,
+                               thresholds=PM25_EXCEEDANCE_THRESHOLDS):
+        """
+        空污情境 Monte Carlo 集成模擬
+        以 (runs × stations) 陣列一次批次計算 n_runs 組擾動實現
+        參數:
+            base_data: 測站資料
+            n_runs: 實現次數
+            seed: 亂數種子
+            thresholds: 計算超標機率的 PM2.5 門檻
+        返回:
+            每站 PM2.5 平均值、P10/P50/P90 區間 (pm25_p10 ...) 與
+            超標機率 (pm25_exceed_<門檻>，0-1)
+        """
+        if base_data is None:
+            return None
+        df = base_data.copy(deep=False)
+        n_stations = len(df)
+        rng_pm25, rng_pm10 = DisasterScenario._air_pollution_rngs(seed)
+
+        # 與單一實現相同的擾動模型，只是一次抽出 n_runs 列
+        pm25_runs = (df['pm25'].to_numpy(dtype=np.float32) +
+                     rng_pm25.integers(80, 150, size=(n_runs, n_stations)).astype(np.float32))
+        pm10_runs = (df['pm10'].to_numpy(dtype=np.float32) +
+                     rng_pm10.integers(100, 200, size=(n_runs, n_stations)).astype(np.float32))
+
+        p10, p50, p90 = np.percentile(pm25_runs, [10, 50, 90], axis=0)
+        df['pm25'] = pm25_runs.mean(axis=0)
+        df['pm10'] = pm10_runs.mean(axis=0)
+        df['pm25_p10'] = p10.round(1)
+        df['pm25_p50'] = p50.round(1)
+        df['pm25_p90'] = p90.round(1)
+        for threshold in thresholds:
+            df[f'pm25_exceed_{threshold}'] = (pm25_runs > threshold).mean(axis=0).round(3)
+        df['ensemble_runs'] = n_runs
+
+        df = DisasterScenario._apply_air_pollution_status(df)
+        # 以 P90 決定半徑，讓地圖呈現不確定性的上緣
+        df['radius'] = df['pm25_p90'] / 3
+        return df
+
+    @staticmethod
+    def _air_pollution_rngs(seed):
+        """由同一個種子派生 PM2.5 與 PM10 各自獨立的亂數產生器"""
+        seed_seq = np.random.SeedSequence(seed)
+        return [np.random.default_rng(child) for child in seed_seq.spawn(2)]
+
+    @staticmethod
+    def _apply_air_pollution_status(df):
+        """依 PM2.5 設定空污情境的 AQI、狀態、顏色與半徑"""
+        pm25 = df['pm25'].to_numpy()
+        # 情境改變的是即時濃度，不使用快照附帶的滾動平均
+        df['aqi'], df['aqi_pollutant'] = compute_aqi(df, use_averages=False)
+        df['status'] = classify('pm25_scenario', pm25)
+        # 非常不健康為紅色，其餘為橘紅色
+        orange, red = [255, 50, 0, 220], [255, 0, 0, 240]
+        df['color'] = classify('pm25_scenario', pm25, labels=[orange, orange, red], missing=orange)
+        df['radius'] = df['pm25'] / 3
+        return df
+    
+    @staticmethod
+    def water_contamination(base_data, factors=None, exposure=None):
+        """
+        水質污染情境：依污染倍率放大各項水質指標
+        base_data 須為 normalize_water_quality 處理過的數值欄位
+        exposure: 各測站受污染程度 (0-1，來自 RiverNetwork.propagate)，
+                  None 表示所有測站完全受影響
+        返回模擬異常的水質資料
+        """
+        if base_data is None:
+            return None
+        if factors is None:
+            factors = WATER_CONTAMINATION_FACTORS
+        df = base_data.copy(deep=False)
+        cols = [col for col in factors if col in df.columns]
+        multiplier = pd.Series(factors)[cols].to_numpy()
+        if exposure is not None:
+            # 倍率依受污染程度線性內插：未受影響 = 1，完全受影響 = 原倍率
+            multiplier = 1 + np.outer(exposure, multiplier - 1)
+        df[cols] = (df[cols] * multiplier).round(2)
+        return df
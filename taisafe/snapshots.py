@@ -0,0 +1,264 @@
+"""
+跨程序共用的快照庫（SQLite WAL）
+由背景擷取程序寫入各資料來源的版本化快照，Streamlit 介面等多個程序只讀取；
+WAL 模式下讀取不會被寫入阻擋，介面程序的數量不影響上游 API 的呼叫次數
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from .sources import _fingerprint
+
+# 預設快照庫位置（可用環境變數 TAISAFE_SNAPSHOT_DB 指定）
+SNAPSHOT_DB_PATH = os.environ.get('TAISAFE_SNAPSHOT_DB', os.path.join('.taisafe_cache', 'snapshots.db'))
+# 每個來源／參數保留的歷史版本數
+SNAPSHOT_KEEP_VERSIONS = 5
+# 擷取程序心跳逾時（秒），超過視為沒有擷取程序在運作
+WORKER_HEARTBEAT_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    source      TEXT    NOT NULL,
+    args        TEXT    NOT NULL,
+    version     INTEGER NOT NULL,
+    fingerprint TEXT    NOT NULL,
+    fetched_at  REAL    NOT NULL,
+    meta        TEXT    NOT NULL,
+    frame       BLOB,
+    PRIMARY KEY (source, args, version)
+);
+CREATE TABLE IF NOT EXISTS demands (
+    source       TEXT    NOT NULL,
+    args         TEXT    NOT NULL,
+    force        INTEGER NOT NULL,
+    requested_at REAL    NOT NULL,
+    PRIMARY KEY (source, args)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker  TEXT PRIMARY KEY,
+    pid     INTEGER,
+    beat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    name     TEXT PRIMARY KEY,
+    saved_at REAL NOT NULL,
+    meta     TEXT NOT NULL,
+    frame    BLOB
+);
+"""
+
+# 需求表中代表「該來源的所有參數」
+_ALL_ARGS = '*'
+
+# ===========================================
+# 快照編碼：DataFrame 存 Arrow IPC，其餘存 JSON
+# ===========================================
+
+def args_key(args):
+    """參數 tuple -> 快照庫中的鍵"""
+    return json.dumps(list(args), ensure_ascii=False)
+
+def _encode(value, frames):
+    if isinstance(value, pd.DataFrame):
+        frames.append(value)
+        return {'__frame__': len(frames) - 1}
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode(item, frames) for item in value]}
+    if isinstance(value, list):
+        return [_encode(item, frames) for item in value]
+    return value
+
+def encode_snapshot(value):
+    """抓取結果 -> (meta JSON, Arrow IPC)；抓取函數的結果最多含一個 DataFrame"""
+    frames = []
+    meta = json.dumps(_encode(value, frames), ensure_ascii=False, default=str)
+    if len(frames) > 1:
+        raise ValueError("每個快照最多只能包含一個 DataFrame")
+    if not frames:
+        return meta, None
+
+    table = pa.Table.from_pandas(frames[0], preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return meta, sink.getvalue().to_pybytes()
+
+def decode_snapshot(meta, frame):
+    """(meta JSON, Arrow IPC) -> 抓取結果；DataFrame 直接是 Arrow 支撐的唯讀快照"""
+    df = None
+    if frame is not None:
+        table = pa.ipc.open_stream(frame).read_all()
+        df = table.to_pandas(split_blocks=True)
+        df.attrs['arrow_nbytes'] = table.nbytes
+
+    def hook(obj):
+        if '__frame__' in obj:
+            return df
+        if '__tuple__' in obj:
+            return tuple(obj['__tuple__'])
+        return obj
+
+    return json.loads(meta, object_hook=hook)
+
+# ===========================================
+# 快照庫
+# ===========================================
+
+class SnapshotStore:
+    """
+    版本化快照庫
+    寫入端（擷取程序）內容有變化才新增版本，沒變化只更新資料時間；
+    讀取端只在版本變動時才解碼，同一版本重複讀取返回同一個物件
+    """
+
+    def __init__(self, path=SNAPSHOT_DB_PATH):
+        self.path = str(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._decoded = {}   # (來源名稱, 參數鍵) -> (版本, 資料)
+        self._lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _conn(self):
+        # 每個執行緒各自一條連線（sqlite3 連線不可跨執行緒共用）
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- 寫入端 ----------
+
+    def write(self, source, args, value, fetched_at=None):
+        """寫入抓取結果，返回目前版本"""
+        key = args_key(args)
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        fingerprint = repr(_fingerprint(value))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, fingerprint FROM snapshots WHERE source=? AND args=? "
+                "ORDER BY version DESC LIMIT 1", (source, key)).fetchone()
+            if row is not None and row[1] == fingerprint:
+                version = row[0]
+                conn.execute("UPDATE snapshots SET fetched_at=? WHERE source=? AND args=? AND version=?",
+                             (fetched_at, source, key, version))
+            else:
+                version = 1 if row is None else row[0] + 1
+                meta, frame = encode_snapshot(value)
+                conn.execute("INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (source, key, version, fingerprint, fetched_at, meta, frame))
+                conn.execute("DELETE FROM snapshots WHERE source=? AND args=? AND version<=?",
+                             (source, key, version - SNAPSHOT_KEEP_VERSIONS))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+
+    def beat(self, worker):
+        """擷取程序心跳"""
+        self._conn().execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?)",
+                             (worker, os.getpid(), time.time()))
+
+    def take_demands(self):
+        """取出並清空讀取端的抓取需求，返回 [(來源名稱, 參數或 None, 是否強制)]"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT source, args, force FROM demands").fetchall()
+            conn.execute("DELETE FROM demands")
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return [(source, None if key == _ALL_ARGS else tuple(json.loads(key)), bool(force))
+                for source, key, force in rows]
+
+    def save_state(self, name, value):
+        """保存擷取程序的內部狀態（例如異常偵測的每站統計），只保留最新一份"""
+        meta, frame = encode_snapshot(value)
+        self._conn().execute("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)",
+                             (name, time.time(), meta, frame))
+
+    def load_state(self, name):
+        """讀取 save_state 保存的狀態，沒有時返回 None"""
+        row = self._conn().execute("SELECT meta, frame FROM state WHERE name=?", (name,)).fetchone()
+        return None if row is None else decode_snapshot(*row)
+
+    # ---------- 讀取端 ----------
+
+    def latest(self, source, args):
+        """
+        讀取最新快照，返回 {'version', 'fetched_at', 'value'}；沒有快照時返回 None
+        版本沒變時不重新解碼
+        """
+        key = args_key(args)
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT version, fetched_at FROM snapshots WHERE source=? AND args=? "
+            "ORDER BY version DESC LIMIT 1", (source, key)).fetchone()
+        if row is None:
+            return None
+        version, fetched_at = row
+
+        with self._lock:
+            cached = self._decoded.get((source, key))
+        if cached is None or cached[0] != version:
+            payload = conn.execute(
+                "SELECT meta, frame FROM snapshots WHERE source=? AND args=? AND version=?",
+                (source, key, version)).fetchone()
+            if payload is None:
+                # 剛好被更新的版本清除，下次再讀
+                return None
+            cached = (version, decode_snapshot(*payload))
+            with self._lock:
+                self._decoded[(source, key)] = cached
+        return {'version': version, 'fetched_at': fetched_at, 'value': cached[1]}
+
+    def request(self, source, args=None, force=False):
+        """
+        要求擷取程序抓取某個來源（args 為 None 表示該來源所有參數）
+        force 為 True 時立即重新抓取，否則只把新參數加入輪詢
+        """
+        key = _ALL_ARGS if args is None else args_key(args)
+        self._conn().execute(
+            "INSERT INTO demands VALUES (?, ?, ?, ?) ON CONFLICT (source, args) "
+            "DO UPDATE SET force=max(force, excluded.force), requested_at=excluded.requested_at",
+            (source, key, int(force), time.time()))
+
+    def worker_alive(self, timeout=WORKER_HEARTBEAT_TIMEOUT):
+        """是否有擷取程序在運作"""
+        row = self._conn().execute("SELECT max(beat_at) FROM workers").fetchone()
+        return row[0] is not None and time.time() - row[0] <= timeout
+
+    def status(self):
+        """各來源／參數最新版本與資料時間"""
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT source, args, max(version), fetched_at, length(frame) FROM snapshots "
+            "GROUP BY source, args").fetchall()
+        return [
+            {
+                'source': source,
+                'args': tuple(json.loads(key)),
+                'version': version,
+                'fetched_at': fetched_at,
+                'age_s': now - fetched_at,
+                'nbytes': nbytes or 0
+            }
+            for source, key, version, fetched_at, nbytes in rows
+        ]
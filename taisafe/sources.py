@@ -0,0 +1,237 @@
+"""
+資料來源快取：過期時背景更新，更新完成前沿用舊資料
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+# 背景更新失敗後的重試間隔（秒）
+SOURCE_RETRY_SECONDS = 60
+
+# 非預設參數（例如某個攝影機或風場地點）多久沒有人讀取就停止背景更新並移除：
+# 來源更新間隔的 SOURCE_IDLE_TTLS 倍，但至少 SOURCE_IDLE_MIN_SECONDS（避免畫面開著沒操作時被移除後又同步重抓）
+SOURCE_IDLE_TTLS = 4
+SOURCE_IDLE_MIN_SECONDS = 600
+
+# 抓取函數返回此值表示沒有新資料（例如快照庫版本未變），沿用舊資料並排定下次更新
+UNCHANGED = object()
+
+# ===========================================
+# 唯讀快照
+# ===========================================
+
+def freeze_frame(df):
+    """
+    將 DataFrame 轉為 Arrow 支撐的唯讀快照
+    數值欄位直接引用 Arrow 緩衝區（零複製、不可寫入），所有 session 共用同一份；
+    衍生資料表請以 copy(deep=False) 建立，寫入時才複製
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    frame = table.to_pandas(split_blocks=True)
+    frame.attrs['arrow_nbytes'] = table.nbytes
+    return frame
+
+def _freeze(value):
+    """凍結抓取結果中的 DataFrame（抓取函數返回 (資料, 是否真實) 等 tuple）"""
+    if isinstance(value, pd.DataFrame):
+        # 從快照庫解碼的資料已經是 Arrow 唯讀快照
+        return value if 'arrow_nbytes' in value.attrs else freeze_frame(value)
+    if isinstance(value, tuple):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _shared_nbytes(value):
+    """快照中 Arrow 緩衝區的位元組數"""
+    if isinstance(value, pd.DataFrame):
+        return value.attrs.get('arrow_nbytes', 0)
+    if isinstance(value, tuple):
+        return sum(_shared_nbytes(item) for item in value)
+    return 0
+
+def _fingerprint(value):
+    """資料內容指紋，用來判斷重新抓取後是否真的有新資料"""
+    if isinstance(value, pd.DataFrame):
+        return int(pd.util.hash_pandas_object(value, index=True).sum())
+    if isinstance(value, (tuple, list)):
+        return tuple(_fingerprint(item) for item in value)
+    return repr(value)
+
+# ===========================================
+# 資料來源快取
+# ===========================================
+
+class SourceStore:
+    """
+    資料來源快取
+    每個來源依參數（地點等）分別快取；過期或被要求重新載入時在背景重新抓取，
+    新資料就緒前持續提供舊資料，所有 session 共用同一份，不會因單一使用者操作而集中重抓；
+    內容有變化時版本加一並透過 SnapshotBus 通知訂閱者；
+    註冊時指定的預設參數永久更新，其他參數久未讀取即移除，不會無限期輪詢上游
+    """
+
+    def __init__(self, bus=None, max_workers=4):
+        self.bus = bus
+        self._loaders = {}    # 來源名稱 -> (抓取函數, ttl)
+        self._defaults = {}   # 來源名稱 -> 永久更新的參數
+        self._entries = {}    # (來源名稱, 參數) -> 快取紀錄
+        self._key_locks = {}  # (來源名稱, 參數) -> 鎖，首次載入同時只抓一次
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='source-refresh')
+        # 排程執行緒：睡到最近一筆資料過期才醒來排入更新，沒有人讀取也會保持資料新鮮
+        self._wakeup = threading.Event()
+        threading.Thread(target=self._schedule_loop, name='source-scheduler', daemon=True).start()
+
+    def register(self, name, loader, ttl, defaults=((),)):
+        """註冊來源；defaults 為沒有人讀取也持續更新的參數"""
+        with self._lock:
+            self._loaders[name] = (loader, ttl)
+            self._defaults[name] = set(defaults)
+
+    def get(self, name, args=()):
+        """取得資料；沒有快取時同步載入，過期時排入背景更新並先返回舊資料"""
+        key = (name, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['last_read'] = time.time()
+        if entry is None:
+            return self._load_first(key)
+
+        if entry['stale'] or time.time() > entry['next_refresh']:
+            self._schedule(key)
+        return entry['value']
+
+    def invalidate(self, name, args=None):
+        """
+        要求重新載入某個來源（args 指定時只更新該地點／參數）
+        只在背景重新抓取，返回排入更新的項目數
+        """
+        with self._lock:
+            keys = [key for key in self._entries
+                    if key[0] == name and (args is None or key[1] == args)]
+            for key in keys:
+                self._entries[key]['stale'] = True
+        for key in keys:
+            self._schedule(key)
+        return len(keys)
+
+    def status(self):
+        """各快取項目的版本、資料時間與是否更新中"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    'source': name,
+                    'args': args,
+                    'version': entry['version'],
+                    'age_s': now - entry['fetched_at'],
+                    'nbytes': _shared_nbytes(entry['value']),
+                    'refreshing': (name, args) in self._refreshing
+                }
+                for (name, args), entry in self._entries.items()
+            ]
+
+    def _load_first(self, key):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = self._store(key, self._call(key))
+            return entry['value']
+
+    def _schedule(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._executor.submit(self._refresh, key)
+
+    def _refresh(self, key):
+        try:
+            self._store(key, self._call(key))
+        except Exception:
+            # 背景更新失敗時保留舊資料，稍後再試
+            with self._lock:
+                self._entries[key]['next_refresh'] = time.time() + SOURCE_RETRY_SECONDS
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+            self._wakeup.set()
+
+    def _call(self, key):
+        name, args = key
+        loader, _ = self._loaders[name]
+        return loader(*args)
+
+    def _store(self, key, value):
+        if value is UNCHANGED:
+            with self._lock:
+                entry = self._entries[key]
+                entry.update(next_refresh=time.time() + self._loaders[key[0]][1], stale=False)
+            self._wakeup.set()
+            return entry
+
+        value = _freeze(value)
+        fingerprint = _fingerprint(value)
+        with self._lock:
+            previous = self._entries.get(key)
+            changed = previous is None or previous['fingerprint'] != fingerprint
+            if previous is None:
+                version = 1
+            else:
+                version = previous['version'] + 1 if changed else previous['version']
+            now = time.time()
+            entry = {
+                'value': value if changed else previous['value'],
+                'fingerprint': fingerprint,
+                'fetched_at': now,
+                'next_refresh': now + self._loaders[key[0]][1],
+                'version': version,
+                'stale': False,
+                'last_read': now if previous is None else previous['last_read']
+            }
+            self._entries[key] = entry
+        self._wakeup.set()
+
+        if changed and previous is not None and self.bus is not None:
+            self.bus.publish(key[0], version)
+        return entry
+
+    def _idle(self, key, entry, now):
+        name, args = key
+        if args in self._defaults.get(name, ()):
+            return False
+        idle_seconds = max(SOURCE_IDLE_TTLS * self._loaders[name][1], SOURCE_IDLE_MIN_SECONDS)
+        return now - entry['last_read'] > idle_seconds
+
+    def _schedule_loop(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            with self._lock:
+                due = []
+                next_refresh = None
+                for key, entry in list(self._entries.items()):
+                    # 更新中的項目完成後會再喚醒排程執行緒
+                    if key in self._refreshing:
+                        continue
+                    if self._idle(key, entry, now):
+                        # 久未讀取的非預設參數不再更新；下次讀取時重新同步載入
+                        del self._entries[key]
+                        self._key_locks.pop(key, None)
+                        continue
+                    if entry['next_refresh'] <= now:
+                        due.append(key)
+                    elif next_refresh is None or entry['next_refresh'] < next_refresh:
+                        next_refresh = entry['next_refresh']
+            for key in due:
+                self._schedule(key)
+
+            self._wakeup.wait(None if next_refresh is None else next_refresh - now)
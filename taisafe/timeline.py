@@ -0,0 +1,152 @@
+"""
+時序情境播放引擎
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .ingest import get_fallback_wind_data
+from .regions import DEFAULT_REGION, scenario_config
+from .scenarios import DisasterScenario
+
+# 情境時間步長（分鐘）與模擬總時數
+SCENARIO_STEP_MINUTES = 10
+SCENARIO_HOURS = 6
+
+# 超過此大小的時間幀陣列改存為磁碟上的記憶體映射檔
+FRAME_MEMMAP_THRESHOLD_BYTES = 64 * 1024 * 1024
+FRAME_CACHE_DIR = Path('.taisafe_cache') / 'frames'
+
+class ScenarioTimeline:
+    """
+    時序情境模擬類別
+    一次預先計算 T 個時間幀，以 float32 陣列 (frames × stations) 儲存，
+    播放時只切片取出單一時間幀，不重新計算
+    """
+
+    SUPPORTED = ('flooding', 'air_pollution')
+
+    @staticmethod
+    def build(scenario, base_data, wind=None, hours=SCENARIO_HOURS,
+              step_minutes=SCENARIO_STEP_MINUTES, memmap_path=None, region=DEFAULT_REGION):
+        """
+        預先計算情境的所有時間幀
+        參數:
+            scenario: 'flooding' 或 'air_pollution'
+            base_data: 測站資料
+            wind: 風向資料 (fetch_wind_data 的結果)，空污擴散使用
+            hours: 模擬總時數
+            step_minutes: 每幀間隔（分鐘）
+            memmap_path: 指定時將時間幀寫入記憶體映射檔 (.npy)
+            region: 區域代碼（淹水基準緯度與空污污染源）
+        返回:
+            dict: frames (唯讀 float32 陣列)、minutes、variable、unit
+        """
+        n_frames = int(hours * 60 // step_minutes) + 1
+        minutes = np.arange(n_frames) * step_minutes
+
+        if scenario == 'flooding':
+            frames = ScenarioTimeline._flood_frames(base_data, minutes, region)
+            variable, unit = 'water_depth', 'cm'
+        elif scenario == 'air_pollution':
+            frames = ScenarioTimeline._plume_frames(base_data, minutes, wind, scenario_config(region)['plume_source'])
+            variable, unit = 'pm25', 'μg/m³'
+        else:
+            raise ValueError(f"不支援時序播放的情境: {scenario}")
+
+        frames = frames.astype(np.float32)
+        if memmap_path is None and frames.nbytes > FRAME_MEMMAP_THRESHOLD_BYTES:
+            # 以內容雜湊命名：不同測站資料或風場的時間軸不會共用同一個檔案
+            digest = hashlib.blake2b(frames, digest_size=8).hexdigest()
+            memmap_path = FRAME_CACHE_DIR / f"{region}_{scenario}_{n_frames}x{frames.shape[1]}_{digest}.npy"
+        if memmap_path is not None:
+            frames = ScenarioTimeline.to_memmap(frames, memmap_path)
+        frames.flags.writeable = False
+
+        return {
+            'frames': frames,
+            'minutes': minutes,
+            'variable': variable,
+            'unit': unit
+        }
+
+    @staticmethod
+    def to_memmap(frames, path):
+        """
+        將時間幀寫入 .npy 檔並以唯讀記憶體映射重新開啟
+        先寫入同目錄的暫存檔再以 os.replace 取代，其他仍映射舊檔的時間軸不受影響
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.stem + '.', suffix='.npy.tmp')
+        os.close(fd)
+        try:
+            out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=frames.shape)
+            out[:] = frames
+            out.flush()
+            del out
+            os.replace(tmp_path, path)
+        except:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        return np.load(path, mmap_mode='r')
+
+    @staticmethod
+    def frame_view(df, timeline, frame_idx):
+        """
+        取出單一時間幀並套用到地圖資料
+        只切片預先計算好的陣列，再更新顏色、半徑與狀態
+        """
+        df = df.copy(deep=False)
+        df[timeline['variable']] = np.asarray(timeline['frames'][frame_idx], dtype=np.float64)
+        if timeline['variable'] == 'water_depth':
+            return DisasterScenario._apply_flood_status(df)
+        return DisasterScenario._apply_air_pollution_status(df)
+
+    @staticmethod
+    def _flood_frames(base_data, minutes, region=DEFAULT_REGION, peak_hour=3.0, shape=2.0):
+        """
+        淹水深度時序：以 gamma 型歷線 (t/tp)^k · exp(k(1 - t/tp)) 縮放各站最大淹水深度
+        在 peak_hour 達到最大值後逐漸退水
+        """
+        peak_depth = DisasterScenario._flood_peak_depth(base_data['lat'].to_numpy(), region)
+        t_ratio = minutes / (peak_hour * 60.0)
+        hydrograph = t_ratio ** shape * np.exp(shape * (1.0 - t_ratio))
+        return np.outer(hydrograph, peak_depth)
+
+    @staticmethod
+    def _plume_frames(base_data, minutes, wind, source, release_hours=2.0,
+                      emission=300.0, sigma0_km=0.5, diffusivity=0.02):
+        """
+        空污擴散時序：污染源在 release_hours 內每個時間步釋放一個高斯煙團並隨風平移
+        風場固定時，煙團濃度只與年齡有關，因此持續排放的濃度為
+        單一煙團響應沿時間軸的累積和（扣除排放停止前已離開的部分）
+        """
+        pm25 = base_data['pm25'].to_numpy(dtype=np.float64)
+        if wind is None:
+            wind = get_fallback_wind_data()
+
+        # 氣象風向為「風從哪裡來」，煙團往反方向移動
+        direction_rad = np.radians(wind['direction'])
+        speed_km_per_min = wind['speed'] * 60 / 1000
+        drift_x = -np.sin(direction_rad) * speed_km_per_min * minutes
+        drift_y = -np.cos(direction_rad) * speed_km_per_min * minutes
+
+        # 測站相對污染源的位置（公里）
+        station_x = (base_data['lon'].to_numpy() - source['lon']) * 111 * np.cos(np.radians(source['lat']))
+        station_y = (base_data['lat'].to_numpy() - source['lat']) * 111
+
+        sigma_sq = sigma0_km ** 2 + 2 * diffusivity * minutes
+        dist_sq = (station_x[None, :] - drift_x[:, None]) ** 2 + (station_y[None, :] - drift_y[:, None]) ** 2
+        puff = emission / (2 * np.pi * sigma_sq[:, None]) * np.exp(-dist_sq / (2 * sigma_sq[:, None]))
+
+        # 第 t 幀的濃度 = 年齡介於 t - release_steps + 1 與 t 之間的煙團總和
+        cumulative = np.cumsum(puff, axis=0)
+        release_steps = max(1, int(release_hours * 60 // (minutes[1] - minutes[0]))) if len(minutes) > 1 else 1
+        plume = cumulative.copy()
+        plume[release_steps:] -= cumulative[:-release_steps]
+        return pm25[None, :] + plume
@@ -0,0 +1,9 @@
+"""
+時間換算：發布時間 -> epoch 秒／小時，供歷史時序、滾動統計、異常偵測、預報與警示共用
+"""
+
+import pandas as pd
+
+def to_epoch(values):
+    """datetime 陣列 -> 秒（不做時區轉換，發布時間本身為台灣時間）"""
+    return pd.DatetimeIndex(values).as_unit('s').asi8
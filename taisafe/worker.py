@@ -0,0 +1,244 @@
+"""
+背景擷取程序：輪詢所有資料來源、正規化後寫入共用快照庫
+介面程序只讀快照庫，開再多個 Streamlit 副本也不會增加上游 API 的呼叫次數
+
+    python -m taisafe.worker                 # 持續輪詢
+    python -m taisafe.worker --once          # 抓取一輪後結束（排程器／cron 使用）
+    TAISAFE_SNAPSHOT_DB=/srv/taisafe.db python -m taisafe.worker
+
+空品與水質每輪只向環境部抓取一次全國資料，依縣市分割後在本程序內處理各區域，
+再分別寫入 (來源, (區域代碼,)) 快照；真實資料同時追加到測站歷史時序（taisafe.history），
+空品快照附帶各測站的滾動平均欄位（taisafe.aggregates）、串流異常偵測結果（taisafe.anomaly）、
+未來數小時的 PM2.5 預報（taisafe.nowcast）與警示規則的評估結果（taisafe.rules）
+"""
+
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+
+from .aggregates import RollingAggregates
+from .anomaly import StreamingAnomalyDetector
+from .aqi import apply_aqi
+from .history import HISTORY_DIR, open_history
+from .ingest import NATIONWIDE_SOURCES, SOURCES, source_args, split_regions
+from .nowcast import PM25Nowcaster
+from .rules import ALERT_EVENT_LABELS, AlertEngine
+from .snapshots import SNAPSHOT_DB_PATH, SnapshotStore
+from .sources import SOURCE_RETRY_SECONDS
+
+# 最長睡眠時間（秒）：心跳與讀取端需求的檢查間隔
+WORKER_POLL_SECONDS = 5
+# 讀取端要求的額外參數（例如行動版使用者位置）多久沒人再要求就停止輪詢
+WORKER_DEMAND_TTL = 3600
+# 異常偵測的來源（狀態以 anomaly:<來源> 保存在快照庫）
+ANOMALY_SOURCES = ('air_quality',)
+# 評估警示規則的來源（狀態以 alerts:<來源>、最近事件以 alert_events:<來源> 保存在快照庫）
+ALERT_SOURCES = ('air_quality',)
+
+logger = logging.getLogger(__name__)
+
+class IngestionWorker:
+    """
+    擷取程序
+    每個來源依更新間隔輪詢預設參數；讀取端遇到沒有快照的參數時寫入需求，
+    下一輪加入輪詢，強制需求（介面的「重新載入」）則立即重新抓取。
+    全國來源以 (來源名稱, None) 為鍵，一次抓取後寫入所有區域；
+    history 為 {資料集: HistoryStore} 時，真實的全國資料追加到歷史時序，每天壓縮一次前一天的分割，
+    並以歷史回補空品的滾動平均（程序重啟後 8 / 24 小時平均不必重新累積）與訓練 PM2.5 預報模型
+    """
+
+    def __init__(self, store, sources=SOURCES, nationwide=NATIONWIDE_SOURCES,
+                 max_workers=4, name=None, history=None):
+        self.store = store
+        self.history = history or {}
+        self._compacted_on = None
+        self.aggregates = {}
+        if 'air_quality' in self.history:
+            self.aggregates['air_quality'] = RollingAggregates().backfill(self.history['air_quality'])
+        self.nowcasters = {}
+        if 'air_quality' in self.history and 'air_quality' in nationwide:
+            self.nowcasters['air_quality'] = PM25Nowcaster().backfill(self.history['air_quality'])
+        # 異常偵測狀態從快照庫還原，重啟後不必重新暖機
+        self.detectors = {source: StreamingAnomalyDetector.from_state(store.load_state(f'anomaly:{source}'))
+                          for source in ANOMALY_SOURCES if source in nationwide}
+        # 警示規則狀態同樣從快照庫還原，重啟後不會重複發布進行中的警示
+        self.alert_engines = {source: AlertEngine.from_state(store.load_state(f'alerts:{source}'),
+                                                             store.load_state(f'alert_events:{source}'))
+                              for source in ALERT_SOURCES if source in nationwide}
+        self.sources = sources
+        self.nationwide = nationwide
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self._lock = threading.Lock()
+        # (來源名稱, 參數) -> 下次抓取時間；預設參數永久輪詢
+        self._due = {(source, None if source in nationwide else source_args(source)): 0.0
+                     for source in sources}
+        self._demanded = {}   # 讀取端要求的額外參數 -> 最後要求時間
+        self._running = set()
+
+    def run_once(self):
+        """抓取所有到期的項目並等待完成，返回抓取的項目數"""
+        self.store.beat(self.name)
+        self._take_demands()
+        self._compact_history()
+        futures = [self._executor.submit(self._fetch, key) for key in self._due_keys()]
+        wait(futures)
+        return len(futures)
+
+    def run_forever(self):
+        logger.info("擷取程序 %s 啟動，快照庫 %s", self.name, self.store.path)
+        while True:
+            self.store.beat(self.name)
+            self._take_demands()
+            self._compact_history()
+            for key in self._due_keys():
+                self._executor.submit(self._fetch, key)
+
+            with self._lock:
+                next_due = min(self._due.values(), default=None)
+            sleep = WORKER_POLL_SECONDS if next_due is None else next_due - time.time()
+            time.sleep(min(max(sleep, 0.5), WORKER_POLL_SECONDS))
+
+    def _take_demands(self):
+        now = time.time()
+        with self._lock:
+            for source, args, force in self.store.take_demands():
+                if source not in self.sources:
+                    continue
+                if source in self.nationwide:
+                    # 所有區域都已在輪詢中，只需處理強制重新抓取
+                    keys = [(source, None)] if force else []
+                elif args is None:
+                    keys = [key for key in self._due if key[0] == source]
+                else:
+                    keys = [(source, args)]
+                for key in keys:
+                    if key not in self._due:
+                        self._due[key] = now
+                    elif force:
+                        self._due[key] = min(self._due[key], now)
+                    if args is not None:
+                        self._demanded[key] = now
+
+            # 太久沒人要求的額外參數停止輪詢
+            for key, requested_at in list(self._demanded.items()):
+                if now - requested_at > WORKER_DEMAND_TTL:
+                    del self._demanded[key]
+                    if key[1] != source_args(key[0]):
+                        self._due.pop(key, None)
+
+    def _due_keys(self):
+        now = time.time()
+        with self._lock:
+            keys = [key for key, due in self._due.items()
+                    if due <= now and key not in self._running]
+            self._running.update(keys)
+        return keys
+
+    def _fetch(self, key):
+        source, args = key
+        fetch, ttl = self.sources[source]
+        try:
+            if args is None:
+                self._fetch_nationwide(source)
+            else:
+                version = self.store.write(source, args, fetch(*args))
+                logger.debug("%s%s -> v%d", source, args, version)
+            next_due = time.time() + ttl
+        except Exception:
+            logger.exception("抓取 %s%s 失敗", source, args)
+            next_due = time.time() + SOURCE_RETRY_SECONDS
+        with self._lock:
+            self._running.discard(key)
+            if key in self._due:
+                self._due[key] = next_due
+
+    def _compact_history(self):
+        """換日後把前一天以前的歷史分割壓縮為 Parquet（每天一次）"""
+        today = date.today()
+        if self._compacted_on == today:
+            return
+        self._compacted_on = today
+        for dataset, history in self.history.items():
+            try:
+                compacted = history.compact(today)
+                if compacted:
+                    logger.info("歷史時序 %s 壓縮 %d 天", dataset, compacted)
+            except Exception:
+                logger.exception("壓縮歷史時序 %s 失敗", dataset)
+
+    def _fetch_nationwide(self, source):
+        frame, is_real = self.nationwide[source]()
+        if is_real and source in self.history:
+            try:
+                inserted = self.history[source].write(frame)
+                logger.debug("%s 歷史時序新增 %d 筆", source, inserted)
+            except Exception:
+                logger.exception("寫入歷史時序 %s 失敗", source)
+        if is_real and source in self.aggregates:
+            # 同一來源不會同時抓取（_running），滾動平均不需另外加鎖
+            aggregates = self.aggregates[source]
+            aggregates.update(frame)
+            # 環境部沒有發布 AQI 的測站以規定的平均時間補算
+            frame = apply_aqi(aggregates.attach(frame), keep_reported=True)
+        if is_real and source in self.detectors:
+            detector = self.detectors[source]
+            if detector.update(frame):
+                self.store.save_state(f'anomaly:{source}', detector.to_state())
+                alerts = detector.alerts()
+                if len(alerts):
+                    logger.info("%s 異常偵測：%d 筆候選警示", source, len(alerts))
+            frame = detector.attach(frame)
+        if is_real and source in self.nowcasters:
+            # 新的發布小時才併入樣本並重解係數，預報隨快照一起寫入
+            nowcaster = self.nowcasters[source]
+            nowcaster.update(frame)
+            frame = nowcaster.attach(frame)
+        if is_real and source in self.alert_engines:
+            # 規則在預報之後評估，預報欄位也可作為警示條件
+            engine = self.alert_engines[source]
+            events = engine.update(frame)
+            if events is not None:
+                self.store.save_state(f'alerts:{source}', engine.to_state())
+                if len(events):
+                    self.store.save_state(f'alert_events:{source}', engine.events)
+                for event in events.itertuples():
+                    logger.info("%s 警示%s：%s %s（%.1f）", source, ALERT_EVENT_LABELS[event.event],
+                                event.station, event.label, event.value)
+            frame = engine.attach(frame)
+        # 全國約百餘站，各區域處理只需數十毫秒，在本程序內完成即可；
+        # 交給 spawn 程序池反而要序列化整份資料表、往返成本高於處理本身
+        regions = split_regions(source, (frame, is_real))
+        for region, value in regions.items():
+            version = self.store.write(source, (region,), value)
+            logger.debug("%s(%r,) -> v%d", source, region, version)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TAI-SAFE 背景擷取程序")
+    parser.add_argument('--db', default=SNAPSHOT_DB_PATH, help="快照庫路徑")
+    parser.add_argument('--once', action='store_true', help="抓取一輪後結束")
+    parser.add_argument('--workers', type=int, default=4, help="同時抓取的來源數")
+    parser.add_argument('--history', default=str(HISTORY_DIR), help="測站歷史時序目錄")
+    parser.add_argument('--no-history', action='store_true', help="不記錄測站歷史時序")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    options = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if options.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    worker = IngestionWorker(SnapshotStore(options.db), max_workers=options.workers,
+                             history=None if options.no_history else open_history(options.history))
+    if options.once:
+        logger.info("抓取 %d 個來源", worker.run_once())
+        return
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""滾動平均與暴力重算一致、趨勢圖降採樣"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from taisafe.aggregates import AGGREGATE_WINDOWS, RollingAggregates, lttb, minmax_buckets
+
+STATIONS = ['安南', '善化', '新營']
+COLUMNS = ['pm25', 'o3']
+
+def _readings(seed, hours=60):
+    """逐時讀值：部分小時缺報、部分欄位缺值，部分小時重複發布（後到的值取代）"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2026-10-01 00:00')
+    rows = []
+    for hour in range(hours):
+        for station in STATIONS:
+            if rng.random() < 0.15:
+                continue
+            for _ in range(2 if rng.random() < 0.1 else 1):
+                values = rng.uniform(0, 80, len(COLUMNS))
+                values[rng.random(len(COLUMNS)) < 0.1] = np.nan
+                rows.append({'sitename': station, 'publishtime': start + pd.Timedelta(hours=hour, minutes=5),
+                             **dict(zip(COLUMNS, values))})
+    return pd.DataFrame(rows)
+
+def _brute_force(frame, window):
+    hours, min_valid = AGGREGATE_WINDOWS[window]
+    frame = frame.assign(hour=frame['publishtime'].dt.floor('h'))
+    latest = frame.drop_duplicates(['sitename', 'hour'], keep='last')
+    expected = {}
+    for station, part in latest.groupby('sitename'):
+        part = part[part['hour'] > part['hour'].max() - pd.Timedelta(hours=hours)]
+        counts = part[COLUMNS].notna().sum()
+        expected[station] = part[COLUMNS].mean().where(counts >= min_valid)
+    return pd.DataFrame(expected).T.reindex(STATIONS)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_incremental_means_match_brute_force(seed):
+    frame = _readings(seed)
+    aggregates = RollingAggregates(columns=COLUMNS)
+    # 逐小時到達，模擬擷取程序每輪只帶入最新發布
+    for _, part in frame.groupby(frame['publishtime'].dt.floor('h'), sort=True):
+        aggregates.update(part)
+
+    for window in AGGREGATE_WINDOWS:
+        means = aggregates.means(window).reindex(STATIONS)
+        np.testing.assert_allclose(means.to_numpy(), _brute_force(frame, window).to_numpy(), rtol=1e-9)
+
+def test_single_batch_backfill_matches_incremental():
+    frame = _readings(3)
+    incremental = RollingAggregates(columns=COLUMNS)
+    for _, part in frame.groupby(frame['publishtime'].dt.floor('h'), sort=True):
+        incremental.update(part)
+    batch = RollingAggregates(columns=COLUMNS)
+    batch.update(frame)
+    for window in AGGREGATE_WINDOWS:
+        pd.testing.assert_frame_equal(batch.means(window).reindex(STATIONS),
+                                      incremental.means(window).reindex(STATIONS))
+
+def test_attach_adds_window_columns_without_mutating_input():
+    frame = _readings(4)
+    aggregates = RollingAggregates(columns=COLUMNS)
+    aggregates.update(frame)
+    latest = pd.DataFrame({'sitename': ['安南', '未知站'], 'pm25': [10.0, 20.0]})
+    attached = aggregates.attach(latest)
+    assert 'pm25_8h' not in latest.columns
+    assert attached['pm25_24h'].iloc[0] == aggregates.means('24h').loc['安南', 'pm25']
+    assert np.isnan(attached['pm25_24h'].iloc[1])
+
+def test_lttb_keeps_endpoints_and_requested_points():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 30)
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+
+def test_minmax_buckets_keeps_spike():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[517] = 500.0
+    assert 517 in minmax_buckets(x, y, 20)
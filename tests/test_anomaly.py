@@ -0,0 +1,75 @@
+"""串流異常偵測：EWMA 統計、突波、數值凍結與斷訊"""
+
+import numpy as np
+import pandas as pd
+
+from taisafe.anomaly import ANOMALY_MIN_STD, ANOMALY_PARAMS, StreamingAnomalyDetector
+
+START = pd.Timestamp('2026-10-01 00:00')
+
+def _feed(detector, values, station='安南', column='pm25', start_hour=0, extra=None):
+    """逐小時併入單站讀值（NaN 為缺值）"""
+    for offset, value in enumerate(values):
+        time = START + pd.Timedelta(hours=start_hour + offset)
+        frame = pd.DataFrame({'sitename': [station], 'publishtime': [time], column: [value], **(extra or {})})
+        detector.update(frame)
+
+def test_ewma_matches_pandas():
+    rng = np.random.default_rng(0)
+    values = 30 + rng.normal(0, 2, 50)
+    detector = StreamingAnomalyDetector(columns=['pm25'])
+    _feed(detector, values)
+    series = pd.Series(values).ewm(alpha=ANOMALY_PARAMS['alpha'], adjust=False)
+    np.testing.assert_allclose(detector._state['mean'][0, 0], series.mean().iloc[-1])
+    np.testing.assert_allclose(detector._state['var'][0, 0], series.var(bias=True).iloc[-1])
+
+def test_spike_is_flagged_and_clipped():
+    detector = StreamingAnomalyDetector(columns=['pm25'])
+    _feed(detector, [20, 21, 19, 20, 22, 18, 20, 21])
+    mean_before = detector._state['mean'][0, 0]
+    std_before = np.sqrt(max(detector._state['var'][0, 0], ANOMALY_MIN_STD['pm25'] ** 2))
+    _feed(detector, [300], start_hour=8)
+    assert detector.flags()['spike'][0, 0]
+    alert = detector.alerts().iloc[0]
+    assert alert['kind'] == 'spike' and alert['value'] == 300
+    # 突波截斷後才併入，基線只小幅上升
+    rise = detector._state['mean'][0, 0] - mean_before
+    assert rise <= ANOMALY_PARAMS['alpha'] * ANOMALY_PARAMS['spike_z'] * std_before + 1e-9
+
+    _feed(detector, [20], start_hour=9)
+    assert not detector.flags()['spike'].any()
+
+def test_no_spike_during_warmup():
+    detector = StreamingAnomalyDetector(columns=['pm25'])
+    _feed(detector, [20, 20, 300])
+    assert not detector.flags()['spike'].any()
+
+def test_flatline_only_for_volatile_pollutants():
+    detector = StreamingAnomalyDetector(columns=['pm25', 'so2'])
+    hours = ANOMALY_PARAMS['flatline_hours']
+    _feed(detector, [15.0] * (hours - 1), extra={'so2': [2.0]})
+    assert not detector.flags()['flatline'].any()
+    _feed(detector, [15.0], start_hour=hours - 1, extra={'so2': [2.0]})
+    assert detector.flags()['flatline'].tolist() == [[True, False]]
+
+def test_dropout_after_consecutive_missing_hours():
+    detector = StreamingAnomalyDetector(columns=['pm25', 'o3'])
+    _feed(detector, [20.0, np.nan, np.nan])
+    assert not detector.flags()['dropout'].any()
+    _feed(detector, [np.nan], start_hour=3)
+    # O3 從未回報：不算斷訊
+    assert detector.flags()['dropout'].tolist() == [[True, False]]
+    attached = detector.attach(pd.DataFrame({'sitename': ['安南', '善化']}))
+    assert attached['anomaly'].tolist() == ['PM2.5 斷訊', '']
+    assert attached['anomaly_dropout'].tolist() == [True, False]
+
+def test_repeated_hour_and_state_round_trip():
+    detector = StreamingAnomalyDetector(columns=['pm25'])
+    _feed(detector, [20, 22, 21])
+    frame = pd.DataFrame({'sitename': ['安南'], 'publishtime': [START + pd.Timedelta(hours=2)], 'pm25': [99]})
+    assert not detector.update(frame)
+
+    restored = StreamingAnomalyDetector.from_state(detector.to_state(), columns=['pm25'])
+    assert restored.hour == detector.hour
+    for field in ('mean', 'var', 'n', 'last', 'same', 'missing'):
+        np.testing.assert_array_equal(restored._state[field], detector._state[field])
@@ -0,0 +1,132 @@
+"""SnapshotAPI.handle：ETag / 304、gzip、Arrow 與錯誤狀態碼"""
+
+import gzip
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from taisafe import api as api_module
+from taisafe.api import ARROW_MIME, SnapshotAPI
+from taisafe.regions import DEFAULT_REGION
+from taisafe.snapshots import SnapshotStore
+
+def _stations(pm25=10.0, n=40):
+    return (pd.DataFrame({
+        'sitename': [f'站{i}' for i in range(n)],
+        'county': '臺南市',
+        'lat': [22.9 + i * 0.01 for i in range(n)],
+        'lon': [120.2 + i * 0.01 for i in range(n)],
+        'pm25': [pm25 + i for i in range(n)],
+    }), True)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # 每個請求都向快照庫確認版本
+    monkeypatch.setattr(api_module, 'API_VERSION_CHECK_SECONDS', 0)
+    store = SnapshotStore(tmp_path / 'snapshots.db')
+    store.write('air_quality', (DEFAULT_REGION,), _stations(), fetched_at=1_700_000_000.0)
+    return store
+
+@pytest.fixture
+def api(store):
+    return SnapshotAPI(store)
+
+def _json(body):
+    return json.loads(body.decode('utf-8'))
+
+def test_snapshot_etag_and_not_modified(api, store):
+    status, headers, body = api.handle(f'/v1/snapshots/air_quality?region={DEFAULT_REGION}')
+    assert status == 200
+    assert headers['Content-Type'].startswith('application/json')
+    assert headers['Last-Modified'] == 'Tue, 14 Nov 2023 22:13:20 GMT'
+    frame, is_real = _json(body)
+    assert is_real is True and len(frame) == 40
+
+    status, again, body = api.handle(f'/v1/snapshots/air_quality?region={DEFAULT_REGION}',
+                                     if_none_match=headers['ETag'])
+    assert status == 304 and body == b''
+    assert again['ETag'] == headers['ETag']
+
+    # 新版本換 ETag
+    store.write('air_quality', (DEFAULT_REGION,), _stations(pm25=20.0))
+    status, changed, _ = api.handle(f'/v1/snapshots/air_quality?region={DEFAULT_REGION}',
+                                    if_none_match=headers['ETag'])
+    assert status == 200
+    assert changed['ETag'] != headers['ETag']
+
+def test_gzip_uses_its_own_etag(api):
+    target = f'/v1/snapshots/air_quality?region={DEFAULT_REGION}'
+    _, plain, plain_body = api.handle(target)
+    status, headers, body = api.handle(target, accept_encoding='gzip, deflate')
+    assert status == 200
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['ETag'] != plain['ETag']
+    assert gzip.decompress(body) == plain_body
+
+def test_arrow_format(api):
+    for kwargs in ({'target': f'/v1/snapshots/air_quality?region={DEFAULT_REGION}&format=arrow'},
+                   {'target': f'/v1/snapshots/air_quality?region={DEFAULT_REGION}', 'accept': ARROW_MIME}):
+        status, headers, body = api.handle(**kwargs)
+        assert status == 200
+        assert headers['Content-Type'] == ARROW_MIME
+        assert pa.ipc.open_stream(body).read_all().num_rows == 40
+
+def test_nearest_station_is_sorted_and_clamped(api):
+    status, _, body = api.handle('/v1/nearest/station?lat=22.9&lon=120.2&k=3')
+    assert status == 200
+    rows = _json(body)
+    assert [row['sitename'] for row in rows] == ['站0', '站1', '站2']
+    _, _, body = api.handle('/v1/nearest/station?lat=22.9&lon=120.2&k=999')
+    assert len(_json(body)) == api_module.API_NEAREST_MAX
+
+def test_sources_report_absolute_fetch_time(api, store):
+    status, headers, body = api.handle('/v1/sources')
+    assert status == 200
+    [item] = _json(body)
+    assert item['fetched_at'] == 1_700_000_000.0
+    assert 'age_s' not in item
+
+    # 內容未變、只更新抓取時間時回應也要更新
+    store.write('air_quality', (DEFAULT_REGION,), _stations(), fetched_at=1_700_000_600.0)
+    status, _, body = api.handle('/v1/sources', if_none_match=headers['ETag'])
+    assert status == 200
+    assert _json(body)[0]['fetched_at'] == 1_700_000_600.0
+
+@pytest.mark.parametrize('target', [
+    '/v1/sources?format=xml',
+    '/v1/nearest/station?lon=120.2',
+    '/v1/nearest/station?lat=abc&lon=120.2',
+    '/v1/nearest/shelter?lat=22.9&lon=120.2&k=two',
+    '/v1/snapshots/air_quality?region=atlantis',
+    '/v1/snapshots/air_quality?unknown=1',
+    '/v1/scenarios/earthquake?seed=1',
+])
+def test_bad_requests(api, target):
+    status, headers, body = api.handle(target)
+    assert status == 400
+    assert headers['Content-Type'].startswith('application/json')
+    assert 'error' in _json(body)
+
+@pytest.mark.parametrize('target', [
+    '/v2/sources',
+    '/v1/unknown',
+    '/v1/snapshots/unknown',
+    '/v1/nearest/airport?lat=22.9&lon=120.2',
+    '/v1/scenarios/meteor',
+])
+def test_not_found(api, target):
+    status, _, body = api.handle(target)
+    assert status == 404
+    assert 'error' in _json(body)
+
+def test_missing_snapshot_requests_worker(api, store):
+    status, _, _ = api.handle('/v1/snapshots/air_quality?region=taipei')
+    assert status == 404
+    assert ('air_quality', ('taipei',), False) in store.take_demands()
+
+def test_seed_zero_is_kept():
+    assert api_module._query_int({'seed': '0'}, 'seed', 0, 0, 2 ** 31) == 0
+    assert api_module._query_int({'k': '0'}, 'k', 1, 1, 20) == 1
+    assert api_module._query_int({}, 'k', 1, 1, 20) == 1
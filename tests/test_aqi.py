@@ -0,0 +1,50 @@
+"""AQI 分級表邊界與子指標合成"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from taisafe.aqi import AQI_BREAKPOINTS, AQI_INDEX_HIGH, AQI_INDEX_LOW, apply_aqi, compute_aqi, sub_index
+
+@pytest.mark.parametrize('name', sorted(AQI_BREAKPOINTS))
+def test_sub_index_hits_level_bounds(name):
+    """每個級距的濃度上下限對應 AQI 級距的上下限"""
+    _, first_level, lows, highs = AQI_BREAKPOINTS[name]
+    levels = first_level + np.arange(len(lows))
+    np.testing.assert_allclose(sub_index(name, lows), AQI_INDEX_LOW[levels])
+    np.testing.assert_allclose(sub_index(name, highs), AQI_INDEX_HIGH[levels])
+
+def test_pm25_boundaries_truncate_before_lookup():
+    values = sub_index('pm25', [15.4, 15.49, 15.5, 35.4, 35.5, 54.4, 54.5, 500.4, 600.0])
+    np.testing.assert_allclose(values, [50, 50, 51, 100, 101, 150, 151, 500, 500])
+
+def test_out_of_table_ozone_is_nan():
+    # 臭氧小時值 125 ppb 以下不適用；八小時值超過 200 ppb 改以小時值計算
+    assert np.isnan(sub_index('o3_1h', [124.0])).all()
+    assert sub_index('o3_1h', [125.0])[0] == 101
+    assert np.isnan(sub_index('o3_8h', [201.0])).all()
+    assert np.isnan(sub_index('pm25', [np.nan])).all()
+
+def test_compute_aqi_takes_max_and_labels_dominant_pollutant():
+    aqi, pollutant = compute_aqi({
+        'pm25': np.array([10.0, 40.0, np.nan]),
+        'pm10': np.array([20.0, 300.0, np.nan]),
+    })
+    np.testing.assert_array_equal(aqi[:2], [32, 173])
+    assert np.isnan(aqi[2])
+    assert list(pollutant) == ['', '懸浮微粒', '']
+
+def test_moving_average_columns_replace_instant_values():
+    data = {'pm25': np.array([100.0, 100.0]),
+            'pm25_12h': np.array([10.0, np.nan]),
+            'pm25_4h': np.array([10.0, np.nan])}
+    aqi, _ = compute_aqi(data)
+    np.testing.assert_array_equal(aqi, [32, 174])
+    instant, _ = compute_aqi(data, use_averages=False)
+    np.testing.assert_array_equal(instant, [174, 174])
+
+def test_apply_aqi_keeps_reported_values():
+    df = pd.DataFrame({'pm25': [10.0, 40.0], 'aqi': [77.0, np.nan]})
+    result = apply_aqi(df, keep_reported=True)
+    assert result['aqi'].tolist() == [77.0, 113.0]
+    assert 'aqi' in df.columns and np.isnan(df['aqi'][1])
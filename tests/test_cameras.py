@@ -0,0 +1,66 @@
+"""攝影機畫面變化偵測：同一張快照只分析一次、依經過時間判定凍結"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from taisafe import cameras
+from taisafe.cameras import SCENE_FROZEN_SECONDS, CameraSnapshotProxy, SceneChangeDetector
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_800_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cameras.time, 'time', clock)
+    return clock
+
+def _jpeg(seed, brightness=None):
+    rng = np.random.default_rng(seed)
+    pixels = np.full((96, 128), brightness, dtype=np.uint8) if brightness is not None else \
+        (rng.random((96, 128)) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).convert('RGB').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+def test_repeated_fetches_of_a_live_camera_are_not_frozen(clock):
+    detector = SceneChangeDetector(capacity=1)
+    proxy = CameraSnapshotProxy(detector=detector)
+    # 攝影機每四分鐘更新一次，健康檢查與快照代理各每分鐘抓一次：同一張快照會收到八次
+    for update in range(8):
+        raw = _jpeg(update)
+        for _ in range(8):
+            proxy.ingest('cam', raw)
+            clock.now += 30
+            assert 'frozen' not in detector.result('cam')['flags']
+
+def test_unchanged_picture_is_frozen_after_elapsed_time(clock):
+    detector = SceneChangeDetector(capacity=1)
+    proxy = CameraSnapshotProxy(detector=detector)
+    raw = _jpeg(0)
+    proxy.ingest('cam', raw)
+    clock.now += SCENE_FROZEN_SECONDS - 1
+    proxy.ingest('cam', raw)
+    assert 'frozen' not in detector.result('cam')['flags']
+    clock.now += 1
+    proxy.ingest('cam', raw)
+    assert detector.result('cam')['flags'] == ['frozen']
+    assert detector.result('cam')['score'] == 0.7
+
+    proxy.ingest('cam', _jpeg(1))
+    assert 'frozen' not in detector.result('cam')['flags']
+
+def test_blackout_and_capacity_growth(clock):
+    detector = SceneChangeDetector(capacity=1)
+    proxy = CameraSnapshotProxy(detector=detector)
+    proxy.ingest('a', _jpeg(0))
+    proxy.ingest('b', _jpeg(0, brightness=0))
+    assert detector.result('b')['flags'] == ['blackout']
+    assert detector.rank([{'cam_url': 'a'}, {'cam_url': 'b'}])[0]['cam_url'] == 'b'
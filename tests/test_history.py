@@ -0,0 +1,60 @@
+"""測站歷史時序：去重、壓縮為 Parquet 與跨分割查詢"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from taisafe.history import HistoryStore
+
+@pytest.fixture
+def history(tmp_path):
+    return HistoryStore('air_quality', root=tmp_path)
+
+def _readings(times, stations=('安南', '善化'), start=10.0):
+    rows = [{'sitename': station, 'publishtime': time, 'pm25': start + i * 10 + j, 'o3': 30.0}
+            for i, time in enumerate(times) for j, station in enumerate(stations)]
+    return pd.DataFrame(rows)
+
+def test_duplicate_readings_are_ignored(history):
+    frame = _readings(['2026-10-01 10:00', '2026-10-01 11:00'])
+    assert history.write(frame) == 4
+    assert history.write(frame) == 0
+    result = history.read('2026-10-01', '2026-10-02')
+    assert len(result) == 4
+    assert result['station'].tolist() == ['善化', '善化', '安南', '安南']
+    assert result['pm25'].dtype == np.float32
+    assert np.isnan(result['pm10']).all()
+
+def test_read_spans_compacted_and_hot_partitions(history):
+    history.write(_readings(['2026-10-01 23:00', '2026-10-02 00:00', '2026-10-02 01:00']))
+    assert history.compact(before=date(2026, 10, 2)) == 1
+    assert history.stats()['cold_days'] == 1 and history.stats()['hot_days'] == 1
+
+    result = history.read('2026-10-01 23:00', '2026-10-02 01:00', stations=['安南'], columns=['pm25'])
+    assert list(result.columns) == ['station', 'time', 'pm25']
+    assert result['time'].tolist() == [pd.Timestamp('2026-10-01 23:00'), pd.Timestamp('2026-10-02 00:00')]
+    assert result['pm25'].tolist() == [10.0, 20.0]
+
+def test_late_data_for_compacted_day_is_merged(history):
+    history.write(_readings(['2026-10-01 10:00']))
+    history.compact(before=date(2026, 10, 2))
+    # 已壓縮的鍵不重複寫入，新的鍵寫回 SQLite 後再次壓縮合併
+    assert history.write(_readings(['2026-10-01 10:00', '2026-10-01 12:00'])) == 2
+    assert history.compact(before=date(2026, 10, 2)) == 1
+    assert history.stats()['hot_days'] == 0
+    assert len(history.read('2026-10-01', '2026-10-02')) == 4
+
+def test_downsample_buckets_by_station(history):
+    times = pd.date_range('2026-10-01 00:00', periods=6, freq='h')
+    history.write(_readings(times, stations=('安南',)))
+    result = history.downsample('2026-10-01', '2026-10-02', 3 * 3600, how='mean')
+    assert result['time'].tolist() == [pd.Timestamp('2026-10-01 00:00'), pd.Timestamp('2026-10-01 03:00')]
+    assert result['pm25'].tolist() == [20.0, 50.0]
+    assert history.downsample('2026-10-01', '2026-10-02', 3 * 3600, how='max')['pm25'].tolist() == [30.0, 60.0]
+
+def test_empty_range(history):
+    result = history.read('2026-10-01', '2026-10-02', columns=['pm25'])
+    assert result.empty
+    assert list(result.columns) == ['station', 'time', 'pm25']
@@ -0,0 +1,82 @@
+"""PM2.5 短時預報：合成 AR(1) 序列的係數與預報"""
+
+import numpy as np
+import pandas as pd
+
+from taisafe.nowcast import PM25Nowcaster, wind_components
+
+START = pd.Timestamp('2026-10-01 00:00')
+PHI, MEAN = 0.8, 40.0
+
+def _ar_series(hours, stations=2, seed=0, noise=3.0):
+    """各站獨立的 AR(1)：x_t = MEAN + PHI * (x_{t-1} - MEAN) + 雜訊"""
+    rng = np.random.default_rng(seed)
+    x = np.full(stations, MEAN)
+    series = []
+    for _ in range(hours):
+        x = MEAN + PHI * (x - MEAN) + rng.normal(0, noise, stations)
+        series.append(x.copy())
+    return np.array(series)
+
+def _feed(nowcaster, series):
+    """逐小時併入；只在最後一小時求解"""
+    for hour, values in enumerate(series):
+        frame = pd.DataFrame({'sitename': [f's{i}' for i in range(len(values))],
+                              'publishtime': START + pd.Timedelta(hours=hour), 'pm25': values})
+        nowcaster.update(frame, solve=hour == len(series) - 1)
+
+def test_recovers_ar_coefficients():
+    nowcaster = PM25Nowcaster(forget=1.0, ridge=1e-6)
+    _feed(nowcaster, _ar_series(1500))
+    for h in range(nowcaster.horizon):
+        # h + 1 小時後的預報：x_{t+h+1} = MEAN + PHI^(h+1) * (x_t - MEAN)
+        phi = PHI ** (h + 1)
+        coef = nowcaster.coef[h]
+        np.testing.assert_allclose(coef[:, 0], phi, atol=0.06)
+        np.testing.assert_allclose(coef[:, 1:nowcaster.lags], 0.0, atol=0.06)
+        # 截距與落後項係數隱含的長期平均
+        implied_mean = coef[:, -1] / (1 - coef[:, :nowcaster.lags].sum(axis=1))
+        np.testing.assert_allclose(implied_mean, MEAN, atol=1.5)
+
+def test_forecast_beats_persistence_out_of_sample():
+    series = _ar_series(600, stations=1, seed=1)
+    nowcaster = PM25Nowcaster()
+    errors, persistence = [], []
+    for hour, values in enumerate(series[:-1]):
+        nowcaster.update(pd.DataFrame({'sitename': ['s0'], 'publishtime': START + pd.Timedelta(hours=hour),
+                                       'pm25': values}))
+        forecast = nowcaster.predict()[0, 0]
+        if hour >= 200:
+            errors.append(forecast - series[hour + 1, 0])
+            persistence.append(values[0] - series[hour + 1, 0])
+    assert np.sqrt(np.mean(np.square(errors))) < np.sqrt(np.mean(np.square(persistence)))
+
+def test_no_forecast_until_enough_samples():
+    nowcaster = PM25Nowcaster(min_samples=24)
+    _feed(nowcaster, _ar_series(20))
+    assert np.isnan(nowcaster.predict()).all()
+    nowcaster = PM25Nowcaster(min_samples=24)
+    _feed(nowcaster, _ar_series(40))
+    assert not np.isnan(nowcaster.predict()).any()
+
+def test_repeated_hour_is_ignored():
+    nowcaster = PM25Nowcaster()
+    frame = pd.DataFrame({'sitename': ['s0'], 'publishtime': [START], 'pm25': [30.0]})
+    assert nowcaster.update(frame)
+    assert not nowcaster.update(frame)
+
+def test_attach_reports_first_threshold_crossing():
+    nowcaster = PM25Nowcaster(min_samples=1, ridge=1e6)
+    # 極大的收縮強度：預報等於持續預報（未來各小時 = 當下值）
+    _feed(nowcaster, np.array([[60.0, 20.0]] * 30))
+    attached = nowcaster.attach(pd.DataFrame({'sitename': ['s0', 's1', '未知站']}))
+    np.testing.assert_allclose(attached['pm25_f1'].iloc[:2], [60.0, 20.0], atol=0.5)
+    assert attached['nowcast_level'].tolist() == [53, 0, 0]
+    assert attached['nowcast_hours'].iloc[0] == 1
+    assert attached['nowcast_hours'].iloc[1:].isna().all()
+
+def test_wind_components_point_downwind():
+    u, v = wind_components([2.0, 2.0, np.nan], [0.0, 90.0, 90.0])
+    # 北風（來自北方）向南吹，東風向西吹；缺值為 0
+    np.testing.assert_allclose(u, [0.0, -2.0, 0.0], atol=1e-9)
+    np.testing.assert_allclose(v, [-2.0, 0.0, 0.0], atol=1e-9)
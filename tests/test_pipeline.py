@@ -0,0 +1,73 @@
+"""複合災害管線：圖層合成、階段快取；LRU 快取"""
+
+import numpy as np
+import pandas as pd
+
+from taisafe.cache import LRUCache
+from taisafe.pipeline import HAZARD_GRID_SIZE, HazardPipeline
+from taisafe.regions import region_center, region_shelters
+
+def _stations():
+    center = region_center('tainan')
+    return pd.DataFrame({'sitename': ['甲', '乙', '丙'],
+                         'lat': center['lat'] + np.array([0.0, 0.05, -0.05]),
+                         'lon': center['lon'] + np.array([0.0, 0.05, -0.05]),
+                         'pm25': [10.0, 20.0, 30.0], 'pm10': [20.0, 30.0, 40.0]})
+
+def test_initial_state_segments_and_interpolation():
+    base = _stations()
+    state = HazardPipeline.initial_state(base, 'tainan')
+    n_shelters = len(region_shelters('tainan'))
+    segments = state['segments']
+    assert segments['stations'] == slice(0, 3)
+    assert segments['shelters'] == slice(3, 3 + n_shelters)
+    assert segments['grid'].stop - segments['grid'].start == HAZARD_GRID_SIZE ** 2
+    np.testing.assert_array_equal(state['pm25'][:3], base['pm25'])
+    # 內插值落在測站值的範圍內
+    assert (state['pm25'] >= 10.0 - 1e-9).all() and (state['pm25'] <= 30.0 + 1e-9).all()
+
+def test_combined_risk_is_independent_union():
+    state = HazardPipeline.run(_stations(), [('war_alert', {}), ('earthquake', {})], region='tainan')
+    risk, status, dominant = HazardPipeline.combined(state)
+    quake = state['layers']['earthquake']['risk'][:3]
+    np.testing.assert_allclose(risk, 1 - (1 - 0.8) * (1 - quake))
+    # 震央在第一站：地震風險 1.0 高於空襲
+    assert dominant[0] == '地震'
+    assert status[0] == '設備異常'
+
+def test_changing_later_stage_reuses_earlier_stages():
+    base = _stations()
+    cache = {}
+    first = HazardPipeline.run(base, [('earthquake', {}), ('flooding', {'rain_factor': 1.0})], cache=cache)
+    size = len(cache)
+    second = HazardPipeline.run(base, [('earthquake', {}), ('flooding', {'rain_factor': 2.0})], cache=cache)
+    assert len(cache) == size + 1
+    # 地震圖層是同一個物件（沒有重算）
+    assert second['layers']['earthquake'] is first['layers']['earthquake']
+    np.testing.assert_allclose(second['water_depth'], first['water_depth'] * 2)
+    again = HazardPipeline.run(base, [('earthquake', {}), ('flooding', {'rain_factor': 1.0})], cache=cache)
+    assert again is first
+
+def test_station_frame_does_not_mutate_base():
+    base = _stations()
+    state = HazardPipeline.run(base, [('air_pollution', {'seed': 1})])
+    frame = HazardPipeline.to_station_frame(state, base)
+    assert (frame['pm25'] >= base['pm25'] + 80).all()
+    assert base['pm25'].tolist() == [10.0, 20.0, 30.0]
+    assert {'risk', 'status', 'dominant_hazard', 'aqi'} <= set(frame.columns)
+    shelters = HazardPipeline.to_point_frame(state, 'shelters')
+    assert shelters['name'].tolist() == state['shelter_names']
+
+def test_no_layers_is_normal():
+    state = HazardPipeline.initial_state(_stations())
+    risk, status, dominant = HazardPipeline.combined(state)
+    assert (risk == 0).all() and list(status) == ['正常'] * 3 and list(dominant) == [''] * 3
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
@@ -0,0 +1,55 @@
+"""河川網路：流達時間、質量守恆稀釋與環路檢查"""
+
+import numpy as np
+import pytest
+
+from taisafe.river import RIVER_NETWORK_FILE, RiverNetwork
+
+def _node(name, river='甲溪', **extra):
+    return {'sitename': name, 'river': river, 'lat': 23.0, 'lon': 120.2, **extra}
+
+def _network():
+    # A、B 匯流至 C，C 流至 D；D 另有區間入流
+    nodes = [_node('A'), _node('B', river='乙溪'), _node('C'), _node('D', local_inflow=5.0)]
+    edges = [
+        {'from': 'A', 'to': 'C', 'flow': 2.0, 'travel_time_h': 1.0},
+        {'from': 'B', 'to': 'C', 'flow': 3.0, 'travel_time_h': 2.0},
+        {'from': 'C', 'to': 'D', 'flow': 5.0, 'travel_time_h': 4.0},
+    ]
+    return RiverNetwork(nodes, edges)
+
+def test_dilution_follows_mass_balance():
+    impact = _network().propagate('A', concentration=100.0, decay_per_hour=0.0).set_index('sitename')
+    np.testing.assert_allclose(impact['concentration'], [100.0, 0.0, 40.0, 20.0])
+    np.testing.assert_allclose(impact['exposure'], [1.0, 0.0, 0.4, 0.2])
+    assert impact.loc['A', 'arrival_h'] == 0.0
+    assert np.isnan(impact.loc['B', 'arrival_h'])
+    assert impact.loc['D', 'arrival_h'] == 5.0
+
+def test_first_order_decay_along_travel_time():
+    k = 0.1
+    impact = _network().propagate('B', concentration=100.0, decay_per_hour=k).set_index('sitename')
+    expected_c = 100.0 * np.exp(-k * 2.0) * 3.0 / 5.0
+    expected_d = expected_c * np.exp(-k * 4.0) * 5.0 / 10.0
+    np.testing.assert_allclose(impact.loc[['C', 'D'], 'concentration'], [expected_c, expected_d], atol=1e-3)
+    assert impact.loc['A', 'concentration'] == 0.0
+
+def test_affected_rivers_and_site_exposure():
+    network = _network()
+    impact = network.propagate('B')
+    assert network.affected_rivers(impact) == ['乙溪', '甲溪']
+    np.testing.assert_allclose(network.site_exposure(['D', 'Z', 'B'], impact),
+                               [impact.set_index('sitename').loc['D', 'exposure'], 0.0, 1.0])
+
+def test_cycle_is_rejected():
+    nodes = [_node('A'), _node('B')]
+    edges = [{'from': 'A', 'to': 'B', 'flow': 1.0, 'travel_time_h': 1.0},
+             {'from': 'B', 'to': 'A', 'flow': 1.0, 'travel_time_h': 1.0}]
+    with pytest.raises(ValueError):
+        RiverNetwork(nodes, edges)
+
+def test_bundled_network_loads():
+    network = RiverNetwork.from_file(RIVER_NETWORK_FILE)
+    impact = network.propagate(network.sitenames[0])
+    assert len(impact) == len(network.sitenames)
+    assert (impact['exposure'] <= 1.0 + 1e-9).all()
@@ -0,0 +1,76 @@
+"""分級規則邊界與警示規則的持續時間、遲滯"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from taisafe.rules import AlertEngine, classify
+
+RULES = {
+    'pm25': {'column': 'pm25', 'raise': 53, 'raise_hours': 2, 'clear': 45, 'clear_hours': 2, 'label': 'PM2.5'},
+}
+START = pd.Timestamp('2026-10-01 08:00')
+
+def _frame(hour, values):
+    """某小時的發布資料；values 為 {測站: PM2.5}"""
+    return pd.DataFrame({'sitename': list(values), 'publishtime': START + pd.Timedelta(hours=hour),
+                         'pm25': list(values.values())})
+
+def _run(engine, series, station='安南'):
+    """逐小時輸入單站讀值，返回每小時的事件種類（沒有事件為 None）"""
+    kinds = []
+    for hour, value in enumerate(series):
+        events = engine.update(_frame(hour, {station: value}))
+        kinds.append(events['event'].iloc[0] if len(events) else None)
+    return kinds
+
+def test_classify_boundaries_follow_closed_side():
+    assert list(classify('pm25_level', [34.9, 35, 53, 70, np.nan])) == \
+        ['良好', '普通', '對敏感族群不健康', '不健康', '斷訊']
+    assert list(classify('pm25_scenario', [100, 100.1, 150, 151])) == \
+        ['對敏感族群不健康', '對所有族群不健康', '對所有族群不健康', '非常不健康']
+
+def test_raise_requires_consecutive_hours():
+    engine = AlertEngine(RULES)
+    assert _run(engine, [60, 40, 60, 60]) == [None, None, None, 'raised']
+    alert = engine.active().iloc[0]
+    assert alert['station'] == '安南'
+    assert alert['since'] == START + pd.Timedelta(hours=3)
+
+def test_hysteresis_keeps_alert_between_thresholds():
+    engine = AlertEngine(RULES)
+    # 50 介於解除門檻與發布門檻之間：不解除；低於 45 連續兩小時才解除
+    kinds = _run(engine, [60, 60, 50, 50, 44, 50, 44, 44])
+    assert kinds == [None, 'raised', None, None, None, None, None, 'cleared']
+    assert engine.active().empty
+
+def test_missing_hours_do_not_break_duration():
+    engine = AlertEngine(RULES)
+    assert _run(engine, [60, np.nan, 60]) == [None, None, 'raised']
+
+def test_repeated_hour_is_not_reevaluated():
+    engine = AlertEngine(RULES)
+    engine.update(_frame(0, {'安南': 60}))
+    assert engine.update(_frame(0, {'安南': 60})) is None
+    assert len(engine.update(_frame(1, {'安南': 60}))) == 1
+
+def test_stations_evaluated_independently_and_attached():
+    engine = AlertEngine(RULES)
+    engine.update(_frame(0, {'安南': 60, '善化': 10}))
+    engine.update(_frame(1, {'安南': 60, '善化': 10}))
+    attached = engine.attach(pd.DataFrame({'sitename': ['安南', '善化', '未知站']}))
+    assert attached['alerts'].tolist() == ['PM2.5', '', '']
+    assert attached['alert_since'].iloc[0] == START + pd.Timedelta(hours=1)
+    assert attached['alert_since'].iloc[1:].isna().all()
+
+def test_state_round_trip_does_not_repeat_alert():
+    engine = AlertEngine(RULES)
+    _run(engine, [60, 60])
+    restored = AlertEngine.from_state(engine.to_state(), engine.events, rules=RULES)
+    assert len(restored.events) == 1
+    assert restored.update(_frame(2, {'安南': 60})).empty
+    assert restored.active()['station'].tolist() == ['安南']
+
+def test_clear_above_raise_is_rejected():
+    with pytest.raises(ValueError):
+        AlertEngine({'bad': {**RULES['pm25'], 'clear': 60}})
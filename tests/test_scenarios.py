@@ -0,0 +1,39 @@
+"""空污情境 Monte Carlo 集成模擬"""
+
+import numpy as np
+import pandas as pd
+
+from taisafe.scenarios import PM25_EXCEEDANCE_THRESHOLDS, DisasterScenario
+
+def _stations(n=6):
+    return pd.DataFrame({'sitename': [f'站{i}' for i in range(n)],
+                         'pm25': np.linspace(0, 50, n), 'pm10': np.linspace(10, 60, n)})
+
+def test_single_run_matches_single_realization():
+    base = _stations()
+    single = DisasterScenario.air_pollution(base, seed=7)
+    ensemble = DisasterScenario.air_pollution_ensemble(base, n_runs=1, seed=7)
+    np.testing.assert_allclose(ensemble['pm25'], single['pm25'])
+    np.testing.assert_allclose(ensemble['pm10'], single['pm10'])
+
+def test_ensemble_is_reproducible_and_ordered():
+    base = _stations()
+    first = DisasterScenario.air_pollution_ensemble(base, n_runs=500, seed=3)
+    second = DisasterScenario.air_pollution_ensemble(base, n_runs=500, seed=3)
+    pd.testing.assert_frame_equal(first, second)
+    assert 'pm25_p10' not in base.columns
+
+    assert (first['pm25_p10'] <= first['pm25_p50']).all()
+    assert (first['pm25_p50'] <= first['pm25_p90']).all()
+    exceed = first[[f'pm25_exceed_{t}' for t in sorted(PM25_EXCEEDANCE_THRESHOLDS)]].to_numpy()
+    assert ((exceed >= 0) & (exceed <= 1)).all()
+    # 門檻越高超標機率越低
+    assert (np.diff(exceed, axis=1) <= 0).all()
+
+def test_exceedance_matches_uniform_perturbation():
+    # 擾動為 [80, 150) 的整數：基準 0 時超過 100 的機率為 49 / 70
+    base = pd.DataFrame({'pm25': [0.0], 'pm10': [0.0]})
+    result = DisasterScenario.air_pollution_ensemble(base, n_runs=20000, seed=1, thresholds=(100,))
+    assert abs(result['pm25_exceed_100'].iloc[0] - 49 / 70) < 0.02
+    assert abs(result['pm25'].iloc[0] - 114.5) < 0.5
+    assert result['ensemble_runs'].iloc[0] == 20000
@@ -0,0 +1,72 @@
+"""快照庫的版本、保留與編碼"""
+
+import pandas as pd
+import pytest
+
+from taisafe.snapshots import SNAPSHOT_KEEP_VERSIONS, SnapshotStore, decode_snapshot, encode_snapshot
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(tmp_path / 'snapshots.db')
+
+def _value(pm25):
+    return (pd.DataFrame({'sitename': ['安南', '善化'], 'pm25': [pm25, 12.0]}), True)
+
+def test_version_only_advances_when_content_changes(store):
+    assert store.write('air_quality', ('tainan',), _value(10.0), fetched_at=100.0) == 1
+    assert store.write('air_quality', ('tainan',), _value(10.0), fetched_at=200.0) == 1
+    snapshot = store.latest('air_quality', ('tainan',))
+    assert snapshot['version'] == 1
+    assert snapshot['fetched_at'] == 200.0
+    assert store.write('air_quality', ('tainan',), _value(11.0), fetched_at=300.0) == 2
+    # 不同參數各自計版本
+    assert store.write('air_quality', ('taipei',), _value(11.0)) == 1
+
+def test_same_version_is_decoded_once(store):
+    store.write('air_quality', ('tainan',), _value(10.0))
+    first = store.latest('air_quality', ('tainan',))['value']
+    assert store.latest('air_quality', ('tainan',))['value'] is first
+    frame, is_real = first
+    assert is_real is True
+    assert frame['pm25'].tolist() == [10.0, 12.0]
+
+    store.write('air_quality', ('tainan',), _value(20.0))
+    assert store.latest('air_quality', ('tainan',))['value'][0]['pm25'].iloc[0] == 20.0
+
+def test_keeps_only_recent_versions(store):
+    total = SNAPSHOT_KEEP_VERSIONS + 3
+    for i in range(total):
+        store.write('air_quality', ('tainan',), _value(float(i)))
+    versions = [row[0] for row in store._conn().execute(
+        "SELECT version FROM snapshots WHERE source='air_quality' ORDER BY version")]
+    assert versions == list(range(total - SNAPSHOT_KEEP_VERSIONS + 1, total + 1))
+
+def test_missing_snapshot_and_status(store):
+    assert store.latest('air_quality', ('tainan',)) is None
+    store.write('air_quality', ('tainan',), _value(10.0), fetched_at=100.0)
+    store.write('air_quality', ('tainan',), _value(11.0), fetched_at=150.0)
+    [status] = store.status()
+    assert status['source'] == 'air_quality'
+    assert status['args'] == ('tainan',)
+    assert status['version'] == 2
+    assert status['fetched_at'] == 150.0
+
+def test_demands_are_taken_once(store):
+    store.request('air_quality', ('taipei',))
+    store.request('air_quality', ('taipei',), force=True)
+    store.request('water_quality')
+    assert sorted(store.take_demands()) == [('air_quality', ('taipei',), True), ('water_quality', None, False)]
+    assert store.take_demands() == []
+
+def test_state_round_trip(store):
+    assert store.load_state('anomaly:air_quality') is None
+    store.save_state('anomaly:air_quality', (7, pd.DataFrame({'station': ['安南'], 'mean': [1.5]})))
+    hour, frame = store.load_state('anomaly:air_quality')
+    assert hour == 7
+    assert frame.to_dict('list') == {'station': ['安南'], 'mean': [1.5]}
+
+def test_encode_rejects_more_than_one_frame():
+    frame = pd.DataFrame({'a': [1]})
+    with pytest.raises(ValueError):
+        encode_snapshot((frame, frame))
+    assert decode_snapshot(*encode_snapshot([1, ('x', 2)])) == [1, ('x', 2)]
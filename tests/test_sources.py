@@ -0,0 +1,114 @@
+"""資料來源快取：背景更新、版本與久未讀取的參數"""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from taisafe import sources as sources_module
+from taisafe.sources import UNCHANGED, SourceStore, freeze_frame
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+class _Bus:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, name, version):
+        self.published.append((name, version))
+
+class _Loader:
+    """每次呼叫返回 values 中的下一個值（用完後重複最後一個），記錄呼叫參數"""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            self.calls.append(args)
+            value = self.values[min(len(self.calls), len(self.values)) - 1]
+        return value() if callable(value) else value
+
+def _frame(value):
+    return lambda: (pd.DataFrame({'pm25': [value]}), True)
+
+def test_first_read_loads_synchronously_and_freezes():
+    store = SourceStore()
+    loader = _Loader(_frame(1.0))
+    store.register('air', loader, ttl=3600)
+    frame, is_real = store.get('air')
+    assert is_real and frame['pm25'].tolist() == [1.0]
+    assert 'arrow_nbytes' in frame.attrs
+    assert store.get('air')[0] is frame
+    assert loader.calls == [()]
+
+def test_invalidate_refreshes_in_background_and_bumps_version():
+    bus = _Bus()
+    store = SourceStore(bus=bus)
+    loader = _Loader(_frame(1.0), _frame(1.0), _frame(2.0))
+    store.register('air', loader, ttl=3600)
+    store.get('air')
+
+    # 內容相同：版本不變、不通知
+    assert store.invalidate('air') == 1
+    assert _wait_for(lambda: len(loader.calls) == 2 and not store.status()[0]['refreshing'])
+    assert store.status()[0]['version'] == 1 and bus.published == []
+
+    store.invalidate('air')
+    assert _wait_for(lambda: store.status()[0]['version'] == 2)
+    assert store.get('air')[0]['pm25'].tolist() == [2.0]
+    assert bus.published == [('air', 2)]
+
+def test_unchanged_keeps_value_and_failures_keep_old_data():
+    def fail():
+        raise RuntimeError("上游錯誤")
+    store = SourceStore()
+    loader = _Loader(_frame(1.0), UNCHANGED, fail)
+    store.register('air', loader, ttl=3600)
+    first = store.get('air')
+    store.invalidate('air')
+    assert _wait_for(lambda: len(loader.calls) == 2 and not store.status()[0]['refreshing'])
+    store.invalidate('air')
+    assert _wait_for(lambda: len(loader.calls) == 3 and not store.status()[0]['refreshing'])
+    assert store.get('air') is first
+    assert store.status()[0]['version'] == 1
+
+def test_expired_entries_refresh_without_readers():
+    store = SourceStore()
+    loader = _Loader(_frame(1.0), _frame(2.0))
+    store.register('air', loader, ttl=0.05)
+    store.get('air')
+    assert _wait_for(lambda: store.status()[0]['version'] == 2)
+
+def test_idle_non_default_args_are_dropped(monkeypatch):
+    monkeypatch.setattr(sources_module, 'SOURCE_IDLE_MIN_SECONDS', 0)
+    monkeypatch.setattr(sources_module, 'SOURCE_IDLE_TTLS', 2)
+    store = SourceStore()
+    loader = _Loader(_frame(1.0))
+    store.register('wind', loader, ttl=0.05, defaults=[('tainan',)])
+    store.get('wind', ('tainan',))
+    store.get('wind', ('taipei',))
+    assert _wait_for(lambda: [item['args'] for item in store.status()] == [('tainan',)])
+
+    # 預設參數持續更新；被移除的參數不再被抓取
+    calls = len([args for args in loader.calls if args == ('taipei',)])
+    time.sleep(0.3)
+    assert len([args for args in loader.calls if args == ('taipei',)]) == calls
+    assert len([args for args in loader.calls if args == ('tainan',)]) > 2
+
+def test_freeze_frame_is_read_only():
+    frame = freeze_frame(pd.DataFrame({'pm25': [1.0, 2.0]}))
+    with pytest.raises(ValueError):
+        frame['pm25'].to_numpy()[0] = 5.0
+    derived = frame.copy(deep=False)
+    derived['pm25'] = derived['pm25'] + 1
+    assert frame['pm25'].tolist() == [1.0, 2.0]
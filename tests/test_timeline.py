@@ -0,0 +1,62 @@
+"""時序情境：預先計算的時間幀、煙團累積與記憶體映射"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from taisafe.scenarios import DisasterScenario
+from taisafe.timeline import ScenarioTimeline
+
+WIND = {'direction': 45.0, 'speed': 3.0}
+
+def _stations():
+    return pd.DataFrame({'sitename': ['北', '中', '南'], 'lat': [23.2, 23.0, 22.9],
+                         'lon': [120.2, 120.22, 120.25], 'pm25': [10.0, 20.0, 30.0]})
+
+def test_flood_peaks_at_static_scenario_depth():
+    base = _stations()
+    timeline = ScenarioTimeline.build('flooding', base, hours=6, step_minutes=10)
+    frames = timeline['frames']
+    assert frames.shape == (37, 3)
+    assert frames.dtype == np.float32 and not frames.flags.writeable
+    peak = list(timeline['minutes']).index(180)
+    np.testing.assert_allclose(frames[peak], DisasterScenario.flooding(base)['water_depth'], rtol=1e-6)
+    assert (frames[:peak + 1].max(axis=0) == frames[peak]).all()
+    np.testing.assert_array_equal(frames[0], 0)
+
+def test_continuous_release_is_sum_of_single_puffs():
+    base = _stations()
+    minutes = np.arange(37) * 10
+    source = {'lat': 23.0, 'lon': 120.2}
+    background = base['pm25'].to_numpy()
+    single = ScenarioTimeline._plume_frames(base, minutes, WIND, source, release_hours=10 / 60) - background
+    plume = ScenarioTimeline._plume_frames(base, minutes, WIND, source, release_hours=2.0) - background
+    release_steps = 12
+    expected = np.array([single[max(0, t - release_steps + 1):t + 1].sum(axis=0) for t in range(len(minutes))])
+    np.testing.assert_allclose(plume, expected, rtol=1e-9, atol=1e-12)
+    assert (plume >= 0).all()
+
+def test_frame_view_applies_status_without_copying_base():
+    base = _stations()
+    timeline = ScenarioTimeline.build('air_pollution', base, wind=WIND)
+    view = ScenarioTimeline.frame_view(base, timeline, 5)
+    np.testing.assert_allclose(view['pm25'], timeline['frames'][5], rtol=1e-6)
+    assert 'status' in view.columns and 'status' not in base.columns
+    assert base['pm25'].tolist() == [10.0, 20.0, 30.0]
+
+def test_memmap_matches_memory_and_survives_rewrite(tmp_path):
+    base = _stations()
+    path = tmp_path / 'flood.npy'
+    in_memory = ScenarioTimeline.build('flooding', base)
+    mapped = ScenarioTimeline.build('flooding', base, memmap_path=path)
+    assert isinstance(mapped['frames'], np.memmap)
+    np.testing.assert_array_equal(mapped['frames'], in_memory['frames'])
+
+    # 以同一路徑重建不同資料：先前映射的時間幀不受影響
+    before = np.array(mapped['frames'])
+    ScenarioTimeline.build('flooding', base.assign(lat=base['lat'] - 0.5), memmap_path=path)
+    np.testing.assert_array_equal(mapped['frames'], before)
+
+def test_unsupported_scenario():
+    with pytest.raises(ValueError):
+        ScenarioTimeline.build('earthquake', _stations())